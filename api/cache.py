@@ -0,0 +1,134 @@
+"""
+Response caching for the public read endpoints.
+
+Each cached response belongs to one or more scopes (``"causes"``,
+``"cause:42"``, ``"stories"``). Every scope has a version in the cache, and
+a response is stored under a key built from the request path and the
+current versions of its scopes. ``invalidate()`` bumps versions, which
+orphans every response built from older data; the orphans expire on their
+own. A fresh version starts from the clock rather than 1, so a version key
+the cache evicted can never resurrect old entries.
+
+Cached entries keep their ``ETag`` (a hash of the body) and
+``Last-Modified`` (the newest ``updated_at`` behind the response), so
+conditional GETs are answered with 304 from the cache alone.
+
+``API_CACHE_ALIAS`` picks the cache backend and ``API_CACHE_TIMEOUT`` the
+lifetime of entries.
+"""
+import hashlib
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date, parse_http_date_safe
+
+
+def get_cache():
+    return caches[getattr(settings, "API_CACHE_ALIAS", "default")]
+
+
+def version_key(scope):
+    return f"api:version:{scope}"
+
+
+def versions(scopes):
+    cache = get_cache()
+    found = cache.get_many([version_key(scope) for scope in scopes])
+    missing = {version_key(scope): time.time_ns() for scope in scopes if version_key(scope) not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return [found[version_key(scope)] for scope in scopes]
+
+
+def invalidate(*scopes):
+    cache = get_cache()
+    for scope in scopes:
+        try:
+            cache.incr(version_key(scope))
+        except ValueError:
+            cache.set(version_key(scope), time.time_ns(), timeout=None)
+
+
+def response_key(request, scopes):
+    parts = [request.get_full_path()] + [f"{scope}={version}" for scope, version in zip(scopes, versions(scopes))]
+    return "api:response:" + hashlib.md5("|".join(parts).encode()).hexdigest()
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    @property
+    def ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def clear(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+
+cache_stats = CacheStats()
+
+
+def set_last_modified(response, timestamps):
+    """Set ``Last-Modified`` to the newest of ``timestamps`` (None values are skipped)."""
+    timestamps = [ts for ts in timestamps if ts is not None]
+    if timestamps:
+        response["Last-Modified"] = http_date(max(timestamps).timestamp())
+    return response
+
+
+def cache_response(*scopes):
+    """
+    Cache a GET view's 200 responses under ``scopes``, which are formatted
+    with the view's keyword arguments (``"cause:{pk}"``).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            key = response_key(request, [scope.format(**kwargs) for scope in scopes])
+            cache = get_cache()
+            entry = cache.get(key)
+            hit = entry is not None
+            cache_stats.record(hit)
+            if not hit:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                entry = {
+                    "content": response.content,
+                    "content_type": response["Content-Type"],
+                    "etag": quote_etag(hashlib.md5(response.content).hexdigest()),
+                    "last_modified": response.get("Last-Modified"),
+                }
+                cache.set(key, entry, getattr(settings, "API_CACHE_TIMEOUT", 300))
+
+            response = HttpResponse(entry["content"], content_type=entry["content_type"])
+            response["ETag"] = entry["etag"]
+            if entry["last_modified"]:
+                response["Last-Modified"] = entry["last_modified"]
+            response["X-Cache"] = "hit" if hit else "miss"
+            return get_conditional_response(
+                request,
+                etag=entry["etag"],
+                last_modified=entry["last_modified"] and parse_http_date_safe(entry["last_modified"]),
+                response=response,
+            )
+        return wrapped
+    return decorator
@@ -0,0 +1,28 @@
+from django import forms
+
+from giveaid.methods import PAYMENT_METHOD_CODES
+
+
+class DonationForm(forms.Form):
+    cause = forms.IntegerField(min_value=1)
+    amount = forms.DecimalField(max_digits=12, decimal_places=2, min_value=0.01)
+    payment_method = forms.ChoiceField(choices=[(code, code) for code in PAYMENT_METHOD_CODES], required=False)
+    description = forms.CharField(required=False)
+    # Only required when the donor is not logged in.
+    email = forms.EmailField(required=False)
+    firstname = forms.CharField(max_length=255, required=False)
+    lastname = forms.CharField(max_length=255, required=False)
+
+    ANONYMOUS_FIELDS = ("email", "firstname", "lastname")
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.user is None or not self.user.is_authenticated:
+            for field in self.ANONYMOUS_FIELDS:
+                if not cleaned_data.get(field) and field not in self._errors:
+                    self.add_error(field, "This field is required.")
+        return cleaned_data
@@ -0,0 +1,83 @@
+from giveaid.models import Cause, Payment, SuccessStory
+
+
+class ValuesSerializer:
+    """
+    Serialize rows fetched with ``.values()`` instead of model instances.
+
+    ``fields`` maps each output key to an ORM lookup; lookups that span a
+    relation (``"cause__title"``) become joins in the same query, so only the
+    listed columns are ever selected.
+    """
+    model = None
+    fields = {}
+
+    def get_queryset(self):
+        return self.model.objects.values(*self.fields.values())
+
+    def to_representation(self, row):
+        return {key: row[lookup] for key, lookup in self.fields.items()}
+
+    def serialize(self, rows):
+        return [self.to_representation(row) for row in rows]
+
+    def serialize_instance(self, instance):
+        row = {}
+        for lookup in self.fields.values():
+            value = instance
+            for attr in lookup.split("__"):
+                value = getattr(value, attr)
+            row[lookup] = value
+        return self.to_representation(row)
+
+
+class CauseSerializer(ValuesSerializer):
+    model = Cause
+    fields = {
+        "id": "id",
+        "title": "title",
+        "description": "description",
+        "created_at": "created_at",
+        "updated_at": "updated_at",
+        "amount_raised": "totals__total_amount",
+        "payment_count": "totals__payment_count",
+        "donor_count": "totals__donor_count",
+        "anonymous_donor_count": "totals__anonymous_donor_count",
+        "last_donation_at": "totals__last_donation_at",
+    }
+
+    def to_representation(self, row):
+        data = super().to_representation(row)
+        # Causes nobody has paid into yet have no totals row.
+        if data["payment_count"] is None:
+            data.update(amount_raised="0.00", payment_count=0, donor_count=0, anonymous_donor_count=0)
+        return data
+
+
+class SuccessStorySerializer(ValuesSerializer):
+    model = SuccessStory
+    fields = {
+        "id": "id",
+        "title": "title",
+        "description": "description",
+        "created_at": "created_at",
+        "updated_at": "updated_at",
+        "cause_id": "cause_id",
+        "cause_title": "cause__title",
+        "author": "user__username",
+    }
+
+
+class PaymentSerializer(ValuesSerializer):
+    model = Payment
+    fields = {
+        "id": "id",
+        "transaction_id": "transaction_id",
+        "donation_type": "donation_type",
+        "donation_id": "donation_id",
+        "amount": "amount",
+        "currency": "currency",
+        "payment_method": "method__code",
+        "payment_date": "payment_date",
+        "created_at": "created_at",
+    }
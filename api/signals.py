@@ -0,0 +1,36 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from giveaid.models import Cause, SuccessStory, attach_donations
+from giveaid.signals import payments_created
+
+from . import cache
+
+
+def invalidate(*scopes):
+    cache.invalidate(*scopes)
+    # Bump again once committed, in case another thread cached the
+    # pre-commit state in between.
+    transaction.on_commit(lambda: cache.invalidate(*scopes))
+
+
+@receiver(post_save, sender=Cause)
+@receiver(post_delete, sender=Cause)
+def cause_changed(sender, instance, **kwargs):
+    # Story rows carry their cause's title.
+    invalidate("causes", f"cause:{instance.pk}", "stories")
+
+
+@receiver(post_save, sender=SuccessStory)
+@receiver(post_delete, sender=SuccessStory)
+def story_changed(sender, instance, **kwargs):
+    invalidate("stories")
+
+
+@receiver(payments_created)
+def payments_changed_totals(sender, payments, **kwargs):
+    # The totals receiver has usually attached the donations already.
+    attach_donations([p for p in payments if not hasattr(p, "_donation_cache")])
+    causes = {payment.get_donation().cause_id for payment in payments if payment.get_donation() is not None}
+    invalidate("causes", *(f"cause:{cause_id}" for cause_id in sorted(causes)))
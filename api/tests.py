@@ -1,3 +1,512 @@
-from django.test import TestCase
+import base64
+import csv
+import datetime
+import gzip
+import json
+import random
+from decimal import Decimal
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from giveaid import auth, donors, rankings
+from giveaid.gateway import get_gateway
+from giveaid.models import (
+    AuthToken, Cause, CauseTotals, Payment, PaymentMethod, SuccessStory, UnregisteredDonation, User, UserDonation,
+)
+from giveaid.tests import GiveaidFixturesMixin, captured_plans, make_user
+
+from .cache import cache_stats
+
+
+class KeysetPaginationTests(GiveaidFixturesMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        causes = [Cause(title=f"Cause {i}", description="...") for i in range(24)]
+        Cause.objects.bulk_create(causes)
+        # Several rows share a timestamp so the id tie-breaker is exercised.
+        base = timezone.now() - datetime.timedelta(days=1)
+        for i, cause in enumerate(Cause.objects.order_by("id")):
+            Cause.objects.filter(id=cause.id).update(created_at=base + datetime.timedelta(seconds=i // 3))
+        SuccessStory.objects.bulk_create(
+            SuccessStory(user=cls.user, cause=cls.cause, title=f"Story {i}") for i in range(7)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, url, **params):
+        seen, cursor = [], None
+        while True:
+            if cursor:
+                params["cursor"] = cursor
+            with self.assertNumQueries(1):
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            seen.extend(body["results"])
+            cursor = body["next"]
+            if cursor is None:
+                return seen
+
+    def test_cause_pages_cover_every_row_once_in_order(self):
+        rows = self.walk(reverse("api:cause-list"), limit=5)
+        expected = list(Cause.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+        self.assertEqual([row["id"] for row in rows], expected)
+
+    def test_cause_rows_include_totals(self):
+        self.make_payments(2, amount="5.00")
+        rows = {row["id"]: row for row in self.walk(reverse("api:cause-list"), limit=100)}
+        self.assertEqual(rows[self.cause.id]["amount_raised"], "10.00")
+        self.assertEqual(rows[self.cause.id]["payment_count"], 2)
+        untouched = Cause.objects.exclude(id=self.cause.id).first()
+        self.assertEqual(rows[untouched.id]["payment_count"], 0)
+
+    def test_story_rows_join_author_and_cause(self):
+        rows = self.walk(reverse("api:story-list"), limit=3, cause=self.cause.id)
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[0]["author"], "kofi")
+        self.assertEqual(rows[0]["cause_title"], "Clean water")
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse("api:cause-list"), {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_later_pages_seek_to_the_cursor(self):
+        for name in ("cause-list", "story-list"):
+            cursor = self.client.get(reverse(f"api:{name}"), {"limit": 2}).json()["next"]
+            with captured_plans() as plans:
+                self.client.get(reverse(f"api:{name}"), {"limit": 2, "cursor": cursor})
+            ((_, plan),) = plans
+            # One index range from the cursor, read in order: no OR branches, scans or sorts.
+            self.assertRegex(plan[0], r"^SEARCH \w+ USING (COVERING )?INDEX \w+ \(created_at<\?\)$")
+            self.assertTrue(all(step.startswith("SEARCH") for step in plan), plan)
+
+    def test_non_ascii_digits_are_not_ids(self):
+        self.assertEqual(self.client.get(reverse("api:story-list"), {"cause": "\u00b2"}).status_code, 400)
+
+
+class DonorHistoryTests(GiveaidFixturesMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = make_user(cls.city, "yaw")
+        cls.school = Cause.objects.create(title="School books", description="...")
+        base = timezone.now().replace(microsecond=0) - datetime.timedelta(days=3)
+        rng = random.Random(3)
+        for i in range(15):
+            user_donation = UserDonation.objects.create(user=cls.user, cause=rng.choice([cls.cause, cls.school]))
+            anonymous = UnregisteredDonation.objects.create(
+                cause=cls.school, firstname="Kofi", lastname="Donor", email="kofi@example.com",
+            )
+            # Both tables share ids and timestamps, so every tie-breaker is needed.
+            when = base + datetime.timedelta(hours=i // 4)
+            UserDonation.objects.filter(id=user_donation.id).update(created_at=when)
+            UnregisteredDonation.objects.filter(id=anonymous.id).update(created_at=when)
+            for donation_type, donation in ((Payment.USER_DONATION, user_donation), (Payment.UNREGISTERED_DONATION, anonymous)):
+                for _ in range(rng.randint(0, 2)):
+                    Payment.objects.create(
+                        donation_type=donation_type, donation_id=donation.id,
+                        amount=Decimal(rng.choice(["5.00", "12.50"])), payment_method="card",
+                    )
+        UserDonation.objects.create(user=cls.other, cause=cls.cause)
+        User.objects.filter(id=cls.user.id).update(email_verified=True)
+        donors.link_anonymous_donations()
+
+    def expected(self, donations):
+        rows = []
+        for donation_type, queryset in donations:
+            for donation in queryset.select_related("cause"):
+                payments = Payment.objects.filter(donation_type=donation_type, donation_id=donation.id)
+                rows.append({
+                    "donation_type": donation_type,
+                    "id": donation.id,
+                    "cause_title": donation.cause.title,
+                    "created_at": donation.created_at,
+                    "amount": str(sum((p.amount for p in payments), Decimal("0.00"))),
+                    "payment_count": payments.count(),
+                })
+        rows.sort(key=lambda row: (row["created_at"], row["donation_type"], row["id"]), reverse=True)
+        return rows
+
+    def walk(self, **params):
+        seen, cursor = [], None
+        while True:
+            if cursor:
+                params["cursor"] = cursor
+            response = self.client.get(reverse("api:donor-history"), params)
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            seen.extend(
+                {**row, "created_at": datetime.datetime.fromisoformat(row["created_at"].replace("Z", "+00:00"))}
+                for row in body["results"]
+            )
+            cursor = body["next"]
+            if cursor is None:
+                return seen
+
+    def test_pages_merge_registered_and_linked_anonymous_donations(self):
+        self.client.force_login(self.user)
+        rows = self.walk(limit=4)
+        expected = self.expected([
+            (Payment.USER_DONATION, UserDonation.objects.filter(user=self.user)),
+            (Payment.UNREGISTERED_DONATION, UnregisteredDonation.objects.filter(user=self.user)),
+        ])
+        self.assertEqual(len(expected), 30)
+        self.assertEqual([{key: row[key] for key in expected[0]} for row in rows], expected)
+
+    def test_each_page_is_one_query(self):
+        self.client.force_login(self.user)
+        first = self.client.get(reverse("api:donor-history"), {"limit": 5}).json()
+        with self.assertNumQueries(3):
+            # Session, user and the history itself.
+            response = self.client.get(reverse("api:donor-history"), {"limit": 5, "cursor": first["next"]})
+        self.assertEqual(len(response.json()["results"]), 5)
+
+    def test_staff_can_look_up_anonymous_donations_by_email(self):
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(reverse("api:donor-history"), {"email": "kofi@example.com"}).status_code, 403)
+        self.other.is_staff = True
+        self.other.save()
+        rows = self.walk(email="kofi@example.com", limit=6)
+        self.assertEqual(
+            [{key: row[key] for key in ("donation_type", "id", "amount")} for row in rows],
+            [{key: row[key] for key in ("donation_type", "id", "amount")} for row in self.expected([
+                (Payment.UNREGISTERED_DONATION, UnregisteredDonation.objects.filter(email="kofi@example.com")),
+            ])],
+        )
+
+    def test_requires_a_signed_in_donor_and_a_valid_cursor(self):
+        self.assertEqual(self.client.get(reverse("api:donor-history")).status_code, 401)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse("api:donor-history"), {"cursor": "bad"}).status_code, 400)
+
+
+class RankingEndpointTests(GiveaidFixturesMixin, TestCase):
+    def test_top_causes(self):
+        school = Cause.objects.create(title="School books", description="...")
+        self.make_payments(2, amount="10.00")
+        self.make_payments(1, amount="50.00", cause=school)
+        rankings.rebuild()
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("api:ranking", args=["top-causes"]), {"limit": 5})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body["metric"], body["window_hours"]), ("amount", 168))
+        self.assertEqual(
+            [(row["rank"], row["name"], row["amount"], row["payment_count"]) for row in body["results"]],
+            [(1, "School books", "50.00", 1), (2, "Clean water", "20.00", 2)],
+        )
+        self.assertIn("Last-Modified", response)
+
+        response = self.client.get(reverse("api:ranking", args=["top-donors"]))
+        self.assertEqual([row["name"] for row in response.json()["results"]], ["Kofi D."])
+        self.assertEqual(self.client.get(reverse("api:ranking", args=["nope"])).status_code, 404)
+
+
+@override_settings(PASSWORD_HASHER_ITERATIONS=1000)
+class LoginEndpointTests(GiveaidFixturesMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        auth.token_cache().clear()
+        self.user.set_password("correct horse")
+        self.user.save()
+
+    def login(self, **body):
+        return self.client.post(reverse("api:login"), body, content_type="application/json")
+
+    def test_token_login_authenticates_later_requests(self):
+        response = self.login(username="kofi@example.com", password="correct horse")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["user"]["username"], "kofi")
+        headers = {"Authorization": f"Bearer {response.json()['token']}"}
+        self.client.cookies.clear()
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+
+        # The token's user was cached at login: no session or user queries.
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("api:donor-history"), headers=headers)
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.client.post(reverse("api:logout"), headers=headers).status_code, 200)
+        self.assertEqual(self.client.get(reverse("api:donor-history"), headers=headers).status_code, 401)
+
+    def test_session_login(self):
+        response = self.login(username="kofi", password="correct horse", session=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(reverse("api:donor-history")).status_code, 200)
+        self.client.post(reverse("api:logout"), content_type="application/json")
+        self.assertEqual(self.client.get(reverse("api:donor-history")).status_code, 401)
+
+    def test_session_login_and_logout_require_json(self):
+        body = json.dumps({"username": "kofi", "password": "correct horse", "session": True})
+        response = self.client.post(reverse("api:login"), body, content_type="text/plain")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(reverse("api:donor-history")).status_code, 401)
+
+        self.client.force_login(self.user)
+        response = self.client.post(reverse("api:logout"), "", content_type="text/plain")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(reverse("api:donor-history")).status_code, 200)
+
+    def test_rejects_bad_credentials(self):
+        self.assertEqual(self.login(username="kofi", password="wrong").status_code, 401)
+        self.assertEqual(self.login(username="nobody", password="correct horse").status_code, 401)
+        self.assertEqual(self.login(username="kofi").status_code, 400)
+        self.assertFalse(AuthToken.objects.exists())
+
+
+class PaymentExportEndpointTests(GiveaidFixturesMixin, TestCase):
+    def setUp(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.url = reverse("api:payment-export")
+
+    def test_streams_csv_to_staff_only(self):
+        payments = self.make_payments(3)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        other = make_user(self.city, "yaw")
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+        self.client.force_login(self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertIn('.csv"', response["Content-Disposition"])
+        rows = list(csv.DictReader(b"".join(response.streaming_content).decode().splitlines()))
+        self.assertEqual([int(row["payment_id"]) for row in rows], [p.id for p in payments])
+
+    def test_gzipped_jsonl_with_filters(self):
+        school = Cause.objects.create(title="School books", description="...")
+        self.make_payments(2)
+        books = self.make_payments(2, cause=school)
+        self.client.force_login(self.user)
+        response = self.client.get(self.url, {"format": "jsonl", "gzip": "1", "cause": school.id, "start": "2020-01-01"})
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        lines = gzip.decompress(b"".join(response.streaming_content)).decode().splitlines()
+        self.assertEqual([json.loads(line)["payment_id"] for line in lines], [p.id for p in books])
+
+    def test_rejects_bad_parameters(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(self.url, {"format": "xml"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"start": "yesterday"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"cause": "999"}).status_code, 404)
+        self.assertEqual(self.client.get(self.url, {"cause": "\u00b2"}).status_code, 404)
+
+    async def test_streams_asynchronously_under_asgi(self):
+        await sync_to_async(self.make_payments)(2)
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(self.url, {"format": "jsonl"})
+        self.assertTrue(response.is_async)
+        lines = b"".join([chunk async for chunk in response.streaming_content]).splitlines()
+        self.assertEqual(len(lines), 2)
+
+
+@override_settings(PAYMENT_GATEWAY={
+    "BACKEND": "giveaid.gateway.StubGateway",
+    "OPTIONS": {"declined_emails": ["declined@example.com"], "webhook_secret": "test-secret"},
+})
+class AsyncDonationFlowTests(GiveaidFixturesMixin, TestCase):
+    async def donate(self, **overrides):
+        body = {
+            "cause": self.cause.id, "amount": "25.00", "payment_method": "momo",
+            "email": "ama@example.com", "firstname": "Ama", "lastname": "Mensah",
+        }
+        body.update(overrides)
+        return await self.async_client.post(reverse("api:donation-create"), body, content_type="application/json")
+
+    async def test_anonymous_donation_and_confirmation(self):
+        response = await self.donate()
+        self.assertEqual(response.status_code, 201)
+        started = response.json()
+        self.assertEqual(started["donation_type"], Payment.UNREGISTERED_DONATION)
+        self.assertTrue(await UnregisteredDonation.objects.filter(id=started["donation_id"]).aexists())
+
+        response = await self.async_client.post(
+            reverse("api:payment-confirm"), {"reference": started["reference"]}, content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["amount"], "25.00")
+        totals = await CauseTotals.objects.aget(cause=self.cause)
+        self.assertEqual(totals.total_amount, Decimal("25.00"))
+
+        staff = await sync_to_async(make_user)(self.city, "staff", is_staff=True)
+        await self.async_client.aforce_login(staff)
+        response = await self.async_client.get(reverse(
+            "api:donation-payments", args=[started["donation_type"], started["donation_id"]],
+        ))
+        self.assertEqual([row["payment_method"] for row in response.json()["results"]], ["momo"])
+
+    async def test_donation_payments_are_shown_to_their_donor_and_staff_only(self):
+        payment = (await sync_to_async(self.make_payments)(1))[0]
+        url = reverse("api:donation-payments", args=[payment.donation_type, payment.donation_id])
+        self.assertEqual((await self.async_client.get(url)).status_code, 401)
+
+        other = await sync_to_async(make_user)(self.city, "esi")
+        await self.async_client.aforce_login(other)
+        self.assertEqual((await self.async_client.get(url)).status_code, 404)
+
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(url)
+        self.assertEqual([row["id"] for row in response.json()["results"]], [payment.id])
+
+    async def test_malformed_references_are_gateway_errors(self):
+        for payload in (b'{"email": "a@example.com"}', b"[]", b'{"email": "a", "amount": "x", "metadata": {}}'):
+            reference = "stub_" + base64.urlsafe_b64encode(payload).decode()
+            response = await self.async_client.post(
+                reverse("api:payment-confirm"), {"reference": reference}, content_type="application/json",
+            )
+            self.assertEqual(response.status_code, 502)
+        self.assertFalse(await Payment.objects.aexists())
+
+    async def test_donations_must_be_json(self):
+        await self.async_client.aforce_login(self.user)
+        body = json.dumps({"cause": self.cause.id, "amount": "25.00", "payment_method": "momo"})
+        for content_type in ("text/plain", "application/x-www-form-urlencoded"):
+            response = await self.async_client.post(reverse("api:donation-create"), body, content_type=content_type)
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(await UserDonation.objects.aexists())
+
+    async def test_only_known_payment_methods_are_recorded(self):
+        response = await self.donate(payment_method="cheque")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("payment_method", response.json()["errors"])
+
+        started = (await self.donate()).json()
+        reference = await get_gateway().initialize(email="ama@example.com", amount="25.00", metadata={
+            "donation_type": started["donation_type"], "donation_id": started["donation_id"],
+            "payment_method": "cheque",
+        })
+        response = await self.async_client.post(
+            reverse("api:payment-confirm"), {"reference": reference["reference"]}, content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["payment_method"], "other")
+        self.assertFalse(await PaymentMethod.objects.filter(code="cheque").aexists())
+
+    async def test_webhooks_must_be_signed(self):
+        reference = (await self.donate()).json()["reference"]
+        body = json.dumps({"event": "charge.success", "data": {"reference": reference}}).encode()
+        url = reverse("api:payment-webhook")
+        for signature in ("", "0" * 128):
+            response = await self.async_client.post(
+                url, body, content_type="application/json", headers={"X-Stub-Signature": signature},
+            )
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(await Payment.objects.aexists())
+
+        response = await self.async_client.post(
+            url, body, content_type="application/json", headers={"X-Stub-Signature": get_gateway().sign_webhook(body)},
+        )
+        self.assertEqual(response.status_code, 201)
+
+    async def test_logged_in_donor_creates_user_donation(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.donate(email="", firstname="", lastname="")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["donation_type"], Payment.USER_DONATION)
+
+    async def test_invalid_donations_are_rejected(self):
+        response = await self.donate(amount="-3", email="")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()["errors"]), {"amount", "email"})
+        response = await self.donate(cause=999999)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_declined_payment_is_not_recorded(self):
+        response = await self.donate(email="declined@example.com")
+        response = await self.async_client.post(
+            reverse("api:payment-confirm"), {"reference": response.json()["reference"]}, content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 402)
+        self.assertFalse(await Payment.objects.aexists())
+
+
+class SearchEndpointTests(GiveaidFixturesMixin, TestCase):
+    def test_search_returns_ranked_results_in_one_query(self):
+        SuccessStory.objects.create(user=self.user, cause=self.cause, title="Water at last", description="...")
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("api:search"), {"q": "wat"})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual({row["kind"] for row in results}, {"cause", "story"})
+
+        response = self.client.get(reverse("api:search"), {"q": "wat", "type": "story"})
+        self.assertEqual([row["title"] for row in response.json()["results"]], ["Water at last"])
+
+    def test_search_requires_a_query_and_a_known_type(self):
+        self.assertEqual(self.client.get(reverse("api:search")).status_code, 400)
+        response = self.client.get(reverse("api:search"), {"q": "water", "type": "user"})
+        self.assertEqual(response.status_code, 400)
+
+
+class ResponseCacheTests(GiveaidFixturesMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        cache_stats.clear()
+        self.url = reverse("api:cause-detail", args=[self.cause.id])
+
+    def test_second_read_is_served_from_the_cache(self):
+        with self.assertNumQueries(1):
+            first = self.client.get(self.url)
+        self.assertEqual(first["X-Cache"], "miss")
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second["X-Cache"], "hit")
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(self.client.get(reverse("api:cause-detail", args=[999999])).status_code, 404)
+
+    def test_conditional_gets_are_answered_without_the_orm(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response["ETag"])
+        self.assertTrue(response["Last-Modified"])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+            self.assertEqual(
+                self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]).status_code, 304,
+            )
+
+    def test_writes_invalidate_the_affected_responses(self):
+        detail = self.client.get(self.url)
+        causes = self.client.get(reverse("api:cause-list"))
+        stories = self.client.get(reverse("api:story-list"))
+
+        self.make_payments(1, amount="7.50")
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=detail["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["amount_raised"], "7.50")
+        self.assertEqual(self.client.get(reverse("api:cause-list"))["X-Cache"], "miss")
+        self.assertEqual(self.client.get(reverse("api:story-list"))["X-Cache"], "hit")
+
+        SuccessStory.objects.create(user=self.user, cause=self.cause, title="Wells dug")
+        self.assertEqual(len(self.client.get(reverse("api:story-list")).json()["results"]), 1)
+        self.assertNotEqual(stories.content, self.client.get(reverse("api:story-list")).content)
+
+        causes = self.client.get(reverse("api:cause-list"))
+        Cause.objects.get(id=self.cause.id).save()
+        response = self.client.get(reverse("api:cause-list"))
+        self.assertEqual(response["X-Cache"], "miss")
+        self.assertNotEqual(response.content, causes.content)
+
+    def test_hit_ratio_under_a_read_heavy_workload(self):
+        causes = [self.cause] + [Cause.objects.create(title=f"Cause {i}", description="...") for i in range(19)]
+        rng = random.Random(7)
+        for step in range(2000):
+            cause = rng.choice(causes)
+            if step % 100 == 99:
+                self.make_payments(1, cause=cause)
+                continue
+            if rng.random() < 0.8:
+                body = self.client.get(reverse("api:cause-detail", args=[cause.id])).json()
+                totals = CauseTotals.objects.filter(cause=cause).first()
+                self.assertEqual(body["payment_count"], totals.payment_count if totals else 0)
+            else:
+                self.client.get(reverse("api:cause-list"))
+        self.assertGreater(cache_stats.ratio, 0.9)
@@ -0,0 +1,25 @@
+from django.urls import path
+
+from . import views
+
+app_name = "api"
+
+urlpatterns = [
+    path("auth/login/", views.login_view, name="login"),
+    path("auth/logout/", views.logout_view, name="logout"),
+    path("causes/", views.cause_list, name="cause-list"),
+    path("causes/<int:pk>/", views.cause_detail, name="cause-detail"),
+    path("stories/", views.success_story_list, name="story-list"),
+    path("search/", views.search_view, name="search"),
+    path("rankings/<str:board>/", views.ranking_view, name="ranking"),
+    path("donors/history/", views.donor_history_view, name="donor-history"),
+    path("donations/", views.create_donation, name="donation-create"),
+    path(
+        "donations/<str:donation_type>/<int:donation_id>/payments/",
+        views.donation_payments,
+        name="donation-payments",
+    ),
+    path("payments/export/", views.export_payments_view, name="payment-export"),
+    path("payments/confirm/", views.confirm_payment, name="payment-confirm"),
+    path("payments/webhook/", views.payment_webhook, name="payment-webhook"),
+]
@@ -1,3 +1,393 @@
-from django.shortcuts import render
+import json
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import alogin, alogout, user_logged_in
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from giveaid.gateway import PaymentGatewayError, get_gateway
+from giveaid.ingest import aingest_payment, recent_payments
+from giveaid.methods import PAYMENT_METHOD_CODES
+from giveaid.middleware import query_budget
+from giveaid import auth, exports, rankings, search
+from giveaid.models import Cause, Payment, UnregisteredDonation, UserDonation
+
+from .cache import cache_response, set_last_modified
+from .history import donor_history
+from .forms import DonationForm
+from .pagination import InvalidCursor, paginate, parse_page_size
+from .serializers import CauseSerializer, PaymentSerializer, SuccessStorySerializer
+
+
+def is_json(request):
+    # Cross-site forms cannot send application/json without a CORS
+    # preflight, so the csrf_exempt views below only act on JSON requests.
+    return request.content_type == "application/json"
+
+
+def parse_json_body(request):
+    """The request's JSON object, or None if it is not a JSON request or object."""
+    if not is_json(request):
+        return None
+    try:
+        body = json.loads(request.body or b"{}")
+    except ValueError:
+        return None
+    return body if isinstance(body, dict) else None
+
+
+def error(detail, status):
+    return JsonResponse({"detail": detail}, status=status)
+
+
+async def aiterate(iterator):
+    """
+    Hand a blocking iterator's items to an async response one at a time.
+    Each step runs on the same worker thread, which owns the iterator's
+    database cursor.
+    """
+    done = object()
+    while (item := await sync_to_async(next)(iterator, done)) is not done:
+        yield item
+
+
+def streaming_response(request, chunks, **kwargs):
+    """
+    A ``StreamingHttpResponse`` over ``chunks``. Under ASGI, Django would
+    read a plain iterator into a list before sending it, so the chunks are
+    wrapped in an async iterator there.
+    """
+    if isinstance(request, ASGIRequest):
+        chunks = aiterate(iter(chunks))
+    return StreamingHttpResponse(chunks, **kwargs)
+
+
+def changed_at(rows):
+    """The timestamps a response built from ``rows`` depends on."""
+    return [row[key] for row in rows for key in ("updated_at", "last_donation_at") if key in row]
+
+
+def paginated_response(request, serializer, queryset):
+    try:
+        page = paginate(
+            queryset,
+            cursor=request.GET.get("cursor"),
+            page_size=parse_page_size(request.GET.get("limit")),
+        )
+    except InvalidCursor:
+        return error("Invalid cursor.", 400)
+    results = serializer.serialize(page.rows)
+    response = JsonResponse({"results": results, "next": page.next_cursor})
+    return set_last_modified(response, changed_at(results))
+
+
+@require_GET
+@query_budget(1)
+@cache_response("causes")
+def cause_list(request):
+    serializer = CauseSerializer()
+    return paginated_response(request, serializer, serializer.get_queryset())
+
+
+@require_GET
+@query_budget(1)
+@cache_response("cause:{pk}")
+def cause_detail(request, pk):
+    serializer = CauseSerializer()
+    row = serializer.get_queryset().filter(id=pk).first()
+    if row is None:
+        return error("Cause not found.", 404)
+    data = serializer.to_representation(row)
+    return set_last_modified(JsonResponse(data), changed_at([data]))
+
+
+@require_GET
+@query_budget(1)
+@cache_response("stories")
+def success_story_list(request):
+    serializer = SuccessStorySerializer()
+    queryset = serializer.get_queryset()
+    cause_id = request.GET.get("cause")
+    if cause_id:
+        if not (cause_id.isascii() and cause_id.isdecimal()):
+            return error("Invalid cause.", 400)
+        queryset = queryset.filter(cause_id=cause_id)
+    return paginated_response(request, serializer, queryset)
+
+
+@require_GET
+@query_budget(1)
+def search_view(request):
+    """Ranked full-text search over causes and success stories."""
+    query = request.GET.get("q", "").strip()
+    if not query:
+        return error("A search query is required.", 400)
+    kind = request.GET.get("type")
+    if kind and kind not in search.INDEXES:
+        return error(f"Unknown type; expected one of {', '.join(search.INDEXES)}.", 400)
+    results = search.search(
+        query,
+        kinds=(kind,) if kind else tuple(search.INDEXES),
+        limit=parse_page_size(request.GET.get("limit")),
+    )
+    return JsonResponse({"results": results})
+
+
+@require_GET
+@query_budget(2)
+def ranking_view(request, board):
+    """The top ``limit`` members of a leaderboard over its current window."""
+    try:
+        board = rankings.get_board(board)
+    except ValueError as exc:
+        return error(str(exc), 404)
+    results = rankings.top(board.name, limit=parse_page_size(request.GET.get("limit")))
+    response = JsonResponse({
+        "board": board.name,
+        "metric": board.metric,
+        "window_hours": board.hours,
+        "results": results,
+    })
+    return set_last_modified(response, changed_at(results))
+
+
+@require_GET
+@query_budget(3)
+def donor_history_view(request):
+    """
+    The signed-in donor's donations, newest first, with amounts and cause
+    titles. Staff may look up anonymous donations with ``?email=``.
+    """
+    if not request.user.is_authenticated:
+        return error("Authentication required.", 401)
+    email = request.GET.get("email")
+    if email and not request.user.is_staff:
+        return error("Only staff may look up other donors.", 403)
+    try:
+        page = donor_history(
+            user=None if email else request.user,
+            email=email,
+            cursor=request.GET.get("cursor"),
+            page_size=parse_page_size(request.GET.get("limit")),
+        )
+    except InvalidCursor:
+        return error("Invalid cursor.", 400)
+    return JsonResponse({"results": page.rows, "next": page.next_cursor})
+
+
+@csrf_exempt
+@require_POST
+async def login_view(request):
+    """
+    Exchange a username (or email) and password for an API token, or for a
+    session cookie with ``"session": true``. Only JSON bodies are read, so a
+    cross-site form cannot log a browser into someone else's account.
+    """
+    body = parse_json_body(request)
+    if body is None or not all(isinstance(body.get(key), str) and body[key] for key in ("username", "password")):
+        return error("username and password are required.", 400)
+    user = await auth.aauthenticate(body["username"], body["password"])
+    if user is None:
+        return error("Invalid username or password.", 401)
+    account = {"id": user.id, "username": user.username, "firstname": user.firstname, "lastname": user.lastname}
+    if body.get("session"):
+        await alogin(request, user)
+        return JsonResponse({"user": account})
+    token, expires_at = await auth.aissue_token(user)
+    await user_logged_in.asend(sender=type(user), request=request, user=user)
+    return JsonResponse({"token": token, "expires_at": expires_at, "user": account}, status=201)
+
+
+@csrf_exempt
+@require_POST
+async def logout_view(request):
+    """Revoke the request's token, or end its session (JSON requests only)."""
+    token = auth.token_from_request(request)
+    if token is not None:
+        await auth.arevoke_token(token)
+    elif not is_json(request):
+        return error("Logging out a session requires a JSON request.", 400)
+    else:
+        await alogout(request)
+    return JsonResponse({"detail": "Logged out."})
+
+
+@require_GET
+def export_payments_view(request):
+    """
+    Stream every payment with its donation, donor and cause, for staff.
+    ``?start=`` and ``?end=`` (YYYY-MM-DD, inclusive) bound the payment date,
+    ``?cause=`` picks one cause, ``?format=`` is ``csv`` (default) or
+    ``jsonl`` and ``?gzip=1`` compresses the download.
+    """
+    if not request.user.is_authenticated:
+        return error("Authentication required.", 401)
+    if not request.user.is_staff:
+        return error("Only staff may export payments.", 403)
+    fmt = request.GET.get("format", "csv")
+    if fmt not in exports.FORMATS:
+        return error(f"format must be one of {', '.join(exports.FORMATS)}.", 400)
+    bounds = {}
+    for name in ("start", "end"):
+        value = request.GET.get(name)
+        try:
+            bounds[name] = parse_date(value) if value else None
+        except ValueError:
+            bounds[name] = None
+        if value and bounds[name] is None:
+            return error(f"{name} must be a YYYY-MM-DD date.", 400)
+    cause = request.GET.get("cause")
+    if cause is not None and not (cause.isascii() and cause.isdecimal() and Cause.objects.filter(id=cause).exists()):
+        return error("Cause not found.", 404)
+    compress = request.GET.get("gzip") in ("1", "true")
+
+    payments = exports.payments_for_export(bounds["start"], bounds["end"], cause and int(cause))
+    filename = f"payments-{timezone.now():%Y%m%d%H%M%S}.{fmt}" + (".gz" if compress else "")
+    content_type = "application/gzip" if compress else ("text/csv" if fmt == "csv" else "application/x-ndjson")
+    response = streaming_response(
+        request,
+        exports.stream(exports.export_rows(payments), fmt, compress=compress),
+        content_type=content_type,
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response["Cache-Control"] = "no-store"
+    return response
+
+
+@csrf_exempt
+@require_POST
+async def create_donation(request):
+    """Record a donation and start its payment with the gateway."""
+    body = parse_json_body(request)
+    if body is None:
+        return error("Request body must be a JSON object.", 400)
+    user = await request.auser()
+    form = DonationForm(body, user=user)
+    if not form.is_valid():
+        return JsonResponse({"errors": form.errors}, status=400)
+    data = form.cleaned_data
+    if not await Cause.objects.filter(id=data["cause"]).aexists():
+        return error("Cause not found.", 404)
+
+    if user.is_authenticated:
+        donation = await UserDonation.objects.acreate(
+            user=user, cause_id=data["cause"], description=data["description"] or None,
+        )
+        donation_type, email = Payment.USER_DONATION, user.email
+    else:
+        donation = await UnregisteredDonation.objects.acreate(
+            cause_id=data["cause"], firstname=data["firstname"], lastname=data["lastname"], email=data["email"],
+        )
+        donation_type, email = Payment.UNREGISTERED_DONATION, data["email"]
+
+    try:
+        transaction = await get_gateway().initialize(
+            email=email,
+            amount=data["amount"],
+            metadata={
+                "donation_type": donation_type,
+                "donation_id": donation.id,
+                "payment_method": data["payment_method"],
+            },
+        )
+    except PaymentGatewayError:
+        return error("The payment gateway is unavailable.", 502)
+    return JsonResponse({
+        "donation_type": donation_type,
+        "donation_id": donation.id,
+        "reference": transaction["reference"],
+        "authorization_url": transaction["authorization_url"],
+    }, status=201)
+
+
+def verified_payment_method(metadata, result):
+    """
+    The method to record: the donor's choice, else the gateway's channel,
+    else "other". A verified payment is recorded whatever the gateway
+    reports, but only known codes reach the method table.
+    """
+    for code in (metadata.get("payment_method"), result["channel"]):
+        if code in PAYMENT_METHOD_CODES:
+            return code
+    return "other"
+
+
+async def record_verified_payment(reference):
+    """
+    Verify ``reference`` with the gateway and record its Payment once, using
+    the reference as the idempotency key. Replays answer 200 with the stored
+    payment; recent ones skip the gateway and the database entirely.
+    """
+    serializer = PaymentSerializer()
+    cached = recent_payments.get(reference)
+    if cached is not None:
+        return JsonResponse(serializer.serialize_instance(cached))
+    try:
+        result = await get_gateway().verify(reference)
+    except PaymentGatewayError:
+        return error("The transaction could not be verified.", 502)
+    if result["status"] != "success":
+        return error("The payment was not successful.", 402)
+
+    metadata = result["metadata"]
+    model = Payment.DONATION_MODELS.get(metadata.get("donation_type"))
+    if model is None:
+        return error("The transaction is not linked to a donation.", 400)
+    try:
+        donation = await model.objects.aget(id=metadata.get("donation_id"))
+    except (model.DoesNotExist, ValueError, TypeError):
+        return error("Donation not found.", 404)
+
+    payment, created = await aingest_payment(
+        reference,
+        donation_type=metadata["donation_type"],
+        donation_id=donation.id,
+        amount=result["amount"],
+        payment_method=verified_payment_method(metadata, result),
+    )
+    return JsonResponse(serializer.serialize_instance(payment), status=201 if created else 200)
+
+
+@csrf_exempt
+@require_POST
+async def confirm_payment(request):
+    """Verify a gateway transaction and record its Payment."""
+    body = parse_json_body(request)
+    if body is None or not isinstance(body.get("reference"), str):
+        return error("A transaction reference is required.", 400)
+    return await record_verified_payment(body["reference"])
+
+
+@csrf_exempt
+@require_POST
+async def payment_webhook(request):
+    """Gateway callback; may be delivered any number of times per transaction."""
+    if not get_gateway().verify_webhook(request.body, request.headers):
+        return error("Invalid signature.", 400)
+    body = parse_json_body(request)
+    data = (body or {}).get("data")
+    if not isinstance(data, dict) or not isinstance(data.get("reference"), str):
+        return error("A transaction reference is required.", 400)
+    if body.get("event") != "charge.success":
+        return JsonResponse({"detail": "Ignored."})
+    return await record_verified_payment(data["reference"])
+
+
+@require_GET
+async def donation_payments(request, donation_type, donation_id):
+    """The payments of one donation, for its donor or staff."""
+    user = await request.auser()
+    if not user.is_authenticated:
+        return error("Authentication required.", 401)
+    model = Payment.DONATION_MODELS.get(donation_type)
+    # Other donors' donations are reported as missing rather than forbidden,
+    # so ids cannot be probed.
+    if model is None or not (user.is_staff or await model.objects.filter(id=donation_id, user=user).aexists()):
+        return error("Donation not found.", 404)
+    serializer = PaymentSerializer()
+    rows = serializer.get_queryset().filter(donation_type=donation_type, donation_id=donation_id).order_by("id")
+    return JsonResponse({"results": serializer.serialize([row async for row in rows.aiterator()])})
@@ -0,0 +1,49 @@
+"""
+Helpers shared by the benchmark scripts.
+
+Run a benchmark from the project root with ``python -m benchmarks.<name>``.
+Each script works against a throwaway database created from the project's
+migrations, never against ``db.sqlite3``.
+"""
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+    sys.path.insert(0, str(ROOT))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "giveaid_project.settings")
+    import django
+
+    django.setup()
+
+
+@contextmanager
+def temporary_database(name=None):
+    """
+    Create a migrated scratch database for the default alias and drop it
+    afterwards. ``name`` selects a file for SQLite; in-memory is the default.
+    """
+    from django.db import connection
+
+    if name is not None:
+        connection.settings_dict.setdefault("TEST", {})["NAME"] = str(name)
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+@contextmanager
+def timer():
+    result = {}
+    started = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result["seconds"] = time.perf_counter() - started
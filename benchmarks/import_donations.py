@@ -0,0 +1,71 @@
+"""
+Compare the chunked ``bulk_create`` donation import with the naive per-row
+``save()`` path on SQLite.
+
+    python -m benchmarks.import_donations --rows 20000
+"""
+import argparse
+import csv
+import random
+import tempfile
+from pathlib import Path
+
+from .common import setup_django, temporary_database
+
+
+def write_fixture(path, rows, causes, registered_emails):
+    rng = random.Random(1)
+    with open(path, "w", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(["cause", "email", "firstname", "lastname", "amount", "payment_method"])
+        for i in range(rows):
+            email = rng.choice(registered_emails) if rng.random() < 0.3 else f"donor{i}@example.com"
+            writer.writerow([
+                rng.choice(causes), email, "Ama", "Mensah",
+                f"{rng.randint(1, 50000) / 100:.2f}", rng.choice(["card", "momo", "bank"]),
+            ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--naive-rows", type=int, default=2000, help="The per-row path is slow; time it on fewer rows.")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+    import datetime
+
+    from giveaid.imports import DonationImporter, NaiveDonationImporter, read_rows
+    from giveaid.models import Cause, City, Country, State, User
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with temporary_database(Path(tmp) / "bench.sqlite3"):
+            city = City.objects.create(
+                name="Accra", state=State.objects.create(name="Greater Accra", country=Country.objects.create(name="Ghana"))
+            )
+            emails = []
+            for i in range(200):
+                user = User.objects.create(
+                    username=f"user{i}", email=f"user{i}@example.com", firstname="Kofi", lastname="Mensah",
+                    dob=datetime.date(1990, 1, 1), country=city.state.country, state=city.state, city=city,
+                )
+                emails.append(user.email)
+            titles = [Cause.objects.create(title=f"Cause {i}", description="").title for i in range(50)]
+
+            results = {}
+            for label, importer_class, rows in (
+                ("bulk", DonationImporter, args.rows),
+                ("naive", NaiveDonationImporter, args.naive_rows),
+            ):
+                path = Path(tmp) / f"{label}.csv"
+                write_fixture(path, rows, titles, emails)
+                importer = importer_class(chunk_size=args.chunk_size)
+                stats = importer.run(read_rows(path))
+                results[label] = stats.rows_per_second
+                print(f"{label:>5}: {stats.imported} rows in {stats.elapsed:.2f}s = {stats.rows_per_second:,.0f} rows/s")
+            print(f"speedup: {results['bulk'] / results['naive']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Measure job queue throughput: enqueue the post-payment jobs for a batch of
+payments, then drain them with ``run_workers`` at several pool sizes. Mail
+goes to the locmem backend.
+
+    python -m benchmarks.jobs --payments 5000 --processes 1 2 4
+"""
+import argparse
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+
+from .common import setup_django, temporary_database, timer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payments", type=int, default=5000)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    setup_django()
+    import datetime
+    from io import StringIO
+
+    from django.conf import settings
+    from django.core.management import call_command
+
+    from giveaid.models import Cause, City, Country, Job, Payment, State, User, UserDonation
+    from giveaid.signals import payments_created
+
+    settings.EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+    with tempfile.TemporaryDirectory() as tmp:
+        with temporary_database(Path(tmp) / "bench.sqlite3") as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA journal_mode=WAL")
+            city = City.objects.create(
+                name="Accra", state=State.objects.create(name="Greater Accra", country=Country.objects.create(name="Ghana"))
+            )
+            user = User.objects.create(
+                username="donor", email="donor@example.com", firstname="Ama", lastname="Mensah",
+                dob=datetime.date(1990, 1, 1), country=city.state.country, state=city.state, city=city,
+            )
+            cause = Cause.objects.create(title="Clean water", description="")
+
+            for processes in args.processes:
+                donations = UserDonation.objects.bulk_create(
+                    UserDonation(user=user, cause=cause) for _ in range(args.payments)
+                )
+                payments = Payment.objects.bulk_create(
+                    Payment(
+                        donation_type=Payment.USER_DONATION, donation_id=donation.id, amount=Decimal("10.00"),
+                        payment_method="card", idempotency_key=f"ref-{processes}-{donation.id}",
+                    )
+                    for donation in donations
+                )
+                payments_created.send(sender=Payment, payments=payments)
+                queued = Job.objects.count()
+                with timer() as elapsed:
+                    call_command("run_workers", processes=processes, once=True, stdout=StringIO())
+                left = Job.objects.count()
+                print(
+                    f"{processes} process(es): {queued - left} jobs in {elapsed['seconds']:.2f}s = "
+                    f"{(queued - left) / elapsed['seconds']:,.0f} jobs/s ({left} left)"
+                )
+
+
+if __name__ == "__main__":
+    main()
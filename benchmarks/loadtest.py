@@ -0,0 +1,140 @@
+"""
+Load test the donation -> payment confirmation flow under ASGI and WSGI.
+
+By default the script starts both servers itself against the configured
+database (use a scratch copy, it writes donations and payments)::
+
+    uvicorn giveaid_project.asgi:application          (ASGI, async views)
+    gunicorn giveaid_project.wsgi:application         (WSGI, same views via async_to_sync)
+
+and reports requests per second and p50/p99 latency for each. Pass
+``--asgi-url``/``--wsgi-url`` to target servers you started yourself.
+``--gateway-latency`` sets the stub gateway's simulated round trip, which is
+where the async path's advantage shows::
+
+    python -m benchmarks.loadtest --cause 1 --requests 2000 --concurrency 50 --gateway-latency 0.05
+"""
+import argparse
+import http.client
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from .common import ROOT
+
+
+class Client(threading.local):
+    def connection(self, url):
+        if getattr(self, "conn", None) is None:
+            parts = urlsplit(url)
+            self.conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+        return self.conn
+
+    def post(self, url, path, body):
+        conn = self.connection(url)
+        started = time.perf_counter()
+        try:
+            conn.request("POST", path, json.dumps(body), {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn = None
+            return None, time.perf_counter() - started
+        return (response.status, payload), time.perf_counter() - started
+
+
+def run_flow(client, url, cause, index):
+    """One donation plus its confirmation; returns per-request latencies and error count."""
+    latencies, errors = [], 0
+    result, elapsed = client.post(url, "/api/donations/", {
+        "cause": cause, "amount": "10.00", "payment_method": "card",
+        "email": f"load{index}@example.com", "firstname": "Load", "lastname": "Test",
+    })
+    latencies.append(elapsed)
+    if result is None or result[0] != 201:
+        return latencies, errors + 1
+    reference = json.loads(result[1])["reference"]
+    result, elapsed = client.post(url, "/api/payments/confirm/", {"reference": reference})
+    latencies.append(elapsed)
+    if result is None or result[0] != 201:
+        errors += 1
+    return latencies, errors
+
+
+def load(url, cause, flows, concurrency):
+    client = Client()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(lambda i: run_flow(client, url, cause, i), range(flows)))
+    wall = time.perf_counter() - started
+    latencies = sorted(latency for flow, _ in results for latency in flow)
+    return {
+        "requests": len(latencies),
+        "errors": sum(errors for _, errors in results),
+        "rps": len(latencies) / wall,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+
+def start_server(command, port, env):
+    if shutil.which(command[0]) is None:
+        sys.exit(f"{command[0]} is not installed; start the server yourself and pass its URL.")
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        try:
+            http.client.HTTPConnection("127.0.0.1", port, timeout=1).request("HEAD", "/api/causes/")
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    sys.exit(f"{' '.join(command)} did not start listening on port {port}.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cause", type=int, required=True, help="Id of an existing cause to donate to.")
+    parser.add_argument("--requests", type=int, default=1000, help="Donation flows per server (two requests each).")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--gateway-latency", type=float, default=0.05)
+    parser.add_argument("--asgi-url")
+    parser.add_argument("--wsgi-url")
+    args = parser.parse_args()
+
+    env = dict(os.environ, PAYMENT_GATEWAY_STUB_LATENCY=str(args.gateway_latency))
+    servers = []
+    targets = {"asgi": args.asgi_url, "wsgi": args.wsgi_url}
+    commands = {
+        "asgi": ["uvicorn", "giveaid_project.asgi:application", "--port", "8001",
+                 "--workers", str(args.workers), "--no-access-log"],
+        "wsgi": ["gunicorn", "giveaid_project.wsgi:application", "--bind", "127.0.0.1:8002",
+                 "--workers", str(args.workers), "--threads", "8"],
+    }
+    try:
+        for (name, url), port in zip(targets.items(), (8001, 8002)):
+            if url is None:
+                servers.append(start_server(commands[name], port, env))
+                targets[name] = f"http://127.0.0.1:{port}"
+
+        print(f"{'server':<6} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+        for name, url in targets.items():
+            stats = load(url, args.cause, args.requests, args.concurrency)
+            print(f"{name:<6} {stats['requests']:>9} {stats['errors']:>7} {stats['rps']:>9.1f} "
+                  f"{stats['p50_ms']:>9.1f} {stats['p99_ms']:>9.1f}")
+    finally:
+        for process in servers:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
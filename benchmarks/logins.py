@@ -0,0 +1,164 @@
+"""
+Measure API logins per second per core, and the cost of authenticating a
+request afterwards.
+
+Logins run ``--concurrency`` at a time on one event loop, as under ASGI:
+
+``django``  ``django.contrib.auth.aauthenticate()``, which hashes on the
+            single thread ``sync_to_async`` keeps for database work
+``pool``    ``giveaid.auth.aauthenticate()``, which hashes on the password
+            hashing pool
+
+at each ``--iterations`` work factor. Stored hashes start at the first
+factor; a warm-up round lets rehash-on-login move them to the others.
+Alongside the logins a probe runs a one-row query through
+``sync_to_async``, as any other view would, and reports its mean latency.
+Request authentication compares a session lookup with uncached and cached
+token lookups.
+
+    python -m benchmarks.logins --users 20 --logins 200 --concurrency 16 --iterations 720000 260000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from .common import setup_django, temporary_database, timer
+
+
+PASSWORD = "correct horse battery"
+
+
+def cores():
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+
+
+async def run_logins(authenticate, usernames, count, concurrency):
+    """Run ``count`` logins; return the probe query latencies in ms."""
+    from asgiref.sync import sync_to_async
+
+    from giveaid.models import City
+
+    semaphore = asyncio.Semaphore(concurrency)
+    done = asyncio.Event()
+    latencies = []
+
+    async def one(i):
+        async with semaphore:
+            user = await authenticate(usernames[i % len(usernames)], PASSWORD)
+            assert user is not None
+
+    async def probe():
+        while not done.is_set():
+            started = time.perf_counter()
+            await sync_to_async(City.objects.first)()
+            latencies.append((time.perf_counter() - started) * 1000)
+            await asyncio.sleep(0.01)
+
+    probing = asyncio.create_task(probe())
+    await asyncio.gather(*(one(i) for i in range(count)))
+    done.set()
+    await probing
+    return latencies
+
+
+def measure_logins(args, usernames):
+    from django.conf import settings
+    from django.contrib.auth import aauthenticate as django_aauthenticate
+
+    from giveaid import auth
+
+    def django_login(username, password):
+        return django_aauthenticate(username=username, password=password)
+
+    for iterations in args.iterations:
+        settings.PASSWORD_HASHER_ITERATIONS = iterations
+        for name, authenticate in (("django", django_login), ("pool", auth.aauthenticate)):
+            # Warm up: rehash every account to this work factor.
+            asyncio.run(run_logins(authenticate, usernames, len(usernames), args.concurrency))
+            with timer() as elapsed:
+                latencies = asyncio.run(run_logins(authenticate, usernames, args.logins, args.concurrency))
+            rate = args.logins / elapsed["seconds"]
+            print(
+                f"login  {name:<7} {iterations:>8,} iterations  {rate:>8,.1f} logins/s  "
+                f"{rate / cores():>8,.1f} logins/s/core  probe query {statistics.mean(latencies):>8,.1f}ms"
+            )
+
+
+def measure_requests(args, user):
+    from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user
+    from django.contrib.sessions.backends.db import SessionStore
+    from django.test import RequestFactory
+
+    from giveaid import auth
+
+    session = SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = "django.contrib.auth.backends.ModelBackend"
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    request = RequestFactory().get("/")
+    token, _ = auth.issue_token(user)
+
+    def session_user():
+        request.session = SessionStore(session.session_key)
+        return get_user(request)
+
+    def uncached_token_user():
+        auth.token_cache().clear()
+        return auth.user_for_token(token)
+
+    for name, lookup in (
+        ("session", session_user),
+        ("token, uncached", uncached_token_user),
+        ("token, cached", lambda: auth.user_for_token(token)),
+    ):
+        with timer() as elapsed:
+            for _ in range(args.requests):
+                assert lookup().is_authenticated
+        print(f"request {name:<16} {args.requests / elapsed['seconds']:>10,.0f} lookups/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--logins", type=int, default=200, help="Logins timed per configuration.")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--iterations", type=int, nargs="+", default=[720000, 260000])
+    parser.add_argument("--requests", type=int, default=5000, help="Request authentications timed per lookup kind.")
+    args = parser.parse_args()
+
+    setup_django()
+    import datetime
+
+    from django.conf import settings
+    from django.contrib.auth.hashers import make_password
+
+    from giveaid.models import City, Country, State, User
+
+    settings.PASSWORD_HASHER_ITERATIONS = args.iterations[0]
+    settings.LINK_ANONYMOUS_DONATIONS = False
+    print(f"{cores()} cores")
+    with tempfile.TemporaryDirectory() as tmp:
+        with temporary_database(Path(tmp) / "bench.sqlite3"):
+            city = City.objects.create(
+                name="Accra", state=State.objects.create(name="Greater Accra", country=Country.objects.create(name="Ghana"))
+            )
+            password = make_password(PASSWORD)
+            users = User.objects.bulk_create(
+                User(
+                    username=f"donor{i}", email=f"donor{i}@example.com", firstname="Ama", lastname="Mensah",
+                    password=password, dob=datetime.date(1990, 1, 1),
+                    country=city.state.country, state=city.state, city=city,
+                )
+                for i in range(args.users)
+            )
+            measure_logins(args, [user.username for user in users])
+            measure_requests(args, User.objects.get(pk=users[0].pk))
+
+
+if __name__ == "__main__":
+    main()
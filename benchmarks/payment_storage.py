@@ -0,0 +1,141 @@
+"""
+Compare the payments table before and after the compact storage
+migrations (0013-0015): the size of the table and its indexes, and the
+time of the aggregates that read it.
+
+A scratch SQLite database is migrated to 0012, filled with ``--payments``
+rows in the old layout (Decimal amount, method name and donation type
+strings), measured, migrated forward (timed, including the batched data
+migration) and measured again. The totals before and after must agree.
+
+    python -m benchmarks.payment_storage --payments 200000
+"""
+import argparse
+import datetime
+import random
+import tempfile
+import uuid
+from decimal import Decimal
+from pathlib import Path
+
+from .common import setup_django, timer
+
+
+BEFORE = "0012_auth_token"
+METHODS = ["card", "card", "card", "momo", "momo", "bank", "mobile_money", "offline"]
+AMOUNTS = ["5.00", "10.00", "12.50", "20.00", "25.00", "50.00", "100.00", "250.00"]
+
+QUERIES = {
+    "total": "SELECT SUM(amount) FROM payment",
+    "by type": "SELECT donation_type, SUM(amount), COUNT(*) FROM payment GROUP BY donation_type",
+    "by method": "SELECT {method}, SUM(amount), COUNT(*) FROM payment GROUP BY {method}",
+    "by day": "SELECT payment_date, SUM(amount) FROM payment GROUP BY payment_date",
+}
+
+
+def sizes(connection):
+    """Bytes used by the payments table, its donation index and all its indexes."""
+    with connection.cursor() as cursor:
+        cursor.execute("VACUUM")
+        cursor.execute(
+            "SELECT name, SUM(pgsize) FROM dbstat WHERE name IN "
+            "(SELECT name FROM sqlite_master WHERE tbl_name = 'payment') GROUP BY name"
+        )
+        pages = dict(cursor.fetchall())
+    table = pages.pop("payment")
+    return {"table": table, "donation index": pages["payment_donation_idx"], "all indexes": sum(pages.values())}
+
+
+def best_of(repeat, func):
+    times = []
+    for _ in range(repeat):
+        with timer() as elapsed:
+            func()
+        times.append(elapsed["seconds"])
+    return min(times)
+
+
+def measure(connection, method_column, args):
+    results = sizes(connection)
+    with connection.cursor() as cursor:
+        for name, sql in QUERIES.items():
+            sql = sql.format(method=method_column)
+            results[name] = best_of(args.repeat, lambda: cursor.execute(sql).fetchall())
+        cursor.execute("SELECT donation_type, donation_id FROM payment ORDER BY id LIMIT 1")
+        donation_type, donation_id = cursor.fetchone()
+        lookup = "SELECT SUM(amount) FROM payment WHERE donation_type = %s AND donation_id = %s"
+
+        def per_donation():
+            for i in range(1000):
+                cursor.execute(lookup, [donation_type, donation_id + i]).fetchall()
+        results["1000 donations"] = best_of(args.repeat, per_donation)
+    return results
+
+
+def fill(apps, count, seed):
+    rng = random.Random(seed)
+    Payment = apps.get_model("giveaid", "Payment")
+    start = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+    batch = []
+    for i in range(count):
+        created = start + datetime.timedelta(minutes=i)
+        batch.append(Payment(
+            donation_type=rng.choice(["user", "user", "unregistered"]),
+            donation_id=rng.randint(1, count // 2),
+            transaction_id=uuid.uuid4(),
+            amount=Decimal(rng.choice(AMOUNTS)),
+            payment_method=rng.choice(METHODS),
+            payment_date=created.date(),
+            created_at=created,
+            updated_at=created,
+        ))
+        if len(batch) == 5000:
+            Payment.objects.bulk_create(batch)
+            batch = []
+    Payment.objects.bulk_create(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payments", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per query; the best is reported.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.management import call_command
+    from django.db import connection
+    from django.db.migrations.executor import MigrationExecutor
+    from django.db.models import Sum
+
+    from giveaid.models import Payment
+
+    with tempfile.TemporaryDirectory() as tmp:
+        connection.close()
+        connection.settings_dict["NAME"] = str(Path(tmp) / "storage.sqlite3")
+        call_command("migrate", "giveaid", BEFORE, verbosity=0)
+        apps = MigrationExecutor(connection).loader.project_state(("giveaid", BEFORE)).apps
+        fill(apps, args.payments, args.seed)
+        with connection.cursor() as cursor:
+            total_before = cursor.execute("SELECT SUM(amount) FROM payment").fetchone()[0]
+        before = measure(connection, "payment_method", args)
+
+        with timer() as migrating:
+            call_command("migrate", "giveaid", verbosity=0)
+        after = measure(connection, "method_id", args)
+        total_after = Payment.objects.aggregate(total=Sum("amount"))["total"]
+        connection.close()
+
+    assert Decimal(str(total_before)).quantize(Decimal("0.01")) == total_after, (total_before, total_after)
+    print(f"{args.payments:,} payments, migrated in {migrating['seconds']:.1f}s; totals agree ({total_after})")
+    print(f"{'':<16}{'before':>12}{'after':>12}{'change':>10}")
+    for name in before:
+        if name in QUERIES or name == "1000 donations":
+            row = f"{before[name] * 1000:>10.1f}ms{after[name] * 1000:>10.1f}ms"
+        else:
+            row = f"{before[name] / 2**20:>10.2f}MB{after[name] / 2**20:>10.2f}MB"
+        print(f"{name:<16}{row}{after[name] / before[name] - 1:>+10.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Compare the FTS5 search index with ``icontains`` scans over synthetic causes
+and success stories on SQLite.
+
+    python -m benchmarks.search --records 100000
+"""
+import argparse
+import itertools
+import random
+import statistics
+import tempfile
+from pathlib import Path
+
+from .common import setup_django, temporary_database, timer
+
+THEMES = (
+    "water wells school books clinic solar farm seeds health children village library bridge road "
+    "market women youth training nurses vaccines meals shelter flood relief orphans teachers laptops"
+).split()
+# A Zipf-like vocabulary: the themes are the common words, followed by a long tail.
+VOCABULARY = THEMES + [f"term{i}" for i in range(20000)]
+CUMULATIVE_WEIGHTS = list(itertools.accumulate(1 / rank for rank in range(1, len(VOCABULARY) + 1)))
+QUERIES = ["water", "village school", "term15", "term4321", "term98 term99", "vacc"]
+
+
+def sentence(rng, words):
+    return " ".join(rng.choices(VOCABULARY, cum_weights=CUMULATIVE_WEIGHTS, k=words))
+
+
+def measure(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        with timer() as elapsed:
+            function()
+        samples.append(elapsed["seconds"] * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=100000, help="Causes plus stories to generate.")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    import datetime
+
+    from django.db import connection
+
+    from giveaid import search
+    from giveaid.models import Cause, City, Country, State, SuccessStory, User
+
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        with temporary_database(Path(tmp) / "bench.sqlite3"):
+            city = City.objects.create(
+                name="Accra", state=State.objects.create(name="Greater Accra", country=Country.objects.create(name="Ghana"))
+            )
+            user = User.objects.create(
+                username="author", email="author@example.com", firstname="Ama", lastname="Mensah",
+                dob=datetime.date(1990, 1, 1), country=city.state.country, state=city.state, city=city,
+            )
+            causes = args.records // 2
+            with timer() as elapsed:
+                Cause.objects.bulk_create(
+                    (Cause(title=sentence(rng, 4), description=sentence(rng, 40)) for _ in range(causes)),
+                    batch_size=2000,
+                )
+                cause_ids = list(Cause.objects.values_list("id", flat=True))
+                SuccessStory.objects.bulk_create(
+                    (
+                        SuccessStory(user=user, cause_id=rng.choice(cause_ids), title=sentence(rng, 4), description=sentence(rng, 60))
+                        for _ in range(args.records - causes)
+                    ),
+                    batch_size=2000,
+                )
+            print(f"inserted {args.records} records (indexed by triggers) in {elapsed['seconds']:.1f}s")
+
+            print(f"{'query':<20} {'fts ms':>8} {'icontains ms':>13} {'speedup':>8}")
+            for query in QUERIES:
+                fts = measure(lambda: search.search(query, limit=20), args.repeat)
+                scan = measure(
+                    lambda: search._fallback_search(query, list(search.INDEXES), 20, connection.alias), args.repeat,
+                )
+                print(f"{query:<20} {fts:>8.2f} {scan:>13.2f} {scan / fts:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Stress SQLite with concurrent payment writes and reads under each database
+profile, and report write throughput and "database is locked" error rates.
+
+Writer threads record payments through ``ingest_payment()`` (the insert plus
+the cause totals and job queue writes it triggers) while reader threads list
+causes, pausing ``--read-interval`` between reads. Profiles, each on a
+fresh database file:
+
+``default``     rollback journal, deferred transactions
+``production``  the DATABASE_PROFILE=production options (WAL, synchronous
+                NORMAL, mmap, cache size, immediate transactions)
+``coalesced``   production plus PAYMENT_WRITE_COALESCING
+
+    python -m benchmarks.sqlite_stress --writers 16 --payments 100 --readers 4
+"""
+import argparse
+import datetime
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from pathlib import Path
+
+from .common import setup_django, temporary_database, timer
+
+
+PRODUCTION_OPTIONS = {
+    "transaction_mode": "IMMEDIATE",
+    "init_command": (
+        "PRAGMA journal_mode = WAL;"
+        "PRAGMA synchronous = NORMAL;"
+        "PRAGMA mmap_size = 268435456;"
+        "PRAGMA cache_size = -65536;"
+    ),
+}
+PROFILES = {
+    "default": ({}, False),
+    "production": (PRODUCTION_OPTIONS, False),
+    "coalesced": (PRODUCTION_OPTIONS, True),
+}
+
+
+def is_lock_error(exc):
+    return "locked" in str(exc) or "busy" in str(exc)
+
+
+def run_profile(name, args, tmp):
+    from django.conf import settings
+    from django.db import OperationalError, connection, connections
+
+    from api.serializers import CauseSerializer
+    from giveaid.ingest import ingest_payment, payment_writer, recent_payments
+    from giveaid.models import Cause, City, Country, Payment, State, User, UserDonation
+
+    options, coalescing = PROFILES[name]
+    connection.close()
+    # busy_timeout comes from the connection's timeout option.
+    connection.settings_dict["OPTIONS"] = {"timeout": args.timeout, **options}
+    settings.PAYMENT_WRITE_COALESCING = coalescing
+    recent_payments.clear()
+
+    with temporary_database(Path(tmp) / f"{name}.sqlite3"):
+        city = City.objects.create(
+            name="Accra", state=State.objects.create(name="Greater Accra", country=Country.objects.create(name="Ghana"))
+        )
+        user = User.objects.create(
+            username="donor", email="donor@example.com", firstname="Ama", lastname="Mensah",
+            dob=datetime.date(1990, 1, 1), country=city.state.country, state=city.state, city=city,
+        )
+        donation_id = UserDonation.objects.create(user=user, cause=Cause.objects.create(title="Clean water")).id
+        stop = threading.Event()
+        counts = {"written": 0, "write_errors": 0, "reads": 0, "read_errors": 0}
+        lock = threading.Lock()
+
+        def count(key):
+            with lock:
+                counts[key] += 1
+
+        def writer(n):
+            try:
+                for i in range(args.payments):
+                    try:
+                        ingest_payment(
+                            f"{name}-{n}-{i}", donation_type=Payment.USER_DONATION, donation_id=donation_id,
+                            amount=Decimal("10.00"), payment_method="card",
+                        )
+                        count("written")
+                    except OperationalError as exc:
+                        if not is_lock_error(exc):
+                            raise
+                        count("write_errors")
+            finally:
+                connections.close_all()
+
+        def reader():
+            try:
+                while not stop.is_set():
+                    try:
+                        list(CauseSerializer().get_queryset()[:20])
+                        count("reads")
+                        # Think time between requests; back-to-back reads would
+                        # mostly measure GIL contention with the writers.
+                        stop.wait(args.read_interval)
+                    except OperationalError as exc:
+                        if not is_lock_error(exc):
+                            raise
+                        count("read_errors")
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=max(args.readers, 1)) as readers:
+            pending = [readers.submit(reader) for _ in range(args.readers)]
+            with timer() as elapsed:
+                with ThreadPoolExecutor(max_workers=args.writers) as writers:
+                    list(writers.map(writer, range(args.writers)))
+                payment_writer.stop()
+            stop.set()
+            for future in pending:
+                future.result()
+        stored = Payment.objects.count()
+        connections.close_all()
+
+    attempts = counts["written"] + counts["write_errors"]
+    reads = counts["reads"] + counts["read_errors"]
+    print(
+        f"{name:<11} {stored / elapsed['seconds']:>8,.0f} payments/s  "
+        f"write lock errors {counts['write_errors']:>5} ({counts['write_errors'] / attempts:6.1%})  "
+        f"reads {counts['reads'] / elapsed['seconds']:>8,.0f}/s  "
+        f"read lock errors {counts['read_errors']:>4} ({counts['read_errors'] / max(reads, 1):6.1%})"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=16)
+    parser.add_argument("--payments", type=int, default=100, help="Payments per writer thread.")
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--read-interval", type=float, default=0.002, help="Seconds each reader waits between reads.")
+    parser.add_argument("--timeout", type=float, default=5.0, help="Seconds a connection waits for a lock.")
+    parser.add_argument("--profiles", nargs="+", choices=PROFILES, default=list(PROFILES))
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+
+    settings.EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.profiles:
+            run_profile(name, args, tmp)
+
+
+if __name__ == "__main__":
+    main()
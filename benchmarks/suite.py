@@ -0,0 +1,202 @@
+"""
+End-to-end performance suite over a seeded dataset.
+
+Times the key operations (API listings, payment listing with donations,
+donor history, leaderboards, admin changelists, search and donation
+creation) and writes JSON that can be compared across commits:
+
+    python -m benchmarks.suite --scale 0.1 --output before.json
+    # ... change things ...
+    python -m benchmarks.suite --scale 0.1 --output after.json --compare before.json
+
+With ``--compare``, an operation regresses when its median time grows by
+more than ``--threshold`` (a fraction, 0.25 by default) or it runs more
+queries than before; the script then exits with status 1.
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from .common import ROOT, setup_django, temporary_database
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(operation, repeat, warmup=2):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    for _ in range(warmup):
+        operation()
+    samples = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            operation()
+            samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "min_ms": round(samples[0], 3),
+        "queries": len(ctx.captured_queries),
+    }
+
+
+def operations():
+    """Return ``{name: callable}``; each call performs the operation once."""
+    import datetime
+
+    from django.core.cache import cache
+    from django.db.models import Count
+    from django.test import Client
+
+    from giveaid.models import Cause, Payment, User, UserDonation
+
+    client = Client()
+    admin = Client()
+    donor = User.objects.order_by("id").first()
+    admin.force_login(User.objects.create_superuser(
+        username="benchmark-admin", email="benchmark-admin@example.com", password="x",
+        firstname="Bench", lastname="Mark", dob=datetime.date(1980, 1, 1),
+        country_id=donor.country_id, state_id=donor.state_id, city_id=donor.city_id,
+    ))
+    busiest_donor = (
+        UserDonation.objects.values("user_id").annotate(n=Count("id")).order_by("-n").values_list("user_id", flat=True)[0]
+    )
+    donor_client = Client()
+    donor_client.force_login(User.objects.get(id=busiest_donor))
+    cause = Cause.objects.order_by("id").first()
+
+    def get(browser, url, **params):
+        response = browser.get(url, params)
+        assert response.status_code == 200, (url, response.status_code)
+        return response
+
+    def cause_list():
+        cache.clear()
+        get(client, "/api/causes/", limit=20)
+
+    def cause_detail():
+        cache.clear()
+        get(client, f"/api/causes/{cause.id}/")
+
+    def payment_list():
+        for payment in Payment.objects.with_donations("user", "cause").order_by("-created_at", "-id")[:100]:
+            str(payment.get_donation())
+
+    def donation_create():
+        response = client.post("/api/donations/", {
+            "cause": cause.id, "amount": "25.00", "payment_method": "card",
+            "email": "bench@example.com", "firstname": "Bench", "lastname": "Mark",
+        }, content_type="application/json")
+        assert response.status_code == 201, response.content
+        response = client.post(
+            "/api/payments/confirm/", {"reference": response.json()["reference"]}, content_type="application/json",
+        )
+        assert response.status_code == 201, response.content
+
+    return {
+        "api.cause_list": cause_list,
+        "api.cause_list_cached": lambda: get(client, "/api/causes/", limit=20),
+        "api.cause_detail": cause_detail,
+        "api.story_list": lambda: (cache.clear(), get(client, "/api/stories/", limit=20)),
+        "api.search": lambda: get(client, "/api/search/", q="water school"),
+        "api.rankings": lambda: get(client, "/api/rankings/top-causes/", limit=10),
+        "orm.payment_list_with_donations": payment_list,
+        "api.donor_history": lambda: get(donor_client, "/api/donors/history/", limit=50),
+        "admin.payment_changelist": lambda: get(admin, "/admin/giveaid/payment/"),
+        "admin.userdonation_changelist": lambda: get(admin, "/admin/giveaid/userdonation/"),
+        "admin.cause_changelist": lambda: get(admin, "/admin/giveaid/cause/"),
+        "api.donation_create_and_confirm": donation_create,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Return ``(name, reason)`` for every regression against ``baseline``."""
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        ratio = current["median_ms"] / before["median_ms"] if before["median_ms"] else 1.0
+        if ratio > 1 + threshold:
+            regressions.append((name, f"median {before['median_ms']:.2f}ms -> {current['median_ms']:.2f}ms ({ratio:.2f}x)"))
+        if current["queries"] > before["queries"]:
+            regressions.append((name, f"queries {before['queries']} -> {current['queries']}"))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=0.1, help="Dataset scale for seed_benchmark (1.0 = 100k donations).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--only", nargs="+", help="Run only operations whose name starts with one of these.")
+    parser.add_argument("--output", type=Path, help="Write the JSON results here instead of stdout.")
+    parser.add_argument("--compare", type=Path, help="Baseline JSON from an earlier run.")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed median slowdown, as a fraction.")
+    args = parser.parse_args()
+
+    setup_django()
+    import django
+    from django.test.utils import setup_test_environment
+
+    from giveaid import seed
+
+    # Allows the test client's host and keeps receipts in memory.
+    setup_test_environment()
+    sizes = seed.SeedSizes().scaled(args.scale)
+    with tempfile.TemporaryDirectory() as tmp:
+        with temporary_database(Path(tmp) / "suite.sqlite3"):
+            seed.generate(sizes, seed=args.seed, log=lambda message: print(f"seed: {message}", file=sys.stderr))
+            results = {}
+            for name, operation in operations().items():
+                if args.only and not name.startswith(tuple(args.only)):
+                    continue
+                results[name] = measure(operation, args.repeat)
+                print(f"{name:<36} {results[name]['median_ms']:>9.2f}ms  {results[name]['queries']:>3} queries", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "scale": args.scale,
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        regressions = compare(results, baseline["results"], args.threshold)
+        for name, reason in regressions:
+            print(f"REGRESSION {name}: {reason}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {baseline['meta'].get('revision') or args.compare}.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,159 @@
 from django.contrib import admin
-from .models import Country, State, City, User, Cause, UserDonation, UnregisteredDonation, Payment, SuccessStory
-
-# Register your models here.
-admin.site.register(Country)
-admin.site.register(State)
-admin.site.register(City)
-admin.site.register(User)
-admin.site.register(Cause)
-admin.site.register(UserDonation)
-admin.site.register(UnregisteredDonation)
-admin.site.register(Payment)
-admin.site.register(SuccessStory)
\ No newline at end of file
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from . import jobs
+from .models import Country, State, City, User, Cause, UserDonation, UnregisteredDonation, Payment, SuccessStory, Job
+
+
+def estimate_row_count(queryset):
+    """
+    A cheap row-count estimate for an unfiltered queryset, or None when the
+    backend has no estimate or the queryset is filtered.
+    """
+    if queryset.query.where:
+        return None
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+        elif connection.vendor == "sqlite":
+            # rowids only grow, so this overcounts by the number of deleted rows.
+            cursor.execute(f"SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}")
+        elif connection.vendor == "mysql":
+            cursor.execute(
+                "SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s",
+                [table],
+            )
+        else:
+            return None
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Skip the exact ``COUNT(*)`` on unfiltered changelists of large tables;
+    small tables and filtered changelists are still counted exactly.
+    """
+    exact_count_threshold = 10000
+
+    @cached_property
+    def count(self):
+        estimate = estimate_row_count(self.object_list)
+        if estimate is None or estimate < self.exact_count_threshold:
+            return super().count
+        return estimate
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    # No date_hierarchy: its drill-down runs a DISTINCT over every row of the
+    # table on each changelist load. Filter dates with list_filter instead;
+    # its choices are fixed ranges and cost no query.
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 100
+
+
+@admin.register(Country)
+class CountryAdmin(admin.ModelAdmin):
+    list_display = ("name", "created_at")
+    search_fields = ("name",)
+
+
+@admin.register(State)
+class StateAdmin(admin.ModelAdmin):
+    list_display = ("name", "country")
+    list_select_related = ("country",)
+    search_fields = ("name",)
+    autocomplete_fields = ("country",)
+
+
+@admin.register(City)
+class CityAdmin(admin.ModelAdmin):
+    list_display = ("name", "state")
+    list_select_related = ("state",)
+    search_fields = ("name",)
+    autocomplete_fields = ("state",)
+
+
+@admin.register(User)
+class UserAdmin(LargeTableAdmin):
+    list_display = ("username", "email", "email_verified", "firstname", "lastname", "city", "is_staff")
+    list_select_related = ("city",)
+    search_fields = ("username", "email")
+    autocomplete_fields = ("country", "state", "city")
+    filter_horizontal = ("groups", "user_permissions")
+
+
+@admin.register(Cause)
+class CauseAdmin(admin.ModelAdmin):
+    list_display = ("title", "amount_raised", "payment_count", "created_at")
+    list_select_related = ("totals",)
+    search_fields = ("title",)
+    list_filter = ("created_at",)
+
+    @admin.display(description="amount raised")
+    def amount_raised(self, obj):
+        totals = getattr(obj, "totals", None)
+        return totals.total_amount if totals else 0
+
+    @admin.display(description="payments")
+    def payment_count(self, obj):
+        totals = getattr(obj, "totals", None)
+        return totals.payment_count if totals else 0
+
+
+@admin.register(UserDonation)
+class UserDonationAdmin(LargeTableAdmin):
+    list_display = ("id", "user", "cause", "created_at")
+    list_select_related = ("user", "cause")
+    autocomplete_fields = ("user", "cause")
+
+
+@admin.register(UnregisteredDonation)
+class UnregisteredDonationAdmin(LargeTableAdmin):
+    list_display = ("id", "email", "firstname", "lastname", "cause", "user", "created_at")
+    list_select_related = ("cause", "user")
+    # Exact match, so the email index is used.
+    search_fields = ("=email",)
+    autocomplete_fields = ("cause", "user")
+
+
+@admin.register(Payment)
+class PaymentAdmin(LargeTableAdmin):
+    list_display = ("id", "transaction_id", "amount", "payment_method", "payment_date", "donation_type", "donation")
+    list_select_related = ("method",)
+    list_filter = ("payment_date",)
+    readonly_fields = ("transaction_id", "idempotency_key")
+
+    def get_queryset(self, request):
+        # Resolve each page's donations, donors and causes in one query per donation table.
+        return super().get_queryset(request).with_donations("user", "cause")
+
+    @admin.display(description="donation")
+    def donation(self, obj):
+        return obj.get_donation()
+
+
+@admin.register(SuccessStory)
+class SuccessStoryAdmin(LargeTableAdmin):
+    list_display = ("title", "cause", "user", "created_at")
+    list_select_related = ("cause", "user")
+    autocomplete_fields = ("user", "cause")
+    list_filter = ("created_at",)
+
+
+@admin.register(Job)
+class JobAdmin(LargeTableAdmin):
+    list_display = ("id", "task", "status", "attempts", "run_at", "locked_by", "updated_at")
+    list_filter = ("status", "task")
+    readonly_fields = ("locked_by", "locked_at", "last_error")
+    actions = ["requeue"]
+
+    @admin.action(description="Requeue selected dead jobs")
+    def requeue(self, request, queryset):
+        count = jobs.requeue(queryset)
+        self.message_user(request, f"Requeued {count} jobs.")
@@ -0,0 +1,205 @@
+"""
+Token authentication for the API.
+
+``aauthenticate()`` checks a username (or email) and password. It loads
+only the user columns requests need plus the hash, and runs the hashing on
+``hashing_pool()``, a thread pool of ``PASSWORD_HASHING_THREADS`` workers
+(one per core by default). PBKDF2 releases the GIL, so logins hash in
+parallel instead of queueing behind the one thread that
+``sync_to_async`` runs database work on. Hashes made with an outdated
+hasher or work factor (see ``giveaid.hashers``) are replaced on success.
+
+``issue_token()`` returns a random token and stores its SHA-256 digest.
+Requests carrying ``Authorization: Bearer <token>`` are authenticated by
+``TokenAuthenticationMiddleware`` through ``user_for_token()``. It caches
+the token's user columns in ``AUTH_TOKEN_CACHE_ALIAS`` for
+``AUTH_TOKEN_CACHE_TIMEOUT`` seconds, unknown tokens included, so a burst
+of requests costs one query per token; give that alias a cache of its own,
+since anyone can fill it with made-up tokens. The user it returns has only
+``USER_FIELDS`` loaded; other columns are fetched when first accessed.
+Revoking a token clears its cache entry. Saving a user clears the entries
+of all their tokens, so deactivation takes effect immediately, and changing
+their password revokes the tokens.
+"""
+import asyncio
+import datetime
+import hashlib
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.db import router
+from django.utils import timezone
+
+from .models import AuthToken, User
+
+
+CACHE_KEY = "giveaid:auth:token:{digest}"
+# The user columns authenticated requests load; the rest are deferred.
+USER_FIELDS = ("id", "username", "email", "firstname", "lastname", "is_active", "is_staff", "is_superuser")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def hashing_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = getattr(settings, "PASSWORD_HASHING_THREADS", None) or os.cpu_count() or 1
+            _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hashing")
+        return _pool
+
+
+def token_cache():
+    return caches[getattr(settings, "AUTH_TOKEN_CACHE_ALIAS", "default")]
+
+
+def digest(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def token_from_request(request):
+    """The token of an ``Authorization: Bearer <token>`` header, or None."""
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    token = token.strip()
+    return token if scheme.lower() in ("bearer", "token") and token else None
+
+
+def verify_password(password, encoded):
+    """
+    Check ``password`` against ``encoded``. Return ``(valid, rehashed)``,
+    where ``rehashed`` is a new hash when the stored one is outdated.
+    """
+    rehashed = []
+    valid = hashers.check_password(password, encoded, setter=lambda raw: rehashed.append(hashers.make_password(raw)))
+    return valid, (rehashed[0] if rehashed else None)
+
+
+def _candidates(identifier):
+    # Usernames cannot contain "@" (see User.Meta.constraints), so an
+    # identifier names at most one account.
+    field = "email" if "@" in identifier else "username"
+    return User.objects.only("password", *USER_FIELDS).filter(**{field: identifier})
+
+
+def authenticate(identifier, password):
+    """
+    The active user with this password and username or, for identifiers
+    containing "@", email; or None.
+    """
+    user = _candidates(identifier).first()
+    if user is None:
+        # Hash anyway, so unknown accounts take as long as wrong passwords.
+        hashers.make_password(password)
+        return None
+    valid, rehashed = verify_password(password, user.password)
+    if not valid or not user.is_active:
+        return None
+    if rehashed:
+        User.objects.filter(pk=user.pk).update(password=rehashed)
+        user.password = rehashed
+    return user
+
+
+async def aauthenticate(identifier, password):
+    """``authenticate()`` with the hashing done on ``hashing_pool()``."""
+    loop = asyncio.get_running_loop()
+    user = await _candidates(identifier).afirst()
+    if user is None:
+        await loop.run_in_executor(hashing_pool(), hashers.make_password, password)
+        return None
+    valid, rehashed = await loop.run_in_executor(hashing_pool(), verify_password, password, user.password)
+    if not valid or not user.is_active:
+        return None
+    if rehashed:
+        await User.objects.filter(pk=user.pk).aupdate(password=rehashed)
+        user.password = rehashed
+    return user
+
+
+def _cache_user(key, user, expires_at):
+    timeout = getattr(settings, "AUTH_TOKEN_CACHE_TIMEOUT", 60)
+    remaining = (expires_at - timezone.now()).total_seconds()
+    token_cache().set(key, [getattr(user, name) for name in USER_FIELDS], max(1, min(timeout, int(remaining))))
+
+
+def _user_from_values(values):
+    if not values:
+        return AnonymousUser()
+    # from_db() takes the values in model field order.
+    values = dict(zip(USER_FIELDS, values))
+    loaded = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+    return User.from_db(router.db_for_read(User), loaded, [values[name] for name in loaded])
+
+
+def issue_token(user):
+    """Store a new token for ``user`` and return ``(token, expires_at)``."""
+    now = timezone.now()
+    expires_at = now + datetime.timedelta(seconds=getattr(settings, "AUTH_TOKEN_TTL", 30 * 24 * 3600))
+    token = secrets.token_urlsafe(32)
+    AuthToken.objects.filter(user=user, expires_at__lte=now).delete()
+    AuthToken.objects.create(digest=digest(token), user=user, expires_at=expires_at)
+    # The login already loaded the columns, so the first request is a cache hit.
+    _cache_user(CACHE_KEY.format(digest=digest(token)), user, expires_at)
+    return token, expires_at
+
+
+async def aissue_token(user):
+    return await sync_to_async(issue_token)(user)
+
+
+def revoke_token(token):
+    key = digest(token)
+    AuthToken.objects.filter(digest=key).delete()
+    token_cache().delete(CACHE_KEY.format(digest=key))
+
+
+async def arevoke_token(token):
+    await sync_to_async(revoke_token)(token)
+
+
+def _lookup(key):
+    """``(values, expires_at)`` of the active user holding the token digest ``key``."""
+    row = (
+        User.objects.filter(is_active=True, auth_tokens__digest=key, auth_tokens__expires_at__gt=timezone.now())
+        .values_list(*USER_FIELDS, "auth_tokens__expires_at")
+        .first()
+    )
+    return (list(row[:-1]), row[-1]) if row else ([], None)
+
+
+def user_for_token(token):
+    """The user a token authenticates, or ``AnonymousUser``."""
+    token_digest = digest(token)
+    key = CACHE_KEY.format(digest=token_digest)
+    values = token_cache().get(key)
+    if values is None:
+        values, expires_at = _lookup(token_digest)
+        if values:
+            _cache_user(key, _user_from_values(values), expires_at)
+        else:
+            token_cache().set(key, [], getattr(settings, "AUTH_TOKEN_CACHE_TIMEOUT", 60))
+    return _user_from_values(values)
+
+
+async def auser_for_token(token):
+    return await sync_to_async(user_for_token)(token)
+
+
+def forget_user(user):
+    """Drop the cached lookups of every token ``user`` holds."""
+    digests = AuthToken.objects.filter(user=user).values_list("digest", flat=True)
+    token_cache().delete_many([CACHE_KEY.format(digest=key) for key in digests])
+
+
+def revoke_user_tokens(user):
+    """Revoke every token ``user`` holds."""
+    forget_user(user)
+    AuthToken.objects.filter(user=user).delete()
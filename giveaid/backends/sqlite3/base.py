@@ -0,0 +1,109 @@
+"""
+The SQLite backend with the ``init_command`` and ``transaction_mode``
+options that Django 5.1 adds, for running production traffic on SQLite:
+
+``init_command``
+    SQL statements, separated by ``;``, run on every new connection. The
+    production profile in settings uses it for the WAL journal and the
+    other pragmas.
+``transaction_mode``
+    ``"DEFERRED"`` (SQLite's default), ``"IMMEDIATE"`` or ``"EXCLUSIVE"``.
+    An immediate transaction takes the write lock at ``BEGIN``, where the
+    busy timeout applies, instead of failing with "database is locked"
+    when a transaction that started by reading tries to write.
+
+With immediate or exclusive transactions, threads of one process also queue
+for the database on a ``threading.Lock`` before ``BEGIN``. SQLite's busy
+handler polls with sleeps of up to 100ms, so a lock released between polls
+sits idle while a dozen threads sleep. The Python lock hands it straight to
+the next thread, and only other processes wait on SQLite.
+
+Both options mean the same as in Django 5.1, so upgrading only needs
+``ENGINE`` switched back to ``django.db.backends.sqlite3``.
+"""
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+
+TRANSACTION_MODES = ("DEFERRED", "EXCLUSIVE", "IMMEDIATE")
+
+# One lock per database file, shared by every connection of the process.
+_write_locks = {}
+_write_locks_guard = threading.Lock()
+
+
+def write_lock(name):
+    with _write_locks_guard:
+        return _write_locks.setdefault(str(name), threading.Lock())
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    _held_write_lock = None
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        # Ours, not sqlite3.connect()'s.
+        kwargs.pop("init_command", None)
+        kwargs.pop("transaction_mode", None)
+        return kwargs
+
+    @property
+    def transaction_mode(self):
+        mode = self.settings_dict["OPTIONS"].get("transaction_mode")
+        if mode is None:
+            return None
+        mode = mode.upper()
+        if mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"settings.DATABASES[{self.alias!r}]['OPTIONS']['transaction_mode'] is "
+                f"{mode!r}; expected one of {', '.join(TRANSACTION_MODES)}."
+            )
+        return mode
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for statement in self.settings_dict["OPTIONS"].get("init_command", "").split(";"):
+            if statement.strip():
+                conn.execute(statement)
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.transaction_mode
+        if mode is None:
+            super()._start_transaction_under_autocommit()
+            return
+        if mode != "DEFERRED":
+            lock = write_lock(self.settings_dict["NAME"])
+            # On timeout, fall through to SQLite's own busy handling.
+            if lock.acquire(timeout=self.settings_dict["OPTIONS"].get("timeout", 5)):
+                self._held_write_lock = lock
+        try:
+            self.cursor().execute(f"BEGIN {mode}")
+        except Exception:
+            self._release_write_lock()
+            raise
+
+    def _release_write_lock(self):
+        lock, self._held_write_lock = self._held_write_lock, None
+        if lock is not None:
+            lock.release()
+
+    def _commit(self):
+        try:
+            return super()._commit()
+        finally:
+            self._release_write_lock()
+
+    def _rollback(self):
+        try:
+            return super()._rollback()
+        finally:
+            self._release_write_lock()
+
+    def _close(self):
+        try:
+            return super()._close()
+        finally:
+            self._release_write_lock()
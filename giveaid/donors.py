@@ -0,0 +1,29 @@
+"""
+Linking anonymous donations to the accounts of the people who made them.
+
+A donor who gives without an account and registers later with the same
+email gets their earlier ``UnregisteredDonation`` rows pointed at the new
+``User``, so their history is a lookup by user rather than a search by
+email. ``LINK_ANONYMOUS_DONATIONS`` turns the background linking on.
+
+Only accounts with ``email_verified`` set are linked: anyone can register
+with someone else's address, and a linked donation shows up in the
+account's donation history. Whatever verifies an email (or changes it)
+must set (or clear) the flag with ``save()``, which queues the linking.
+"""
+from django.db.models import OuterRef, Subquery
+
+from .models import UnregisteredDonation, User
+
+
+def link_anonymous_donations(emails=None):
+    """
+    Link every unlinked anonymous donation (or only those made with
+    ``emails``) to the verified user registered with its email, in one
+    UPDATE; return the number of donations linked.
+    """
+    verified = User.objects.filter(email_verified=True)
+    donations = UnregisteredDonation.objects.filter(user__isnull=True, email__in=verified.values("email"))
+    if emails is not None:
+        donations = donations.filter(email__in=list(emails))
+    return donations.update(user=Subquery(verified.filter(email=OuterRef("email")).values("id")[:1]))
@@ -0,0 +1,206 @@
+"""
+Async payment gateway clients.
+
+The gateway is configured like a cache backend::
+
+    PAYMENT_GATEWAY = {
+        'BACKEND': 'giveaid.gateway.PaystackGateway',
+        'OPTIONS': {'secret_key': '...', 'max_connections': 100},
+    }
+
+``get_gateway()`` returns one shared instance per process. ``PaystackGateway``
+keeps a pooled ``httpx.AsyncClient`` per event loop so keep-alive
+connections are reused across requests instead of re-handshaking TLS for
+every call. ``StubGateway`` never leaves the process and is what tests and
+load tests use; its references can be forged, so ``get_gateway()`` refuses
+it unless ``DEBUG`` or ``TESTING`` is on.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import uuid
+import weakref
+from decimal import Decimal
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+
+class PaymentGatewayError(Exception):
+    pass
+
+
+class BaseGateway:
+    def __init__(self, **options):
+        self.options = options
+
+    async def initialize(self, *, email, amount, metadata):
+        """Start a transaction; return ``{"reference": ..., "authorization_url": ...}``."""
+        raise NotImplementedError
+
+    async def verify(self, reference):
+        """
+        Return ``{"reference", "status", "amount", "channel", "metadata"}`` for a
+        transaction, with ``amount`` as a ``Decimal`` in major units.
+        """
+        raise NotImplementedError
+
+    async def notify(self, reference, event, data=None):
+        """Tell the gateway about a post-payment event (e.g. receipt sent)."""
+
+    def verify_webhook(self, body, headers):
+        """Return True when a webhook request really comes from the gateway."""
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+
+class PaystackGateway(BaseGateway):
+    base_url = "https://api.paystack.co"
+
+    def __init__(self, secret_key, max_connections=100, max_keepalive_connections=20, timeout=10.0, **options):
+        super().__init__(**options)
+        try:
+            import httpx
+        except ImportError as exc:
+            raise ImproperlyConfigured("PaystackGateway requires the httpx package.") from exc
+        self._httpx = httpx
+        self.secret_key = secret_key
+        self.limits = httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_keepalive_connections,
+        )
+        self.timeout = timeout
+        self._clients = weakref.WeakKeyDictionary()
+
+    @property
+    def client(self):
+        # An AsyncClient's pool belongs to the loop that created it.
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = self._httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {self.secret_key}"},
+                limits=self.limits,
+                timeout=self.timeout,
+            )
+        return client
+
+    async def _request(self, method, path, **kwargs):
+        try:
+            response = await self.client.request(method, path, **kwargs)
+            response.raise_for_status()
+            body = response.json()
+        except (self._httpx.HTTPError, ValueError) as exc:
+            raise PaymentGatewayError(str(exc)) from exc
+        if not body.get("status"):
+            raise PaymentGatewayError(body.get("message", "Gateway request failed."))
+        return body["data"]
+
+    async def initialize(self, *, email, amount, metadata):
+        data = await self._request("POST", "/transaction/initialize", json={
+            "email": email,
+            "amount": int(Decimal(amount) * 100),
+            "reference": uuid.uuid4().hex,
+            "metadata": metadata,
+        })
+        return {"reference": data["reference"], "authorization_url": data["authorization_url"]}
+
+    async def verify(self, reference):
+        data = await self._request("GET", f"/transaction/verify/{reference}")
+        return {
+            "reference": data["reference"],
+            "status": data["status"],
+            "amount": Decimal(data["amount"]) / 100,
+            "channel": data.get("channel") or "",
+            "metadata": data.get("metadata") or {},
+        }
+
+    def verify_webhook(self, body, headers):
+        expected = hmac.new(self.secret_key.encode(), body, hashlib.sha512).hexdigest()
+        return hmac.compare_digest(expected, headers.get("X-Paystack-Signature", ""))
+
+    async def aclose(self):
+        for client in list(self._clients.values()):
+            await client.aclose()
+        self._clients.clear()
+
+
+class StubGateway(BaseGateway):
+    """
+    A local gateway for tests and load tests. References are self-describing,
+    so verification works across processes; ``latency`` simulates the
+    network round trip and ``declined_emails`` makes verification fail.
+    Webhooks must be signed like Paystack's, with ``webhook_secret``; without
+    one every webhook is rejected.
+    """
+
+    def __init__(self, latency=0.0, declined_emails=(), webhook_secret="", **options):
+        super().__init__(**options)
+        self.latency = latency
+        self.webhook_secret = webhook_secret
+        self.declined_emails = set(declined_emails)
+        self.notifications = []
+
+    async def _round_trip(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def initialize(self, *, email, amount, metadata):
+        await self._round_trip()
+        payload = json.dumps({"email": email, "amount": str(amount), "metadata": metadata, "nonce": uuid.uuid4().hex})
+        reference = "stub_" + base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+        return {"reference": reference, "authorization_url": f"https://stub.invalid/pay/{reference}"}
+
+    async def verify(self, reference):
+        await self._round_trip()
+        try:
+            encoded = reference.removeprefix("stub_")
+            payload = json.loads(base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)))
+            return {
+                "reference": reference,
+                "status": "failed" if payload["email"] in self.declined_emails else "success",
+                "amount": Decimal(payload["amount"]),
+                "channel": payload["metadata"].get("payment_method") or "card",
+                "metadata": payload["metadata"],
+            }
+        except (ValueError, KeyError, TypeError, AttributeError, ArithmeticError) as exc:
+            raise PaymentGatewayError("Unknown reference.") from exc
+
+    async def notify(self, reference, event, data=None):
+        await self._round_trip()
+        self.notifications.append((reference, event, data))
+
+    def sign_webhook(self, body):
+        """The ``X-Stub-Signature`` header value for ``body``."""
+        return hmac.new(self.webhook_secret.encode(), body, hashlib.sha512).hexdigest()
+
+    def verify_webhook(self, body, headers):
+        if not self.webhook_secret:
+            return False
+        return hmac.compare_digest(self.sign_webhook(body), headers.get("X-Stub-Signature", ""))
+
+
+@lru_cache(maxsize=None)
+def get_gateway():
+    config = getattr(settings, "PAYMENT_GATEWAY", {"BACKEND": "giveaid.gateway.StubGateway"})
+    try:
+        backend = import_string(config["BACKEND"])
+    except (ImportError, KeyError) as exc:
+        raise ImproperlyConfigured(f"Invalid PAYMENT_GATEWAY backend: {exc}") from exc
+    if issubclass(backend, StubGateway) and not (settings.DEBUG or getattr(settings, "TESTING", False)):
+        raise ImproperlyConfigured("StubGateway records payments that never happened; use it only with DEBUG or in tests.")
+    return backend(**config.get("OPTIONS", {}))
+
+
+@receiver(setting_changed)
+def reset_gateway(setting, **kwargs):
+    if setting in ("PAYMENT_GATEWAY", "DEBUG", "TESTING"):
+        get_gateway.cache_clear()
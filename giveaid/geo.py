@@ -0,0 +1,161 @@
+"""
+Process-local, read-through cache of the Country -> State -> City hierarchy.
+
+The geo tables are tiny and almost never change, so the whole hierarchy is
+loaded once (three queries) and served from memory afterwards. Saves and
+deletes of any geo model invalidate it (see ``giveaid.signals``).
+
+With ``GEO_CACHE_SHARED = True`` the snapshot is also stored in Django's
+cache framework (alias ``GEO_CACHE_ALIAS``) under a version key, so one
+process's invalidation makes every other process reload on its next lookup.
+"""
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+
+from .models import City, Country, State
+
+
+VERSION_KEY = "giveaid:geo:version"
+SNAPSHOT_KEY = "giveaid:geo:snapshot:{version}"
+
+
+class GeoHierarchy:
+    """An immutable snapshot of the geo tables with adjacency indexes."""
+
+    def __init__(self, countries, states, cities):
+        self.countries = dict(countries)
+        self.states = {state_id: (name, country_id) for state_id, name, country_id in states}
+        self.cities = {city_id: (name, state_id) for city_id, name, state_id in cities}
+        self.states_by_country = {}
+        for state_id, (_, country_id) in self.states.items():
+            self.states_by_country.setdefault(country_id, []).append(state_id)
+        self.cities_by_state = {}
+        for city_id, (_, state_id) in self.cities.items():
+            self.cities_by_state.setdefault(state_id, []).append(city_id)
+
+    @classmethod
+    def from_database(cls):
+        return cls(
+            Country.objects.values_list("id", "name"),
+            State.objects.values_list("id", "name", "country_id"),
+            City.objects.values_list("id", "name", "state_id"),
+        )
+
+    def __getstate__(self):
+        return {
+            "countries": list(self.countries.items()),
+            "states": [(pk, name, parent) for pk, (name, parent) in self.states.items()],
+            "cities": [(pk, name, parent) for pk, (name, parent) in self.cities.items()],
+        }
+
+    def __setstate__(self, state):
+        self.__init__(state["countries"], state["states"], state["cities"])
+
+
+class GeoCache:
+    def __init__(self):
+        self._snapshot = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return getattr(settings, "GEO_CACHE_SHARED", False)
+
+    @property
+    def backend(self):
+        return caches[getattr(settings, "GEO_CACHE_ALIAS", "default")]
+
+    def _shared_version(self):
+        version = self.backend.get(VERSION_KEY)
+        if version is None:
+            self.backend.add(VERSION_KEY, 1, timeout=None)
+            version = self.backend.get(VERSION_KEY, 1)
+        return version
+
+    def _load(self, version):
+        if version is None:
+            return GeoHierarchy.from_database()
+        key = SNAPSHOT_KEY.format(version=version)
+        snapshot = self.backend.get(key)
+        if snapshot is None:
+            snapshot = GeoHierarchy.from_database()
+            self.backend.set(key, snapshot, timeout=None)
+        return snapshot
+
+    def snapshot(self):
+        version = self._shared_version() if self.shared else None
+        snapshot = self._snapshot
+        if snapshot is None or version != self._version:
+            with self._lock:
+                snapshot = self._snapshot = self._load(version)
+                self._version = version
+        return snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+        if self.shared:
+            try:
+                self.backend.incr(VERSION_KEY)
+            except ValueError:
+                self.backend.add(VERSION_KEY, 1, timeout=None)
+
+    def country_name(self, country_id):
+        return self.snapshot().countries.get(country_id)
+
+    def state_name(self, state_id):
+        state = self.snapshot().states.get(state_id)
+        return state[0] if state else None
+
+    def city_name(self, city_id):
+        city = self.snapshot().cities.get(city_id)
+        return city[0] if city else None
+
+    def states_of(self, country_id):
+        return list(self.snapshot().states_by_country.get(country_id, ()))
+
+    def cities_of(self, state_id):
+        return list(self.snapshot().cities_by_state.get(state_id, ()))
+
+    def contains(self, country_id, state_id, city_id):
+        """True when the city is in the state and the state is in the country."""
+        snapshot = self.snapshot()
+        state = snapshot.states.get(state_id)
+        city = snapshot.cities.get(city_id)
+        return (
+            country_id in snapshot.countries
+            and state is not None and state[1] == country_id
+            and city is not None and city[1] == state_id
+        )
+
+    def location(self, country_id, state_id, city_id):
+        return {
+            "country": self.country_name(country_id),
+            "state": self.state_name(state_id),
+            "city": self.city_name(city_id),
+        }
+
+    def validate_location(self, country_id, state_id, city_id):
+        snapshot = self.snapshot()
+        errors = {}
+        if country_id not in snapshot.countries:
+            errors["country"] = "Select a valid country."
+        state = snapshot.states.get(state_id)
+        if state is None:
+            errors["state"] = "Select a valid state."
+        elif state[1] != country_id:
+            errors["state"] = "This state is not in the selected country."
+        city = snapshot.cities.get(city_id)
+        if city is None:
+            errors["city"] = "Select a valid city."
+        elif city[1] != state_id:
+            errors["city"] = "This city is not in the selected state."
+        if errors:
+            raise ValidationError(errors)
+
+
+geo_cache = GeoCache()
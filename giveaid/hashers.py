@@ -0,0 +1,20 @@
+"""
+PBKDF2 password hashing with a configurable work factor.
+
+``PBKDF2PasswordHasher`` is Django's ``pbkdf2_sha256`` hasher with its
+iteration count taken from ``PASSWORD_HASHER_ITERATIONS`` when that is set
+(Django's default otherwise). It keeps the algorithm name, so existing
+hashes stay valid. Because ``must_update()`` compares iteration counts,
+every stored hash is rewritten with the configured count the next time its
+user logs in. Raising the setting strengthens hashes gradually; lowering it
+makes logins cheaper during campaign spikes, at the price of resistance to
+offline cracking, so it is opt-in.
+"""
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return getattr(settings, "PASSWORD_HASHER_ITERATIONS", None) or super().iterations
@@ -0,0 +1,262 @@
+"""
+Idempotent payment ingestion.
+
+Gateways retry and webhooks are replayed, so every externally triggered
+payment carries an idempotency key (for gateway payments, the transaction
+reference). ``ingest_payment()`` turns a replay into a no-op:
+
+* keys seen recently by this process are answered from an LRU without
+  touching the database;
+* otherwise a single ``INSERT ... ON CONFLICT (idempotency_key) DO UPDATE
+  ... RETURNING`` round trip either inserts the payment or returns the row
+  that already holds the key. Backends without ``RETURNING`` fall back to
+  insert-then-select on conflict.
+
+With ``PAYMENT_WRITE_COALESCING`` on, calls made outside a transaction hand
+their payment to ``payment_writer``, a single writer thread that records up
+to ``PAYMENT_WRITE_BATCH_SIZE`` payments per transaction. It waits at most
+``PAYMENT_WRITE_MAX_DELAY`` seconds for a batch to fill. On SQLite a burst
+then costs one write lock and one commit per batch instead of one per
+payment, and ``payments_created`` fires once per batch.
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connections, router, transaction
+from django.db.models import prefetch_related_objects
+from django.db.models.constants import OnConflict
+
+from .lru import LRUCache
+from .methods import payment_methods
+from .models import Payment
+from .signals import payments_created
+
+
+recent_payments = LRUCache(getattr(settings, "PAYMENT_IDEMPOTENCY_CACHE_SIZE", 10000))
+
+
+logger = logging.getLogger("giveaid.ingest")
+
+
+def _insert_or_get_many(payments, using):
+    """
+    Insert ``payments`` (with distinct idempotency keys) or fetch the rows
+    already holding their keys; return ``[(payment, created), ...]`` in
+    order and send ``payments_created`` once for the new ones.
+    """
+    opts = Payment._meta
+    connection = connections[using]
+    insert_fields = [field for field in opts.local_concrete_fields if not field.generated and field is not opts.pk]
+    key_field = opts.get_field("idempotency_key")
+
+    if (
+        connection.features.can_return_columns_from_insert
+        and connection.features.supports_update_conflicts_with_target
+        and (len(payments) == 1 or connection.features.can_return_rows_from_bulk_insert)
+    ):
+        # Rewriting the key with its own value turns the conflict into a
+        # no-op update that RETURNING can report on.
+        returning_fields = opts.local_concrete_fields
+        attnames = [field.attname for field in returning_fields]
+        batch_size = connection.ops.bulk_batch_size(insert_fields, payments)
+        stored = {}
+        for start in range(0, len(payments), batch_size):
+            rows = Payment.objects._insert(
+                payments[start:start + batch_size], fields=insert_fields, returning_fields=returning_fields,
+                using=using, on_conflict=OnConflict.UPDATE, update_fields=[key_field], unique_fields=[key_field],
+            )
+            for row in rows:
+                payment = Payment.from_db(using, attnames, row)
+                stored[payment.idempotency_key] = payment
+        # Keep the methods the payments were built with; replays that stored
+        # another one fetch theirs in one query.
+        methods = {payment.method_id: payment.method for payment in payments if Payment.method.is_cached(payment)}
+        for payment in stored.values():
+            if payment.method_id in methods:
+                payment.method = methods[payment.method_id]
+        prefetch_related_objects(list(stored.values()), "method")
+        results = [
+            (stored[payment.idempotency_key], stored[payment.idempotency_key].transaction_id == payment.transaction_id)
+            for payment in payments
+        ]
+        created = [payment for payment, is_new in results if is_new]
+        if created:
+            payments_created.send(sender=Payment, payments=created)
+        return results
+
+    results = []
+    for payment in payments:
+        try:
+            with transaction.atomic(using=using):
+                # save() sends payments_created through post_save.
+                payment.save(using=using, force_insert=True)
+            results.append((payment, True))
+        except IntegrityError:
+            results.append((Payment.objects.using(using).select_related("method").get(idempotency_key=payment.idempotency_key), False))
+    return results
+
+
+def _insert_or_get(payment, using):
+    return _insert_or_get_many([payment], using)[0]
+
+
+def _record(payments):
+    """Record ``payments`` in one transaction; return ``[(payment, created), ...]``."""
+    using = router.db_for_write(Payment)
+    with transaction.atomic(using=using):
+        results = _insert_or_get_many(payments, using)
+
+        def remember():
+            # Only remember keys whose row is known to be committed.
+            for stored, _ in results:
+                recent_payments.set(stored.idempotency_key, stored)
+        transaction.on_commit(remember, using=using)
+    return results
+
+
+class PaymentWriteCoalescer:
+    """
+    A writer thread that records the payments handed to ``submit()`` in
+    batches, one transaction per batch.
+    """
+
+    def __init__(self, batch_size=None, max_delay=None):
+        self._batch_size = batch_size
+        self._max_delay = max_delay
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def batch_size(self):
+        return self._batch_size or getattr(settings, "PAYMENT_WRITE_BATCH_SIZE", 100)
+
+    @property
+    def max_delay(self):
+        return self._max_delay if self._max_delay is not None else getattr(settings, "PAYMENT_WRITE_MAX_DELAY", 0.002)
+
+    def submit(self, payment):
+        """Queue ``payment``; return a Future of ``(payment, created)``."""
+        future = Future()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="payment-writer", daemon=True)
+                self._thread.start()
+            self._queue.put((payment, future))
+        return future
+
+    def stop(self):
+        """Write what is queued, then stop the thread (a later submit restarts it)."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._queue.put(None)
+        if thread is not None:
+            thread.join()
+
+    def _next_batch(self):
+        """Block for one item, then gather more until the batch fills or the delay runs out."""
+        item = self._queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is None:
+                # Finish this batch, then stop.
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        try:
+            while (batch := self._next_batch()) is not None:
+                self._write(batch)
+        finally:
+            connections.close_all()
+
+    def _write(self, batch):
+        # Replays of a key within the batch get the first submission's row.
+        by_key = {}
+        for payment, future in batch:
+            by_key.setdefault(payment.idempotency_key, []).append((payment, future))
+        groups = list(by_key.values())
+        close_old_connections()
+        try:
+            results = _record([group[0][0] for group in groups])
+        except Exception as exc:
+            if len(groups) == 1:
+                for _, future in groups[0]:
+                    future.set_exception(exc)
+                return
+            # Keep one bad payment from failing the rest of the batch.
+            logger.warning("Batch of %d payments failed; recording them one by one.", len(groups), exc_info=True)
+            for group in groups:
+                self._write(group)
+            return
+        for (stored, created), group in zip(results, groups):
+            for i, (_, future) in enumerate(group):
+                future.set_result((stored, created and i == 0))
+
+
+payment_writer = PaymentWriteCoalescer()
+
+
+def coalescing(using):
+    return getattr(settings, "PAYMENT_WRITE_COALESCING", False) and not connections[using].in_atomic_block
+
+
+def ingest_payment(idempotency_key, *, donation_type, donation_id, amount, payment_method):
+    """
+    Record a payment once per ``idempotency_key``.
+
+    Returns ``(payment, created)`` like ``get_or_create()``. Replays return the
+    originally stored payment even if their other arguments differ.
+    """
+    cached = recent_payments.get(idempotency_key)
+    if cached is not None:
+        return cached, False
+
+    payment = Payment(
+        idempotency_key=idempotency_key,
+        donation_type=donation_type,
+        donation_id=donation_id,
+        amount=amount,
+        payment_method=payment_method,
+    )
+    using = router.db_for_write(Payment, instance=payment)
+    if coalescing(using):
+        return payment_writer.submit(payment).result()
+    ((stored, created),) = _record([payment])
+    return stored, created
+
+
+async def aingest_payment(idempotency_key, **fields):
+    """
+    ``ingest_payment()`` for async views. With coalescing on, the request
+    awaits the writer thread instead of holding up the thread that every
+    other request's sync database work runs on.
+    """
+    cached = recent_payments.get(idempotency_key)
+    if cached is not None:
+        return cached, False
+    using = router.db_for_write(Payment)
+    if coalescing(using):
+        # The payment_method setter may query for the method; do that off
+        # the event loop.
+        code = fields.pop("payment_method")
+        method = None if code is None else await sync_to_async(payment_methods.method_for)(code, using=using)
+        payment = Payment(idempotency_key=idempotency_key, method=method, **fields)
+        return await asyncio.wrap_future(payment_writer.submit(payment))
+    return await sync_to_async(ingest_payment)(idempotency_key, **fields)
@@ -0,0 +1,204 @@
+"""
+A small database-backed job queue.
+
+Tasks are functions registered with ``@task``. ``enqueue()`` writes ``Job``
+rows through the ORM, so a job enqueued inside a transaction exists exactly
+when that transaction commits: a crash never loses the work and a rollback
+never runs it.
+
+Workers claim due jobs with a conditional UPDATE stamped with a per-claim
+token, which needs no ``SELECT ... FOR UPDATE`` and so also works on SQLite.
+A claim takes the task of the oldest due job and up to that task's
+``batch_size`` jobs of it; batch tasks receive the list of payloads. A
+batch task may return ``{index: exception}`` for the payloads it could not
+handle: only those jobs are retried and the rest are done. Raising fails
+the whole batch.
+
+A failed claim is retried after an exponential backoff with jitter
+(``JOB_RETRY_BACKOFF`` seconds, doubling per attempt, capped at
+``JOB_RETRY_BACKOFF_MAX``). After ``max_attempts`` (``JOB_MAX_ATTEMPTS`` by
+default) the job is dead-lettered: it stays in the table with status
+``dead`` and its last error until ``requeue()`` puts it back. Jobs left
+running by a crashed worker are released after ``JOB_LOCK_TIMEOUT``
+seconds.
+
+Each batch runs in its own ``primary_pinning()`` scope, as a request does:
+the claim's write pins the batch's reads to the primary, and the pin ends
+with the batch instead of lasting for the rest of the worker's life.
+"""
+import logging
+import random
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+from .routers import primary_pinning
+
+
+logger = logging.getLogger("giveaid.jobs")
+
+
+class Task:
+    def __init__(self, func, name, batch_size=1, max_attempts=None):
+        self.func = func
+        self.name = name
+        self.batch_size = batch_size
+        self._max_attempts = max_attempts
+
+    @property
+    def max_attempts(self):
+        return self._max_attempts or getattr(settings, "JOB_MAX_ATTEMPTS", 5)
+
+    def run(self, payloads):
+        """Run the task; return ``{index: exception}`` for the payloads that failed."""
+        if self.batch_size > 1:
+            return self.func(payloads) or {}
+        failures = {}
+        for index, payload in enumerate(payloads):
+            try:
+                self.func(payload)
+            except Exception as exc:
+                failures[index] = exc
+        return failures
+
+
+registry = {}
+
+
+def task(name=None, *, batch_size=1, max_attempts=None):
+    """
+    Register a task. Plain tasks are called with one payload per job; tasks
+    with ``batch_size > 1`` are called with a list of up to that many.
+    """
+    def decorator(func):
+        registry[name or func.__name__] = Task(func, name or func.__name__, batch_size, max_attempts)
+        return func
+    if callable(name):
+        func, name = name, None
+        return decorator(func)
+    return decorator
+
+
+def get_task(name):
+    try:
+        return registry[name]
+    except KeyError:
+        raise ValueError(f"Unknown task {name!r}.") from None
+
+
+def enqueue(name, payload=None, run_at=None):
+    get_task(name)
+    return Job.objects.create(task=name, payload=payload or {}, run_at=run_at or timezone.now())
+
+
+def enqueue_many(name, payloads):
+    get_task(name)
+    now = timezone.now()
+    return Job.objects.bulk_create([Job(task=name, payload=payload, run_at=now) for payload in payloads], batch_size=500)
+
+
+def backoff(attempts):
+    """Seconds to wait before retry number ``attempts``, with jitter."""
+    base = getattr(settings, "JOB_RETRY_BACKOFF", 2.0)
+    cap = getattr(settings, "JOB_RETRY_BACKOFF_MAX", 3600)
+    return min(base * 2 ** (attempts - 1), cap) * random.uniform(0.5, 1.0)
+
+
+def claim(token):
+    """Lock the next batch of due jobs for ``token``; return ``(task, jobs)``."""
+    while True:
+        now = timezone.now()
+        due = Job.objects.filter(status=Job.PENDING, run_at__lte=now).order_by("run_at", "id")
+        name = due.values_list("task", flat=True).first()
+        if name is None:
+            return None, []
+        if name not in registry:
+            due.filter(task=name).update(status=Job.DEAD, last_error=f"Unknown task {name!r}.", updated_at=now)
+            continue
+        task = registry[name]
+        ids = list(due.filter(task=name).values_list("id", flat=True)[:task.batch_size])
+        Job.objects.filter(id__in=ids, status=Job.PENDING).update(
+            status=Job.RUNNING, locked_by=token, locked_at=now, attempts=F("attempts") + 1, updated_at=now,
+        )
+        jobs = list(Job.objects.filter(locked_by=token, status=Job.RUNNING).order_by("id"))
+        if jobs:
+            return task, jobs
+        # Another worker claimed them first.
+
+
+def _fail(task, failures):
+    """Schedule a retry of each failed ``(job, exception)``, or dead-letter it."""
+    now = timezone.now()
+    jobs = []
+    for job, exc in failures:
+        logger.warning("Task %s failed for job %s: %s", task.name, job.id, exc)
+        error = "".join(traceback.format_exception(exc))
+        if job.attempts >= task.max_attempts:
+            job.status = Job.DEAD
+            logger.error("Job %s (%s) dead after %d attempts: %s", job.id, job.task, job.attempts, exc)
+        else:
+            job.status = Job.PENDING
+            job.run_at = now + timedelta(seconds=backoff(job.attempts))
+        job.locked_by, job.locked_at, job.last_error, job.updated_at = "", None, error, now
+        jobs.append(job)
+    Job.objects.bulk_update(jobs, ["status", "run_at", "locked_by", "locked_at", "last_error", "updated_at"])
+
+
+@primary_pinning()
+def run_next():
+    """Claim and run one batch; return the number of jobs it held."""
+    token = uuid.uuid4().hex
+    task, jobs = claim(token)
+    if not jobs:
+        return 0
+    try:
+        failures = task.run([job.payload for job in jobs])
+    except Exception as exc:
+        failures = dict.fromkeys(range(len(jobs)), exc)
+    if failures:
+        _fail(task, [(jobs[index], exc) for index, exc in failures.items()])
+    # The failed jobs were released above; the rest are done.
+    Job.objects.filter(locked_by=token).delete()
+    return len(jobs)
+
+
+def release_stale():
+    """Put back jobs whose worker has held them longer than ``JOB_LOCK_TIMEOUT``."""
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, "JOB_LOCK_TIMEOUT", 600))
+    return Job.objects.filter(status=Job.RUNNING, locked_at__lt=cutoff).update(
+        status=Job.PENDING, locked_by="", locked_at=None, updated_at=timezone.now(),
+    )
+
+
+def requeue(queryset=None):
+    """Give dead jobs (all, or those in ``queryset``) a fresh set of attempts."""
+    queryset = Job.objects.all() if queryset is None else queryset
+    now = timezone.now()
+    return queryset.filter(status=Job.DEAD).update(status=Job.PENDING, attempts=0, run_at=now, updated_at=now)
+
+
+def work(once=False, poll_interval=1.0):
+    """
+    Run jobs until the queue is empty (``once``) or forever; return how many
+    jobs were processed.
+    """
+    processed = 0
+    release_stale()
+    while True:
+        count = run_next()
+        processed += count
+        if count:
+            continue
+        if once:
+            return processed
+        time.sleep(poll_interval)
+        # Drop connections past CONN_MAX_AGE or broken while idle.
+        close_old_connections()
+        release_stale()
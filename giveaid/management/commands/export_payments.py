@@ -0,0 +1,61 @@
+import sys
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from giveaid.exports import FORMATS, export_rows, payments_for_export, stream
+from giveaid.models import Cause
+from giveaid.routers import primary_pinning
+
+
+def date_argument(value):
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise CommandError(f"{value!r} is not a YYYY-MM-DD date.")
+    return parsed
+
+
+class Command(BaseCommand):
+    help = "Stream every payment with its donation, donor and cause to a CSV or JSONL file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default="-", help="File to write; '-' (the default) writes to standard output.")
+        parser.add_argument("--format", choices=FORMATS, help="Output format; guessed from the output extension, CSV by default.")
+        parser.add_argument("--gzip", action="store_true", help="Compress the output; implied by a .gz output name.")
+        parser.add_argument("--start", type=date_argument, help="Only payments made on or after this date (YYYY-MM-DD).")
+        parser.add_argument("--end", type=date_argument, help="Only payments made on or before this date (YYYY-MM-DD).")
+        parser.add_argument("--cause", type=int, help="Only payments for this cause id.")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Payments fetched and resolved per batch.")
+
+    @primary_pinning()
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be positive.")
+        if options["cause"] is not None and not Cause.objects.filter(id=options["cause"]).exists():
+            raise CommandError(f"Cause {options['cause']} does not exist.")
+
+        output = options["output"]
+        suffixes = [] if output == "-" else output.lower().split(".")[1:]
+        compress = options["gzip"] or suffixes[-1:] == ["gz"]
+        fmt = options["format"] or next((suffix for suffix in reversed(suffixes) if suffix in FORMATS), "csv")
+
+        payments = payments_for_export(options["start"], options["end"], options["cause"])
+        count = 0
+
+        def counted(rows):
+            nonlocal count
+            for row in rows:
+                count += 1
+                yield row
+
+        chunks = stream(counted(export_rows(payments, chunk_size=options["chunk_size"])), fmt, compress=compress)
+        with nullcontext(sys.stdout.buffer) if output == "-" else open(output, "wb") as handle:
+            for chunk in chunks:
+                handle.write(chunk)
+            handle.flush()
+        # Progress goes to stderr so it never mixes with an export on stdout.
+        self.stderr.write(f"Exported {count} payments.", style_func=self.style.SUCCESS)
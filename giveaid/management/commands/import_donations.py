@@ -0,0 +1,60 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from giveaid.imports import DonationImporter, NaiveDonationImporter, checkpoint_name, read_rows
+from giveaid.routers import primary_pinning
+
+
+class Command(BaseCommand):
+    help = "Stream donations from a CSV or JSONL file into the database in bulk chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV (with a header row) or JSONL file to import.")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Input format; guessed from the file extension by default.")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Rows written per transaction.")
+        parser.add_argument(
+            "--checkpoint",
+            help="Checkpoint name used to resume an interrupted import. Defaults to the file name and a hash of its contents.",
+        )
+        parser.add_argument("--no-checkpoint", action="store_true", help="Do not record or resume from a checkpoint.")
+        parser.add_argument("--create-causes", action="store_true", help="Create causes whose title is not found instead of rejecting the row.")
+        parser.add_argument("--payment-method", default="offline", help="Payment method for rows that do not specify one.")
+        parser.add_argument("--dry-run", action="store_true", help="Validate and resolve rows without writing anything.")
+        parser.add_argument(
+            "--notify", action="store_true",
+            help="Email receipts and run the other post-payment jobs for imported payments, as for payments made on the site.",
+        )
+        parser.add_argument("--naive", action="store_true", help="Use the per-row save() path (for benchmarking only).")
+
+    @primary_pinning()
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        if not path.is_file():
+            raise CommandError(f"{path} does not exist.")
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be positive.")
+
+        checkpoint = None if options["no_checkpoint"] else (options["checkpoint"] or checkpoint_name(path))
+        importer_class = NaiveDonationImporter if options["naive"] else DonationImporter
+        importer = importer_class(
+            checkpoint=checkpoint,
+            chunk_size=options["chunk_size"],
+            create_causes=options["create_causes"],
+            default_payment_method=options["payment_method"],
+            dry_run=options["dry_run"],
+            notify=options["notify"],
+        )
+        if checkpoint and (start := importer.start_position()):
+            self.stdout.write(f"Resuming {checkpoint} after row {start}.")
+
+        def progress(stats, position):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"row {position}: {stats.imported} imported, {stats.rows_per_second:,.0f} rows/s")
+
+        stats = importer.run(read_rows(path, options["format"]), on_chunk=progress)
+        verb = "Validated" if options["dry_run"] else "Imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {stats.imported} of {stats.read} rows ({stats.rejected} rejected) "
+            f"in {stats.elapsed:.2f}s, {stats.rows_per_second:,.0f} rows/s."
+        ))
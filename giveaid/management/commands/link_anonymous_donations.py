@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from giveaid import donors
+from giveaid.routers import primary_pinning
+
+
+class Command(BaseCommand):
+    help = "Link anonymous donations to the accounts registered with their email."
+
+    @primary_pinning()
+    def handle(self, *args, **options):
+        linked = donors.link_anonymous_donations()
+        self.stdout.write(self.style.SUCCESS(f"Linked {linked} anonymous donations."))
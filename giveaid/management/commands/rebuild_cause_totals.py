@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from giveaid import totals
+from giveaid.routers import primary_pinning
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-cause donation totals from the payments table and verify them."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only compare the stored totals with the payments table; do not rebuild.",
+        )
+
+    @primary_pinning()
+    def handle(self, *args, **options):
+        if not options["check"]:
+            count = totals.rebuild()
+            self.stdout.write(f"Rebuilt totals for {count} causes.")
+
+        mismatches = totals.verify()
+        for cause_id, (stored, expected) in sorted(mismatches.items()):
+            self.stderr.write(f"Cause {cause_id}: stored {stored} != expected {expected}")
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} cause totals do not match the payments table.")
+        self.stdout.write(self.style.SUCCESS("Cause totals verified."))
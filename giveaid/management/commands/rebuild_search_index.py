@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from giveaid import search
+from giveaid.routers import primary_pinning
+
+
+class Command(BaseCommand):
+    help = "Reinstall the full-text search triggers and repopulate the search indexes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="Database to rebuild the indexes on.",
+        )
+
+    @primary_pinning()
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        if not search.supported(connection):
+            self.stdout.write(f"{connection.vendor} has no full-text index; search uses icontains.")
+            return
+        search.rebuild(connection)
+        self.stdout.write(self.style.SUCCESS("Search indexes rebuilt."))
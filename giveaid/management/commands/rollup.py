@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from giveaid import rollups
+from giveaid.routers import primary_pinning
+
+
+class Command(BaseCommand):
+    help = "Fold new payments into the daily donation rollups."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--backfill",
+            action="store_true",
+            help="Discard the rollups and rebuild them from every payment.",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000, help="Payments rolled up per transaction.")
+
+    @primary_pinning()
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options["backfill"]:
+            count = rollups.backfill(batch_size=options["batch_size"])
+        else:
+            count = rollups.update(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rolled up {count} payments in {time.perf_counter() - started:.2f}s."
+        ))
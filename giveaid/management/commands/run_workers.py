@@ -0,0 +1,75 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+# giveaid modules are imported lazily: spawned children load this module
+# before Django is set up.
+
+
+def _init_worker():
+    import django
+    from django.apps import apps
+
+    # Spawned children start without Django; forked ones inherit it.
+    if not apps.ready:
+        django.setup()
+
+
+def _work(once, poll_interval):
+    from giveaid import jobs
+
+    try:
+        return jobs.work(once=once, poll_interval=poll_interval)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Run background jobs (receipts, gateway notifications, rollups) in a pool of worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=2,
+            help="Worker processes; 0 runs the jobs in this process.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no job is due instead of polling for more.",
+        )
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument(
+            "--requeue-dead",
+            action="store_true",
+            help="Give dead-lettered jobs a fresh set of attempts before starting.",
+        )
+
+    def handle(self, *args, **options):
+        from giveaid import jobs
+
+        if options["requeue_dead"]:
+            self.stdout.write(f"Requeued {jobs.requeue()} dead jobs.")
+
+        processes = options["processes"]
+        started = time.perf_counter()
+        if processes <= 0:
+            processed = jobs.work(once=options["once"], poll_interval=options["poll_interval"])
+        else:
+            # Children must open their own connections.
+            connections.close_all()
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("fork" if "fork" in methods else None)
+            with ProcessPoolExecutor(processes, mp_context=context, initializer=_init_worker) as pool:
+                processed = sum(pool.map(
+                    _work, [options["once"]] * processes, [options["poll_interval"]] * processes,
+                ))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {processed} jobs in {elapsed:.2f}s ({processed / elapsed:,.0f} jobs/s) "
+            f"with {max(processes, 1)} process(es)."
+        ))
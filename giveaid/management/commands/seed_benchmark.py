@@ -0,0 +1,45 @@
+import time
+from dataclasses import fields
+
+from django.core.management.base import BaseCommand
+
+from giveaid import seed
+from giveaid.routers import primary_pinning
+
+
+class Command(BaseCommand):
+    help = "Bulk-insert synthetic geo data, users, causes, donations, payments and stories for benchmarking."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale",
+            type=float,
+            default=1.0,
+            help="Multiply the default users, causes, donations and stories (10k/200/100k/2k).",
+        )
+        for field in fields(seed.SeedSizes):
+            parser.add_argument(
+                f"--{field.name.replace('_', '-')}",
+                type=field.type,
+                default=None,
+                help=f"Override the scaled {field.name.replace('_', ' ')} (default {field.default}).",
+            )
+        parser.add_argument("--seed", type=int, default=0, help="Random seed, for reproducible datasets.")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per INSERT batch.")
+
+    @primary_pinning()
+    def handle(self, *args, **options):
+        sizes = seed.SeedSizes().scaled(options["scale"])
+        for field in fields(seed.SeedSizes):
+            if options[field.name] is not None:
+                setattr(sizes, field.name, options[field.name])
+
+        started = time.perf_counter()
+
+        def log(message):
+            self.stdout.write(f"[{time.perf_counter() - started:7.1f}s] {message}")
+
+        payments = seed.generate(sizes, seed=options["seed"], batch_size=options["batch_size"], log=log)
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {payments} payments in {time.perf_counter() - started:.1f}s."
+        ))
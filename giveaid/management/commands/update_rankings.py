@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from giveaid import rankings
+from giveaid.routers import primary_pinning
+
+
+class Command(BaseCommand):
+    help = "Fold new payments into the leaderboards and expire hours that left their windows."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Discard the leaderboards and recompute them from the payments in their windows.",
+        )
+
+    @primary_pinning()
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options["rebuild"]:
+            count = rankings.rebuild()
+            summary = f"Rebuilt {len(rankings.BOARDS)} leaderboards ({count} entries)"
+        else:
+            count = rankings.update()
+            summary = f"Ranked {count} new payments"
+        self.stdout.write(self.style.SUCCESS(f"{summary} in {time.perf_counter() - started:.2f}s."))
@@ -0,0 +1,103 @@
+"""
+Process-local cache of the ``PaymentMethod`` lookup table.
+
+Payments store their method as a small id. ``payment_methods`` translates
+between ids and codes (``"card"``, ``"momo"``...) from memory, so recording
+or reading a payment costs no extra query once a method has been seen.
+Codes seen for the first time are created, but only those in
+``PAYMENT_METHOD_CODES`` unless the caller passes ``create=True`` (imports
+do): codes arriving in requests must not grow the table without bound.
+
+Only committed rows are cached. A lookup is remembered when its
+transaction commits (at once under autocommit), so an id created by a
+transaction that later rolls back is never handed out. Saving or deleting
+a method, or flushing the database, clears the cache (see
+``giveaid.signals``).
+"""
+import threading
+from functools import partial
+
+from django.db import router, transaction
+
+from .models import PaymentMethod
+
+
+# What donors pick from, the channels Paystack reports, the import default
+# and "other" for anything else a gateway reports.
+PAYMENT_METHOD_CODES = (
+    "card", "momo", "bank", "mobile_money", "bank_transfer", "ussd", "qr", "eft", "apple_pay", "offline", "other",
+)
+
+
+def check_codes(codes):
+    unknown = set(codes) - set(PAYMENT_METHOD_CODES)
+    if unknown:
+        raise ValueError(
+            f"Unknown payment methods: {', '.join(sorted(map(str, unknown)))}; "
+            f"expected one of {', '.join(PAYMENT_METHOD_CODES)}."
+        )
+
+
+class PaymentMethodCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = {}
+        self._codes = {}
+
+    def _remember(self, pk, code):
+        with self._lock:
+            self._ids[code] = pk
+            self._codes[pk] = code
+
+    @staticmethod
+    def _method(pk, code, using):
+        return PaymentMethod.from_db(using, ["id", "code"], [pk, code])
+
+    def method_for(self, code, using=None, create=False):
+        """
+        The ``PaymentMethod`` for ``code``, created if it does not exist yet.
+        Codes outside ``PAYMENT_METHOD_CODES`` raise ``ValueError`` unless
+        ``create``.
+        """
+        if not create:
+            check_codes([code])
+        using = using or router.db_for_write(PaymentMethod)
+        pk = self._ids.get(code)
+        if pk is None:
+            pk = PaymentMethod.objects.using(using).get_or_create(code=code)[0].pk
+            transaction.on_commit(partial(self._remember, pk, code), using=using)
+        return self._method(pk, code, using)
+
+    def methods_for(self, codes, using=None, create=False):
+        """
+        ``{code: PaymentMethod}`` for ``codes``, creating the missing ones in
+        two queries at most. Checked like ``method_for()``.
+        """
+        if not create:
+            check_codes(codes)
+        using = using or router.db_for_write(PaymentMethod)
+        missing = {code for code in codes if code not in self._ids}
+        found = {code: self._ids[code] for code in set(codes) - missing}
+        if missing:
+            methods = PaymentMethod.objects.using(using)
+            methods.bulk_create([PaymentMethod(code=code) for code in missing], ignore_conflicts=True)
+            for pk, code in methods.filter(code__in=missing).values_list("id", "code"):
+                found[code] = pk
+                transaction.on_commit(partial(self._remember, pk, code), using=using)
+        return {code: self._method(pk, code, using) for code, pk in found.items()}
+
+    def code_for(self, pk, using=None):
+        code = self._codes.get(pk)
+        if code is None:
+            using = using or router.db_for_read(PaymentMethod)
+            code = PaymentMethod.objects.using(using).values_list("code", flat=True).get(pk=pk)
+            transaction.on_commit(partial(self._remember, pk, code), using=using)
+        return code
+
+    def invalidate(self):
+        with self._lock:
+            self._ids = {}
+            self._codes = {}
+
+
+payment_methods = PaymentMethodCache()
@@ -0,0 +1,305 @@
+"""
+Per-request database cost instrumentation.
+
+``QueryStatsMiddleware`` installs an execute wrapper on every database
+connection for the duration of the request and records the number of
+queries, total SQL time, repeated statements (the N+1 signature) and view
+time. The numbers are logged to ``giveaid.requests`` for every request and,
+depending on settings, also:
+
+``QUERY_STATS_HEADERS``
+    Add ``X-DB-Queries``, ``X-DB-Time``, ``X-DB-Duplicate-Queries``,
+    ``X-View-Time`` and ``Server-Timing`` response headers. Defaults to
+    ``DEBUG``.
+``QUERY_STATS_HISTOGRAM``
+    Keep the last ``QUERY_STATS_HISTOGRAM_SIZE`` samples per URL name in
+    ``query_stats`` for percentile summaries.
+``QUERY_BUDGET`` / ``QUERY_BUDGET_RAISE``
+    Raise ``QueryBudgetExceeded`` when a view runs more queries than its
+    budget (``QUERY_BUDGET`` or the view's ``@query_budget(n)``). Meant for
+    development and tests; defaults to ``DEBUG``.
+
+Streaming responses run most of their queries after the view returns, while
+the body is sent. Their recorder stays installed until the last chunk, and
+the request is logged and sampled then, with the view time covering the
+whole body. They get no headers, which are already sent by then, and are
+not checked against the budget.
+
+``PrimaryPinningMiddleware`` scopes the read-replica pin of
+``giveaid.routers`` to each request.
+
+``TokenAuthenticationMiddleware`` authenticates API tokens; see
+``giveaid.auth``.
+
+All three middleware run natively under WSGI and ASGI, so an async view is
+not pushed through a thread and back. Under ASGI the ORM runs on the
+request's ``sync_to_async`` thread and uses that thread's connections, so
+the recorder is installed there.
+"""
+import hashlib
+import logging
+import re
+import statistics
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.utils.functional import SimpleLazyObject
+
+from .auth import auser_for_token, token_from_request, user_for_token
+from .routers import primary_pinning
+
+
+logger = logging.getLogger("giveaid.requests")
+
+IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(limit):
+    """Give a view its own query budget instead of ``settings.QUERY_BUDGET``."""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def fingerprint(sql):
+    """A short stable id for a statement, ignoring parameter values and IN-list length."""
+    return hashlib.sha1(IN_LIST.sub("IN (...)", sql).encode()).hexdigest()[:12]
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self):
+        """Fingerprints executed more than once, with their counts."""
+        return {key: count for key, count in self.fingerprints.items() if count > 1}
+
+
+class QueryStats:
+    """Rolling per-URL-name samples of (queries, db ms, view ms)."""
+
+    def __init__(self, size=1000):
+        self.size = size
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def add(self, url_name, queries, db_ms, view_ms):
+        with self._lock:
+            samples = self._samples.setdefault(url_name, deque(maxlen=self.size))
+            samples.append((queries, db_ms, view_ms))
+
+    def summary(self, url_name):
+        with self._lock:
+            samples = list(self._samples.get(url_name, ()))
+        if not samples:
+            return None
+        result = {"requests": len(samples)}
+        for index, name in enumerate(("queries", "db_ms", "view_ms")):
+            values = sorted(sample[index] for sample in samples)
+            result[name] = {
+                "p50": statistics.median(values),
+                "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+                "max": values[-1],
+            }
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+
+query_stats = QueryStats(getattr(settings, "QUERY_STATS_HISTOGRAM_SIZE", 1000))
+
+
+def record_queries(recorder):
+    """
+    Install ``recorder`` on the current thread's connections; close the
+    returned stack to remove it.
+    """
+    stack = ExitStack()
+    for alias in connections:
+        stack.enter_context(connections[alias].execute_wrapper(recorder))
+    return stack
+
+
+class SyncAndAsyncMiddleware:
+    """
+    Base for middleware with a native path for both handlers: subclasses
+    implement ``handle()`` for WSGI and ``__acall__()`` for ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.handle(request)
+
+
+class QueryStatsMiddleware(SyncAndAsyncMiddleware):
+    def handle(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        stack = record_queries(recorder)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            stack.close()
+            raise
+        if response.streaming:
+            return self.stream(request, response, recorder, started, stack)
+        stack.close()
+        return self.report(request, response, recorder, started)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        stack = await sync_to_async(record_queries)(recorder)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            await sync_to_async(stack.close)()
+            raise
+        if response.streaming:
+            return self.stream(request, response, recorder, started, stack)
+        await sync_to_async(stack.close)()
+        return self.report(request, response, recorder, started)
+
+    def stream(self, request, response, recorder, started, stack):
+        """Keep recording until the body is sent; report then."""
+        content = response.streaming_content
+
+        # Under ASGI a sync body is read on the sync thread too.
+        def chunks():
+            try:
+                yield from content
+            finally:
+                stack.close()
+                self.report(request, response, recorder, started, streamed=True)
+
+        async def achunks():
+            try:
+                async for chunk in content:
+                    yield chunk
+            finally:
+                await sync_to_async(stack.close)()
+                self.report(request, response, recorder, started, streamed=True)
+
+        response.streaming_content = achunks() if response.is_async else chunks()
+        return response
+
+    def report(self, request, response, recorder, started, streamed=False):
+        view_ms = (time.perf_counter() - started) * 1000
+        db_ms = recorder.seconds * 1000
+        duplicates = recorder.duplicates
+        match = request.resolver_match
+        url_name = match.view_name if match else None
+
+        logger.info(
+            "%s %s status=%s view=%s queries=%d duplicate_queries=%d db_ms=%.1f view_ms=%.1f",
+            request.method, request.path, response.status_code, url_name,
+            recorder.count, sum(duplicates.values()), db_ms, view_ms,
+            extra={
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "url_name": url_name,
+                "queries": recorder.count,
+                "duplicate_queries": duplicates,
+                "db_ms": round(db_ms, 3),
+                "view_ms": round(view_ms, 3),
+            },
+        )
+        if not streamed and getattr(settings, "QUERY_STATS_HEADERS", settings.DEBUG):
+            response["X-DB-Queries"] = str(recorder.count)
+            response["X-DB-Time"] = f"{db_ms:.1f}ms"
+            response["X-DB-Duplicate-Queries"] = ",".join(f"{key}x{count}" for key, count in duplicates.items())
+            response["X-View-Time"] = f"{view_ms:.1f}ms"
+            response["Server-Timing"] = f"db;dur={db_ms:.1f}, view;dur={view_ms:.1f}"
+        if url_name and getattr(settings, "QUERY_STATS_HISTOGRAM", False):
+            query_stats.add(url_name, recorder.count, db_ms, view_ms)
+
+        budget = getattr(match.func, "query_budget", None) if match else None
+        if budget is None:
+            budget = getattr(settings, "QUERY_BUDGET", None)
+        if (
+            not streamed
+            and budget is not None
+            and recorder.count > budget
+            and getattr(settings, "QUERY_BUDGET_RAISE", settings.DEBUG)
+        ):
+            raise QueryBudgetExceeded(
+                f"{url_name or request.path} ran {recorder.count} queries; its budget is {budget}."
+            )
+        return response
+
+
+class PrimaryPinningMiddleware(SyncAndAsyncMiddleware):
+    """
+    Start every request unpinned (or pinned, for unsafe methods) and drop the
+    pin when it ends, so one request's writes do not pin later requests
+    served by the same thread.
+    """
+
+    def pinned(self, request):
+        return primary_pinning(request.method not in ("GET", "HEAD", "OPTIONS", "TRACE"))
+
+    def handle(self, request):
+        with self.pinned(request):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with self.pinned(request):
+            return await self.get_response(request)
+
+
+class TokenAuthenticationMiddleware(SyncAndAsyncMiddleware):
+    """
+    Authenticate requests carrying ``Authorization: Bearer <token>`` as the
+    token's user, in place of any session user. Goes after
+    ``AuthenticationMiddleware``. The lookup only happens when the view
+    asks for the user.
+    """
+
+    def authenticate(self, request):
+        token = token_from_request(request)
+        if token is not None:
+            request.user = SimpleLazyObject(partial(user_for_token, token))
+            request.auser = partial(auser_for_token, token)
+
+    def handle(self, request):
+        self.authenticate(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        self.authenticate(request)
+        return await self.get_response(request)
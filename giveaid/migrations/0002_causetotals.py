@@ -0,0 +1,29 @@
+# Generated by Django 5.0.14 on 2026-10-18 06:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('giveaid', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CauseTotals',
+            fields=[
+                ('cause', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='totals', serialize=False, to='giveaid.cause')),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('payment_count', models.PositiveBigIntegerField(default=0)),
+                ('donor_count', models.PositiveBigIntegerField(default=0, verbose_name='distinct registered donors')),
+                ('anonymous_donor_count', models.PositiveBigIntegerField(default=0, verbose_name='distinct unregistered donor emails')),
+                ('last_donation_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'causetotals',
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.14 on 2026-10-18 06:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('giveaid', '0002_causetotals'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cause',
+            index=models.Index(fields=['created_at', 'id'], name='cause_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='successstory',
+            index=models.Index(fields=['created_at', 'id'], name='story_created_id_idx'),
+        ),
+    ]
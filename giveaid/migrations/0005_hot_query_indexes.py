@@ -0,0 +1,33 @@
+# Generated by Django 5.0.14 on 2026-10-18 06:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('giveaid', '0004_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['donation_type', 'donation_id'], name='payment_donation_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['payment_date'], name='payment_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='successstory',
+            index=models.Index(fields=['cause', 'created_at'], name='story_cause_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='unregistereddonation',
+            index=models.Index(fields=['email'], name='unregdonation_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userdonation',
+            index=models.Index(fields=['cause', 'created_at'], name='userdonation_cause_created_idx'),
+        ),
+    ]
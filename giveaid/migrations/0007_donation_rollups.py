@@ -0,0 +1,67 @@
+# Generated by Django 5.0.14 on 2026-10-18 06:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('giveaid', '0006_payment_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyDonationRollup',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False, verbose_name='daily donation rollup id')),
+                ('day', models.DateField()),
+                ('payment_method', models.CharField(max_length=255)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('payment_count', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'dailydonationrollup',
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupState',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('last_created_at', models.DateTimeField(blank=True, null=True)),
+                ('last_payment_id', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'rollupstate',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['created_at', 'id'], name='payment_created_id_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailydonationrollup',
+            name='cause',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='giveaid.cause'),
+        ),
+        migrations.AddField(
+            model_name='dailydonationrollup',
+            name='city',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='giveaid.city'),
+        ),
+        migrations.AddField(
+            model_name='dailydonationrollup',
+            name='country',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='giveaid.country'),
+        ),
+        migrations.AddField(
+            model_name='dailydonationrollup',
+            name='state',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='giveaid.state'),
+        ),
+        migrations.AddIndex(
+            model_name='dailydonationrollup',
+            index=models.Index(fields=['day', 'cause'], name='rollup_day_cause_idx'),
+        ),
+    ]
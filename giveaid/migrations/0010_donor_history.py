@@ -0,0 +1,28 @@
+# Generated by Django 5.0.14 on 2026-10-18 06:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('giveaid', '0009_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='unregistereddonation',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='unregistered_donations', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='unregistereddonation',
+            index=models.Index(fields=['user', 'created_at'], name='unregdonation_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userdonation',
+            index=models.Index(fields=['user', 'created_at'], name='userdonation_user_created_idx'),
+        ),
+    ]
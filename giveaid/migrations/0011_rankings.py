@@ -0,0 +1,54 @@
+# Generated by Django 5.0.14 on 2026-10-18 07:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('giveaid', '0010_donor_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankingBucket',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False, verbose_name='ranking bucket id')),
+                ('board', models.CharField(max_length=50)),
+                ('hour', models.DateTimeField()),
+                ('member', models.CharField(max_length=64)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('payment_count', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'rankingbucket',
+            },
+        ),
+        migrations.CreateModel(
+            name='RankingEntry',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False, verbose_name='ranking entry id')),
+                ('board', models.CharField(max_length=50)),
+                ('member', models.CharField(max_length=64)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('payment_count', models.PositiveBigIntegerField(default=0)),
+                ('score', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'rankingentry',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='rankingbucket',
+            constraint=models.UniqueConstraint(fields=('board', 'hour', 'member'), name='rankingbucket_board_hour_member_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='rankingentry',
+            index=models.Index(fields=['board', '-score', 'member'], name='rankingentry_board_score_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='rankingentry',
+            constraint=models.UniqueConstraint(fields=('board', 'member'), name='rankingentry_board_member_uniq'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('giveaid', '0012_auth_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentMethod',
+            fields=[
+                ('id', models.SmallAutoField(primary_key=True, serialize=False)),
+                ('code', models.CharField(max_length=255, unique=True)),
+            ],
+            options={
+                'db_table': 'payment_method',
+            },
+        ),
+        # Filled in by 0014 and swapped in for the old columns by 0015.
+        migrations.AddField(
+            model_name='payment',
+            name='amount_minor',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='currency',
+            field=models.CharField(default='GHS', max_length=3),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='method',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='giveaid.paymentmethod'),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='donation_type_code',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+    ]
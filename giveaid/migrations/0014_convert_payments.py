@@ -0,0 +1,48 @@
+"""
+Fill the compact payment columns added by 0013 from the old ones, one
+batch of ids per transaction, so a large table is never locked for the
+whole conversion. Rows already converted are skipped, so an interrupted
+run can simply be restarted.
+"""
+from django.db import migrations, models, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Cast, Round
+
+
+BATCH_SIZE = 20000
+DONATION_TYPE_CODES = {'user': 1, 'unregistered': 2}
+
+
+def convert_payments(apps, schema_editor):
+    Payment = apps.get_model('giveaid', 'Payment')
+    PaymentMethod = apps.get_model('giveaid', 'PaymentMethod')
+    using = schema_editor.connection.alias
+    payments = Payment.objects.using(using)
+
+    codes = payments.order_by().values_list('payment_method', flat=True).distinct()
+    PaymentMethod.objects.using(using).bulk_create(
+        [PaymentMethod(code=code) for code in codes], ignore_conflicts=True,
+    )
+    method = PaymentMethod.objects.using(using).filter(code=OuterRef('payment_method')).values('id')[:1]
+    last = payments.aggregate(last=models.Max('id'))['last'] or 0
+    for start in range(0, last, BATCH_SIZE):
+        with transaction.atomic(using=using):
+            payments.filter(id__gt=start, id__lte=start + BATCH_SIZE, amount_minor__isnull=True).update(
+                amount_minor=Cast(Round(F('amount') * 100), models.BigIntegerField()),
+                donation_type_code=Case(
+                    *[When(donation_type=code, then=Value(number)) for code, number in DONATION_TYPE_CODES.items()],
+                ),
+                method=Subquery(method),
+            )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('giveaid', '0013_payment_compact_columns'),
+    ]
+
+    operations = [
+        migrations.RunPython(convert_payments, migrations.RunPython.noop),
+    ]
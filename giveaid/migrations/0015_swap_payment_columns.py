@@ -0,0 +1,59 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+import giveaid.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('giveaid', '0014_convert_payments'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='payment',
+            name='payment_donation_idx',
+        ),
+        migrations.RemoveField(
+            model_name='payment',
+            name='amount',
+        ),
+        migrations.RemoveField(
+            model_name='payment',
+            name='payment_method',
+        ),
+        migrations.RemoveField(
+            model_name='payment',
+            name='donation_type',
+        ),
+        migrations.RenameField(
+            model_name='payment',
+            old_name='amount_minor',
+            new_name='amount',
+        ),
+        migrations.RenameField(
+            model_name='payment',
+            old_name='donation_type_code',
+            new_name='donation_type',
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='amount',
+            field=giveaid.models.MinorUnitsField(),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='donation_type',
+            field=giveaid.models.CodeField(choices=[('user', 'User Donation'), ('unregistered', 'Unregistered Donation')], codes={'user': 1, 'unregistered': 2}),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='method',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='giveaid.paymentmethod'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['donation_type', 'donation_id'], name='payment_donation_idx'),
+        ),
+    ]
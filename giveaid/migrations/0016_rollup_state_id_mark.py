@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-18 08:22
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('giveaid', '0015_swap_payment_columns'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='rollupstate',
+            name='last_created_at',
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.14 on 2026-10-18 08:34
+"""
+Forbid "@" in usernames, so an identifier containing one is always an email.
+Usernames were never validated against it, so existing ones with "@" are
+renamed first ("@" becomes "_at_", plus "_<id>" if that is taken); their
+owners can still log in with their email.
+"""
+from django.db import migrations, models
+
+
+def rename_usernames_with_at(apps, schema_editor):
+    User = apps.get_model('giveaid', 'User')
+    users = User.objects.using(schema_editor.connection.alias)
+    taken = set(users.exclude(username__contains='@').values_list('username', flat=True))
+    for user in users.filter(username__contains='@').order_by('id'):
+        username = user.username.replace('@', '_at_')[:255]
+        if username in taken:
+            suffix = f'_{user.id}'
+            username = username[:255 - len(suffix)] + suffix
+        taken.add(username)
+        users.filter(id=user.id).update(username=username)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('giveaid', '0016_rollup_state_id_mark'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_usernames_with_at, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.CheckConstraint(check=models.Q(('username__contains', '@'), _negated=True), name='user_username_no_at', violation_error_message='Usernames cannot contain “@”.'),
+        ),
+    ]
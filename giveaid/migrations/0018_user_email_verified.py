@@ -0,0 +1,28 @@
+# Generated by Django 5.0.14 on 2026-10-18 08:49
+"""
+Add ``User.email_verified``. No account is verified yet, so the anonymous
+donations linked by email so far are unlinked; they are linked again once
+their account's email is verified.
+"""
+from django.db import migrations, models
+
+
+def unlink_anonymous_donations(apps, schema_editor):
+    UnregisteredDonation = apps.get_model('giveaid', 'UnregisteredDonation')
+    UnregisteredDonation.objects.using(schema_editor.connection.alias).filter(user__isnull=False).update(user=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('giveaid', '0017_username_no_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='email_verified',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(unlink_anonymous_donations, migrations.RunPython.noop),
+    ]
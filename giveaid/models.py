@@ -1,6 +1,11 @@
 import uuid
-from django.db import models
+from decimal import Decimal, InvalidOperation
+from django import forms
+from django.db import connections, models, router, transaction
+from django.db.models.query import ModelIterable
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
+from django.utils import timezone
 
 # Create your models here.
 class Country(models.Model):
@@ -54,6 +59,9 @@ class User(AbstractUser):
     middlename = models.CharField(max_length=255, null=True, blank=True)
     lastname = models.CharField(max_length=255)
     email = models.EmailField(max_length=254, unique=True)
+    # Set once the owner has proved they control ``email``; anonymous
+    # donations made with it are only linked to verified accounts.
+    email_verified = models.BooleanField(default=False)
     password = models.CharField(max_length=255)
     dob = models.DateField()
     mobile = models.CharField(max_length=255, null=True, blank=True)
@@ -61,11 +69,45 @@ class User(AbstractUser):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    GEO_FIELDS = ("country", "state", "city")
+    
     def __str__(self):
-        self.username
+        return self.username
+    
+    @property
+    def location(self):
+        from .geo import geo_cache
+        return geo_cache.location(self.country_id, self.state_id, self.city_id)
+    
+    def clean_fields(self, exclude=None):
+        # Geo foreign keys are checked against the in-memory geo cache instead
+        # of one existence query per field.
+        from .geo import geo_cache
+        exclude = set(exclude or ())
+        errors = {}
+        try:
+            super().clean_fields(exclude=exclude | set(self.GEO_FIELDS))
+        except ValidationError as e:
+            errors = e.update_error_dict(errors)
+        try:
+            geo_cache.validate_location(self.country_id, self.state_id, self.city_id)
+        except ValidationError as e:
+            for field, messages in e.message_dict.items():
+                if field not in exclude:
+                    errors.setdefault(field, []).extend(messages)
+        if errors:
+            raise ValidationError(errors)
         
     class Meta:
         db_table = "user"
+        constraints = [
+            # "@" marks an email at login (see giveaid.auth).
+            models.CheckConstraint(
+                check=~models.Q(username__contains="@"),
+                name="user_username_no_at",
+                violation_error_message="Usernames cannot contain “@”.",
+            ),
+        ]
   
         
 class Cause(models.Model):
@@ -80,6 +122,9 @@ class Cause(models.Model):
     
     class Meta:
         db_table = "cause"
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="cause_created_id_idx"),
+        ]
     
 
 class UserDonation(models.Model):
@@ -94,8 +139,12 @@ class UserDonation(models.Model):
         return f"Donation by {self.user.username} to {self.cause.title}"
     
     class Meta:
-        db_table = "userdonation"   
- 
+        db_table = "userdonation"
+        indexes = [
+            models.Index(fields=["cause", "created_at"], name="userdonation_cause_created_idx"),
+            models.Index(fields=["user", "created_at"], name="userdonation_user_created_idx"),
+        ]
+
 
 class UnregisteredDonation(models.Model):
     id = models.BigAutoField(primary_key=True, verbose_name="Unregistered donation id")
@@ -103,6 +152,10 @@ class UnregisteredDonation(models.Model):
     firstname = models.CharField(max_length=255)
     lastname = models.CharField(max_length=255)
     email = models.EmailField(max_length=254)
+    # The account that registered with this email later, linked in the background.
+    user = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name="unregistered_donations",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -111,36 +164,252 @@ class UnregisteredDonation(models.Model):
     
     class Meta:
         db_table = "unregistereddonation"
+        indexes = [
+            models.Index(fields=["email"], name="unregdonation_email_idx"),
+            models.Index(fields=["user", "created_at"], name="unregdonation_user_created_idx"),
+        ]
+
+
+def attach_donations(payments, *related):
+    """
+    Resolve the donations behind ``payments`` in one query per donation table
+    and cache each on its payment, so ``get_donation()`` does not hit the
+    database. ``related`` names are passed to ``select_related`` on the
+    donation models that have them (e.g. ``"cause"``, ``"user"``).
+    """
+    ids_by_type = {}
+    for payment in payments:
+        ids_by_type.setdefault(payment.donation_type, set()).add(payment.donation_id)
+
+    found = {}
+    for donation_type, ids in ids_by_type.items():
+        model = Payment.DONATION_MODELS.get(donation_type)
+        if model is None:
+            continue
+        field_names = {field.name for field in model._meta.get_fields()}
+        queryset = model.objects.select_related(*[name for name in related if name in field_names])
+        ids = sorted(ids)
+        batch_size = connections[queryset.db].features.max_query_params or len(ids)
+        for start in range(0, len(ids), batch_size):
+            for donation in queryset.filter(id__in=ids[start:start + batch_size]):
+                found[donation_type, donation.id] = donation
+
+    for payment in payments:
+        payment._donation_cache = found.get((payment.donation_type, payment.donation_id))
+    return payments
+
+
+class PaymentQuerySet(models.QuerySet):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._donation_related = None
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._donation_related = self._donation_related
+        return clone
+
+    def _fetch_all(self):
+        fetching = self._result_cache is None
+        super()._fetch_all()
+        if fetching and self._donation_related is not None and self._iterable_class is ModelIterable:
+            attach_donations(self._result_cache, *self._donation_related)
+
+    def with_donations(self, *related):
+        """
+        Resolve every payment's donation in bulk when the queryset is
+        evaluated: one query per donation table instead of one per payment.
+        """
+        clone = self._chain()
+        clone._donation_related = related
+        return clone
+
+
+class MinorUnitsField(models.BigIntegerField):
+    """
+    A Decimal amount stored as an integer count of minor units: with the
+    default two decimal places ``Decimal("12.50")`` is stored as 1250.
+    Lookups, aggregates and ``from_db_value`` converters all deal in
+    Decimals, so callers never see the integer.
+    """
+
+    def __init__(self, *args, decimal_places=2, **kwargs):
+        self.decimal_places = decimal_places
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.decimal_places != 2:
+            kwargs["decimal_places"] = self.decimal_places
+        return name, path, args, kwargs
+
+    def to_python(self, value):
+        if value is None or isinstance(value, Decimal):
+            return value
+        try:
+            return Decimal(str(value))
+        except InvalidOperation:
+            raise ValidationError(f"{value!r} is not a decimal amount.", code="invalid") from None
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else Decimal(int(value)).scaleb(-self.decimal_places)
+
+    def get_prep_value(self, value):
+        if value is None or hasattr(value, "resolve_expression"):
+            return value
+        # Rounds half to even, as DecimalField does.
+        return int(self.to_python(value).scaleb(self.decimal_places).quantize(Decimal(1)))
+
+    def formfield(self, **kwargs):
+        return models.Field.formfield(self, **{"form_class": forms.DecimalField, "decimal_places": self.decimal_places, **kwargs})
+
+
+class CodeField(models.PositiveSmallIntegerField):
+    """
+    One of a fixed set of string codes, stored as a small integer. ``codes``
+    maps each code to its stored number and must never renumber one.
+    Python code, lookups and choices keep using the strings; an unknown
+    code matches nothing.
+    """
+
+    def __init__(self, *args, codes=None, **kwargs):
+        self.codes = dict(codes or {})
+        self.numbers = {number: code for code, number in self.codes.items()}
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs["codes"] = self.codes
+        return name, path, args, kwargs
+
+    @property
+    def validators(self):
+        # The integer range validators would compare them with the codes.
+        return [*self.default_validators, *self._validators]
+
+    def to_python(self, value):
+        return self.numbers.get(value, value) if isinstance(value, int) else value
+
+    def from_db_value(self, value, expression, connection):
+        return self.numbers.get(value, value)
+
+    def get_prep_value(self, value):
+        if value is None or hasattr(value, "resolve_expression"):
+            return value
+        return self.codes.get(value)
+
+    def formfield(self, **kwargs):
+        return models.Field.formfield(self, **kwargs)
+
+
+class PaymentMethod(models.Model):
+    # A lookup table, so payments store a small id instead of repeating the
+    # method's name. ``giveaid.methods.payment_methods`` caches it.
+    id = models.SmallAutoField(primary_key=True)
+    code = models.CharField(max_length=255, unique=True)
+    
+    def __str__(self):
+        return self.code
+    
+    class Meta:
+        db_table = "payment_method"
 
 
 class Payment(models.Model):
+    USER_DONATION = 'user'
+    UNREGISTERED_DONATION = 'unregistered'
     DONATION_TYPE_CHOICES = [
-		('user', 'User Donation'),
-		('unregistered', 'Unregistered Donation')
+		(USER_DONATION, 'User Donation'),
+		(UNREGISTERED_DONATION, 'Unregistered Donation')
 	]
+    # Stored numbers of the donation types; never renumber one.
+    DONATION_TYPE_CODES = {
+        USER_DONATION: 1,
+        UNREGISTERED_DONATION: 2,
+    }
+    DONATION_MODELS = {
+        USER_DONATION: UserDonation,
+        UNREGISTERED_DONATION: UnregisteredDonation,
+    }
+    DEFAULT_CURRENCY = 'GHS'
     
     id = models.BigAutoField(primary_key=True, verbose_name="Payment id")
-    donation_type = models.CharField(max_length=13, choices=DONATION_TYPE_CHOICES)
+    donation_type = CodeField(codes=DONATION_TYPE_CODES, choices=DONATION_TYPE_CHOICES)
     donation_id = models.PositiveBigIntegerField()
     transaction_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
-    amount = models.DecimalField(max_digits=12, decimal_places=2)
-    payment_method = models.CharField(max_length=255)
+    idempotency_key = models.CharField(max_length=255, unique=True, null=True, blank=True, editable=False)
+    # In minor units of ``currency``; reads and writes as a Decimal.
+    amount = MinorUnitsField()
+    currency = models.CharField(max_length=3, default=DEFAULT_CURRENCY)
+    # A handful of methods, rarely deleted: not worth an index on every payment.
+    method = models.ForeignKey(PaymentMethod, on_delete=models.PROTECT, related_name="+", db_index=False)
     payment_date = models.DateField(auto_now_add=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = PaymentQuerySet.as_manager()
+    
     def __str__(self):
         return f"Payment of: {self.amount}. \tTransaction ID: {self.transaction_id}"
     
+    @property
+    def payment_method(self):
+        """The code of the payment's method (``"card"``, ``"momo"``...)."""
+        if self.method_id is None:
+            return None
+        if Payment.method.is_cached(self):
+            return self.method.code
+        from .methods import payment_methods
+        return payment_methods.code_for(self.method_id, using=self._state.db)
+    
+    @payment_method.setter
+    def payment_method(self, code):
+        from .methods import payment_methods
+        self.method = None if code is None else payment_methods.method_for(code)
+    
+    def save(self, *args, **kwargs):
+        # Aggregates maintained from post_save must commit or roll back with the payment.
+        using = kwargs.get('using') or router.db_for_write(Payment, instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+    
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.__dict__.pop('_donation_cache', None)
+    
     def get_donation(self):
-        if self.donation_type == 'user':
-            return UserDonation.objects.get(id=self.donation_id)
-        elif self.donation_type == 'unregistered':
-            return UnregisteredDonation.objects.get(id=self.donation_id)
-        return None
+        """The payment's donation, or None if it no longer exists (as with ``with_donations()``)."""
+        if hasattr(self, '_donation_cache'):
+            return self._donation_cache
+        model = self.DONATION_MODELS.get(self.donation_type)
+        if model is None:
+            return None
+        self._donation_cache = model.objects.filter(id=self.donation_id).first()
+        return self._donation_cache
     
     class Meta:
         db_table = "payment"
+        indexes = [
+            models.Index(fields=["donation_type", "donation_id"], name="payment_donation_idx"),
+            models.Index(fields=["payment_date"], name="payment_date_idx"),
+            models.Index(fields=["created_at", "id"], name="payment_created_id_idx"),
+        ]
+
+
+class CauseTotals(models.Model):
+    cause = models.OneToOneField(Cause, on_delete=models.CASCADE, primary_key=True, related_name="totals")
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payment_count = models.PositiveBigIntegerField(default=0)
+    donor_count = models.PositiveBigIntegerField(default=0, verbose_name="distinct registered donors")
+    anonymous_donor_count = models.PositiveBigIntegerField(default=0, verbose_name="distinct unregistered donor emails")
+    last_donation_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Totals for cause {self.cause_id}"
+    
+    class Meta:
+        db_table = "causetotals"
 
 
 class SuccessStory(models.Model):
@@ -156,4 +425,152 @@ class SuccessStory(models.Model):
         return self.title
     
     class Meta:
-        db_table = "successstory"
\ No newline at end of file
+        db_table = "successstory"
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="story_created_id_idx"),
+            models.Index(fields=["cause", "created_at"], name="story_cause_created_idx"),
+        ]
+
+
+class ImportCheckpoint(models.Model):
+    id = models.BigAutoField(primary_key=True, verbose_name="import checkpoint id")
+    name = models.CharField(max_length=255, unique=True)
+    position = models.PositiveBigIntegerField(default=0, verbose_name="rows consumed")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} at row {self.position}"
+    
+    class Meta:
+        db_table = "importcheckpoint"
+
+
+class DailyDonationRollup(models.Model):
+    id = models.BigAutoField(primary_key=True, verbose_name="daily donation rollup id")
+    day = models.DateField()
+    cause = models.ForeignKey(Cause, on_delete=models.CASCADE)
+    # Donor geography; empty for unregistered donors.
+    country = models.ForeignKey(Country, on_delete=models.CASCADE, null=True, blank=True)
+    state = models.ForeignKey(State, on_delete=models.CASCADE, null=True, blank=True)
+    city = models.ForeignKey(City, on_delete=models.CASCADE, null=True, blank=True)
+    payment_method = models.CharField(max_length=255)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payment_count = models.PositiveBigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.day} cause {self.cause_id}: {self.amount}"
+    
+    class Meta:
+        db_table = "dailydonationrollup"
+        indexes = [
+            models.Index(fields=["day", "cause"], name="rollup_day_cause_idx"),
+        ]
+
+
+class RollupState(models.Model):
+    name = models.CharField(max_length=100, primary_key=True)
+    last_payment_id = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} at payment {self.last_payment_id}"
+    
+    class Meta:
+        db_table = "rollupstate"
+
+
+class RankingBucket(models.Model):
+    """One hour of one member's payments on a leaderboard (see giveaid/rankings.py)."""
+
+    id = models.BigAutoField(primary_key=True, verbose_name="ranking bucket id")
+    board = models.CharField(max_length=50)
+    hour = models.DateTimeField()
+    # A cause id or a donor's user id, depending on the board.
+    member = models.CharField(max_length=64)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payment_count = models.PositiveBigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.board} {self.hour:%Y-%m-%d %H}h {self.member}: {self.amount}"
+    
+    class Meta:
+        db_table = "rankingbucket"
+        constraints = [
+            models.UniqueConstraint(fields=["board", "hour", "member"], name="rankingbucket_board_hour_member_uniq"),
+        ]
+
+
+class RankingEntry(models.Model):
+    """A member's totals over a leaderboard's whole window."""
+
+    id = models.BigAutoField(primary_key=True, verbose_name="ranking entry id")
+    board = models.CharField(max_length=50)
+    member = models.CharField(max_length=64)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payment_count = models.PositiveBigIntegerField(default=0)
+    # amount or payment_count, whichever the board ranks by.
+    score = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.board} {self.member}: {self.score}"
+    
+    class Meta:
+        db_table = "rankingentry"
+        constraints = [
+            models.UniqueConstraint(fields=["board", "member"], name="rankingentry_board_member_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["board", "-score", "member"], name="rankingentry_board_score_idx"),
+        ]
+
+
+class Job(models.Model):
+    # Finished jobs are deleted; dead ones stay for inspection.
+    PENDING = "pending"
+    RUNNING = "running"
+    DEAD = "dead"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DEAD, "Dead"),
+    ]
+
+    id = models.BigAutoField(primary_key=True, verbose_name="job id")
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+    # The claim a worker holds on a running job.
+    locked_by = models.CharField(max_length=64, blank=True, default="")
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.task} #{self.id} ({self.status})"
+    
+    class Meta:
+        db_table = "job"
+        indexes = [
+            models.Index(fields=["status", "run_at"], name="job_status_run_at_idx"),
+            models.Index(fields=["locked_by"], name="job_locked_by_idx"),
+        ]
+
+
+class AuthToken(models.Model):
+    # Only a SHA-256 digest of the token is stored; the token itself is
+    # handed out once, at login.
+    digest = models.CharField(max_length=64, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="auth_tokens")
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Token {self.digest[:8]} for {self.user_id}"
+    
+    class Meta:
+        db_table = "auth_token"
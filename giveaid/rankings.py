@@ -0,0 +1,295 @@
+"""
+Homepage leaderboards over sliding time windows.
+
+Each board in ``BOARDS`` ranks one kind of member (causes, or registered
+donors) by amount or payment count over its last ``hours`` hours. Two
+tables back it:
+
+``RankingBucket``
+    One row per (board, hour, member) holding that hour's amount and count,
+    for the hours still inside the window.
+``RankingEntry``
+    One row per (board, member) holding the sum of its buckets, indexed on
+    ``(board, -score)`` so ``top(board, n)`` reads exactly n index entries.
+
+``update()`` folds in payments past the ``RollupState`` high-water mark
+(it runs with the rollups, from the ``update_rollups`` job) and then
+expires the buckets that slid out of each window by subtracting them from
+their entries. Expiry only happens when ``update()`` runs, so schedule
+``manage.py update_rankings`` hourly for quiet periods. ``rebuild()``
+recomputes everything with grouped queries.
+
+Windows are aligned to whole UTC hours: at 14:25 a 24-hour board covers
+15:00 yesterday onwards.
+"""
+import datetime
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import Cause, Payment, RankingBucket, RankingEntry, User, attach_donations
+from .rollups import _after, _lock_state
+
+
+STATE_NAME = "rankings"
+
+
+@dataclass(frozen=True)
+class Board:
+    name: str
+    # "cause" or "donor" (registered donors only).
+    dimension: str
+    # "amount" or "payment_count".
+    metric: str
+    hours: int
+
+    def window_start(self, now):
+        return hour_of(now) - datetime.timedelta(hours=self.hours - 1)
+
+    def score(self, amount, payment_count):
+        return amount if self.metric == "amount" else Decimal(payment_count)
+
+
+BOARDS = {
+    board.name: board
+    for board in (
+        Board("top-causes", "cause", "amount", hours=7 * 24),
+        Board("top-donors", "donor", "amount", hours=30 * 24),
+        Board("trending-causes", "cause", "payment_count", hours=24),
+    )
+}
+
+
+def get_board(name):
+    try:
+        return BOARDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown board {name!r}; expected one of {', '.join(BOARDS)}.") from None
+
+
+def hour_of(moment):
+    return moment.astimezone(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _add(deltas, key, amount, payment_count):
+    delta = deltas.setdefault(key, [Decimal("0.00"), 0])
+    delta[0] += amount
+    delta[1] += payment_count
+
+
+def _spread(rows, now):
+    """
+    Turn ``(hour, cause_id, user_id, amount, count)`` rows into bucket deltas
+    ``{(board, hour, member): [amount, count]}`` for every board whose
+    window holds the hour.
+    """
+    deltas = {}
+    for hour, cause_id, user_id, amount, payment_count in rows:
+        # Subqueries hand back the user id as stored; normalize it like the ORM does.
+        members = {"cause": str(cause_id), "donor": str(User._meta.pk.to_python(user_id)) if user_id else None}
+        for board in BOARDS.values():
+            member = members[board.dimension]
+            if member is not None and hour >= board.window_start(now):
+                _add(deltas, (board.name, hour, member), amount, payment_count)
+    return deltas
+
+
+def _rows(payments):
+    attach_donations([p for p in payments if not hasattr(p, "_donation_cache")])
+    for payment in payments:
+        donation = payment.get_donation()
+        if donation is not None:
+            yield hour_of(payment.created_at), donation.cause_id, getattr(donation, "user_id", None), payment.amount, 1
+
+
+def _apply(deltas):
+    """Add bucket deltas to the buckets and to their boards' entries."""
+    if not deltas:
+        return
+    boards = {key[0] for key in deltas}
+    members = {key[2] for key in deltas}
+    buckets = {
+        (bucket.board, bucket.hour, bucket.member): bucket
+        for bucket in RankingBucket.objects.filter(
+            board__in=boards, hour__in={key[1] for key in deltas}, member__in=members,
+        )
+    }
+    changed, new = [], []
+    entry_deltas = {}
+    for key, (amount, payment_count) in deltas.items():
+        _add(entry_deltas, (key[0], key[2]), amount, payment_count)
+        bucket = buckets.get(key)
+        if bucket is None:
+            new.append(RankingBucket(board=key[0], hour=key[1], member=key[2], amount=amount, payment_count=payment_count))
+        else:
+            bucket.amount += amount
+            bucket.payment_count += payment_count
+            changed.append(bucket)
+    RankingBucket.objects.bulk_update(changed, ["amount", "payment_count"], batch_size=500)
+    RankingBucket.objects.bulk_create(new, batch_size=500)
+    _adjust_entries(entry_deltas)
+
+
+def _adjust_entries(deltas):
+    """Add ``{(board, member): [amount, count]}`` (negative to subtract) to the entries."""
+    entries = {
+        (entry.board, entry.member): entry
+        for entry in RankingEntry.objects.filter(
+            board__in={key[0] for key in deltas}, member__in={key[1] for key in deltas},
+        )
+    }
+    changed, new, emptied = [], [], []
+    now = timezone.now()
+    for (name, member), (amount, payment_count) in deltas.items():
+        entry = entries.get((name, member)) or RankingEntry(board=name, member=member)
+        entry.amount += amount
+        entry.payment_count += payment_count
+        entry.score = get_board(name).score(entry.amount, entry.payment_count)
+        entry.updated_at = now
+        if entry.pk is None:
+            new.append(entry)
+        elif entry.payment_count == 0:
+            emptied.append(entry.pk)
+        else:
+            changed.append(entry)
+    RankingEntry.objects.bulk_update(changed, ["amount", "payment_count", "score", "updated_at"], batch_size=500)
+    RankingEntry.objects.bulk_create(new, batch_size=500)
+    RankingEntry.objects.filter(pk__in=emptied).delete()
+
+
+def expire(now=None):
+    """Drop the buckets that slid out of their windows; return how many."""
+    now = now or timezone.now()
+    dropped = 0
+    for board in BOARDS.values():
+        expired = RankingBucket.objects.filter(board=board.name, hour__lt=board.window_start(now))
+        deltas = {
+            (board.name, member): [-amount, -payment_count]
+            for member, amount, payment_count in (
+                expired.values_list("member").annotate(Sum("amount"), Sum("payment_count")).order_by()
+            )
+        }
+        if deltas:
+            _adjust_entries(deltas)
+            dropped += expired.delete()[0]
+    return dropped
+
+
+def update(now=None, batch_size=5000):
+    """
+    Fold payments past the high-water mark into the boards, then expire old
+    buckets; return how many payments were added.
+    """
+    now = now or timezone.now()
+    processed = 0
+    while True:
+        with transaction.atomic():
+            state = _lock_state(STATE_NAME)
+            payments = list(Payment.objects.filter(_after(state)).order_by("id")[:batch_size])
+            if not payments:
+                expire(now)
+                return processed
+            _apply(_spread(_rows(payments), now))
+            state.last_payment_id = payments[-1].id
+            state.save()
+        processed += len(payments)
+
+
+def _aggregate(payments):
+    """Payments summed per (hour, cause, registered donor), one grouped query per donation table."""
+    for donation_type, model in Payment.DONATION_MODELS.items():
+        donations = model.objects.filter(pk=OuterRef("donation_id"))
+        donor = Subquery(donations.values("user_id")) if donation_type == Payment.USER_DONATION else None
+        rows = (
+            payments.filter(donation_type=donation_type)
+            .annotate(
+                hour=TruncHour("created_at", tzinfo=datetime.timezone.utc),
+                donation_cause=Subquery(donations.values("cause_id")),
+                **({"donor": donor} if donor is not None else {}),
+            )
+            .filter(donation_cause__isnull=False)
+            .values_list("hour", "donation_cause", *(["donor"] if donor is not None else []))
+            .annotate(total=Sum("amount"), count=Count("id"))
+            .order_by()
+        )
+        for row in rows:
+            if donor is None:
+                hour, cause_id, amount, payment_count = row
+                yield hour, cause_id, None, amount, payment_count
+            else:
+                yield row
+
+
+@transaction.atomic
+def rebuild(now=None, batch_size=5000):
+    """Discard the boards and recompute them from the payments in their windows."""
+    now = now or timezone.now()
+    state = _lock_state(STATE_NAME)
+    RankingBucket.objects.all().delete()
+    RankingEntry.objects.all().delete()
+    last = Payment.objects.order_by("-id").values_list("id", flat=True).first()
+    state.last_payment_id = last or 0
+    state.save()
+    if last is None:
+        return 0
+    earliest = min(board.window_start(now) for board in BOARDS.values())
+    # Everything up to the new mark; later payments are left to update().
+    payments = Payment.objects.exclude(_after(state)).filter(created_at__gte=earliest)
+    deltas = _spread(_aggregate(payments), now)
+    RankingBucket.objects.bulk_create(
+        (
+            RankingBucket(board=name, hour=hour, member=member, amount=amount, payment_count=payment_count)
+            for (name, hour, member), (amount, payment_count) in deltas.items()
+        ),
+        batch_size=batch_size,
+    )
+    entries = {}
+    for (name, _, member), (amount, payment_count) in deltas.items():
+        _add(entries, (name, member), amount, payment_count)
+    RankingEntry.objects.bulk_create(
+        (
+            RankingEntry(
+                board=name, member=member, amount=amount, payment_count=payment_count,
+                score=get_board(name).score(amount, payment_count),
+            )
+            for (name, member), (amount, payment_count) in entries.items()
+        ),
+        batch_size=batch_size,
+    )
+    return len(entries)
+
+
+def labels(board, members):
+    """Display names for ``members`` of ``board``: cause titles, or donors' first names and initials."""
+    if board.dimension == "cause":
+        ids = [int(member) for member in members]
+        return {str(pk): title for pk, title in Cause.objects.filter(id__in=ids).values_list("id", "title")}
+    return {
+        str(pk): f"{firstname} {lastname[:1]}.".strip()
+        for pk, firstname, lastname in User.objects.filter(id__in=members).values_list("id", "firstname", "lastname")
+    }
+
+
+def top(name, limit=10):
+    """The first ``limit`` members of board ``name``, best first, in two queries."""
+    board = get_board(name)
+    entries = list(
+        RankingEntry.objects.filter(board=board.name).order_by("-score", "member")
+        .values("member", "amount", "payment_count", "updated_at")[:limit]
+    )
+    names = labels(board, [entry["member"] for entry in entries])
+    return [
+        {
+            "rank": rank,
+            "id": entry["member"],
+            "name": names.get(entry["member"]),
+            "amount": entry["amount"],
+            "payment_count": entry["payment_count"],
+            "updated_at": entry["updated_at"],
+        }
+        for rank, entry in enumerate(entries, start=1)
+    ]
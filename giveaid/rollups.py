@@ -0,0 +1,197 @@
+"""
+Donation analytics rollups.
+
+``DailyDonationRollup`` holds one row per (day, cause, donor country, state,
+city, payment method) with the summed amount and payment count. ``update()``
+folds in payments past the ``RollupState`` high-water mark on ``id``, batch
+by batch, so the rollup never rescans old payments; ``backfill()`` rebuilds
+everything with grouped queries. Weekly and monthly series are derived from
+the daily rows on demand by ``series()``.
+
+Rollup updates are single-writer: each batch first touches its
+``RollupState`` row, which takes the write lock before the mark is read.
+
+The mark is on ``id`` alone because SQLite hands out ids under the write
+lock, so they grow in commit order. ``created_at`` is set before the lock
+is taken: a payment committed after the mark moved on can carry an earlier
+timestamp, and a mark on ``(created_at, id)`` would skip it for good.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import DailyDonationRollup, Payment, RollupState, User, attach_donations
+
+
+STATE_NAME = "daily_donations"
+DIMENSIONS = ("cause", "country", "state", "city", "payment_method")
+PERIODS = {
+    "day": F,
+    "week": TruncWeek,
+    "month": TruncMonth,
+}
+
+
+def _lock_state(name=STATE_NAME):
+    # Write before reading. On SQLite a deferred transaction that reads first
+    # cannot upgrade to the write lock while another worker holds it and
+    # fails at once with "database is locked"; starting with the UPDATE
+    # makes it wait for the lock instead.
+    if not RollupState.objects.filter(name=name).update(updated_at=timezone.now()):
+        RollupState.objects.get_or_create(name=name)
+    return RollupState.objects.get(name=name)
+
+
+def _after(state):
+    return Q(id__gt=state.last_payment_id)
+
+
+def payment_keys(payments):
+    """Yield ``(key, payment)`` where ``key`` is the payment's rollup bucket."""
+    attach_donations([p for p in payments if not hasattr(p, "_donation_cache")])
+    user_ids = {
+        payment.get_donation().user_id
+        for payment in payments
+        if payment.donation_type == Payment.USER_DONATION and payment.get_donation() is not None
+    }
+    geo = {
+        user_id: (country_id, state_id, city_id)
+        for user_id, country_id, state_id, city_id in
+        User.objects.filter(id__in=user_ids).values_list("id", "country_id", "state_id", "city_id")
+    }
+    for payment in payments:
+        donation = payment.get_donation()
+        if donation is None:
+            continue
+        country_id, state_id, city_id = geo.get(getattr(donation, "user_id", None), (None, None, None))
+        key = (payment.payment_date, donation.cause_id, country_id, state_id, city_id, payment.payment_method)
+        yield key, payment
+
+
+def _apply(deltas):
+    days = {key[0] for key in deltas}
+    causes = {key[1] for key in deltas}
+    existing = {
+        (row.day, row.cause_id, row.country_id, row.state_id, row.city_id, row.payment_method): row
+        for row in DailyDonationRollup.objects.filter(day__in=days, cause_id__in=causes)
+    }
+    changed, new = [], []
+    for key, (amount, count) in deltas.items():
+        row = existing.get(key)
+        if row is None:
+            day, cause_id, country_id, state_id, city_id, payment_method = key
+            new.append(DailyDonationRollup(
+                day=day, cause_id=cause_id, country_id=country_id, state_id=state_id, city_id=city_id,
+                payment_method=payment_method, amount=amount, payment_count=count,
+            ))
+        else:
+            row.amount += amount
+            row.payment_count += count
+            changed.append(row)
+    DailyDonationRollup.objects.bulk_update(changed, ["amount", "payment_count"], batch_size=500)
+    DailyDonationRollup.objects.bulk_create(new, batch_size=500)
+
+
+def update(batch_size=5000):
+    """Roll up every payment past the high-water mark; return how many were added."""
+    processed = 0
+    while True:
+        with transaction.atomic():
+            state = _lock_state()
+            payments = list(
+                Payment.objects.filter(_after(state)).select_related("method").order_by("id")[:batch_size]
+            )
+            if not payments:
+                return processed
+            deltas = {}
+            for key, payment in payment_keys(payments):
+                delta = deltas.setdefault(key, [Decimal("0.00"), 0])
+                delta[0] += payment.amount
+                delta[1] += 1
+            _apply(deltas)
+            state.last_payment_id = payments[-1].id
+            state.save()
+        processed += len(payments)
+
+
+def aggregate_payments(payments):
+    """
+    Sum ``payments`` into rollup buckets in the database, one grouped query
+    per donation table; return ``{key: [amount, count]}``.
+    """
+    deltas = {}
+    for donation_type, model in Payment.DONATION_MODELS.items():
+        donations = model.objects.filter(pk=OuterRef("donation_id"))
+        geo = {}
+        if donation_type == Payment.USER_DONATION:
+            geo = {f"donor_{name}": Subquery(donations.values(f"user__{name}_id")) for name in ("country", "state", "city")}
+        rows = (
+            payments.filter(donation_type=donation_type)
+            .annotate(donation_cause=Subquery(donations.values("cause_id")), **geo)
+            .filter(donation_cause__isnull=False)
+            .values_list("payment_date", "donation_cause", *geo, "method__code")
+            .annotate(total=Sum("amount"), count=Count("id"))
+            .order_by()
+        )
+        for *key, amount, count in rows:
+            if not geo:
+                key[2:2] = [None, None, None]
+            delta = deltas.setdefault(tuple(key), [Decimal("0.00"), 0])
+            delta[0] += amount
+            delta[1] += count
+    return deltas
+
+
+@transaction.atomic
+def backfill(batch_size=5000):
+    """Discard the rollups and rebuild them from every payment in one pass."""
+    state = _lock_state()
+    DailyDonationRollup.objects.all().delete()
+    last = Payment.objects.order_by("-id").values_list("id", flat=True).first()
+    state.last_payment_id = last or 0
+    if last is None:
+        state.save()
+        return 0
+    # Everything up to the new mark; later payments are left to update().
+    deltas = aggregate_payments(Payment.objects.exclude(_after(state)))
+    DailyDonationRollup.objects.bulk_create(
+        (
+            DailyDonationRollup(
+                day=day, cause_id=cause_id, country_id=country_id, state_id=state_id, city_id=city_id,
+                payment_method=payment_method, amount=amount, payment_count=count,
+            )
+            for (day, cause_id, country_id, state_id, city_id, payment_method), (amount, count) in deltas.items()
+        ),
+        batch_size=batch_size,
+    )
+    state.save()
+    return sum(count for _, count in deltas.values())
+
+
+def series(period="day", dimensions=("cause",), start=None, end=None, **filters):
+    """
+    Amount and count per ``period`` bucket and ``dimensions`` combination,
+    ordered by bucket. ``start``/``end`` bound the day (inclusive) and
+    ``filters`` narrow by dimension, e.g. ``series("month", cause=3)``.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period {period!r}; expected one of {', '.join(PERIODS)}.")
+    unknown = set(dimensions) - set(DIMENSIONS)
+    if unknown:
+        raise ValueError(f"Unknown dimensions: {', '.join(sorted(unknown))}.")
+
+    queryset = DailyDonationRollup.objects.filter(**filters)
+    if start is not None:
+        queryset = queryset.filter(day__gte=start)
+    if end is not None:
+        queryset = queryset.filter(day__lte=end)
+    queryset = queryset.annotate(period=PERIODS[period]("day"))
+    columns = [f"{name}_id" if name != "payment_method" else name for name in dimensions]
+    return list(
+        queryset.values("period", *columns)
+        .annotate(amount=Sum("amount"), payment_count=Sum("payment_count"))
+        .order_by("period", *columns)
+    )
@@ -0,0 +1,90 @@
+"""
+Primary/replica database routing.
+
+When ``settings.DATABASE_REPLICA`` names a database alias, reads of the
+models in ``REPLICA_MODELS`` (catalogue, geo and reporting data that can
+tolerate a little replication lag) go to that alias. Everything else, every
+write, and every read inside a transaction on the primary stays on
+``default``.
+
+Reads are pinned to the primary for the rest of the current context once
+anything is written, so a request never reads its own write back from a
+lagging replica. ``PrimaryPinningMiddleware`` scopes the pin to a request
+and starts unsafe (POST, PUT, ...) requests pinned; ``primary_pinning()``
+does the same for code outside requests. The job worker scopes it to each
+batch and the management commands to their ``handle()``, so neither a
+long-running worker nor a ``call_command()`` caller stays pinned.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+REPLICA_MODELS = {
+    "giveaid.country",
+    "giveaid.state",
+    "giveaid.city",
+    "giveaid.cause",
+    "giveaid.successstory",
+    "giveaid.causetotals",
+    "giveaid.dailydonationrollup",
+    "giveaid.rankingbucket",
+    "giveaid.rankingentry",
+}
+
+_pinned = ContextVar("giveaid_primary_pinned", default=False)
+
+
+def replica_alias():
+    return getattr(settings, "DATABASE_REPLICA", None)
+
+
+def is_pinned():
+    return _pinned.get()
+
+
+def pin_to_primary():
+    """Send every read in the current context to the primary from now on."""
+    _pinned.set(True)
+
+
+@contextmanager
+def primary_pinning(pinned=False):
+    """Scope pinning to a block; the previous state is restored on exit."""
+    token = _pinned.set(pinned)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = replica_alias()
+        if replica is None:
+            return None
+        if (
+            _pinned.get()
+            or model._meta.label_lower not in REPLICA_MODELS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from the primary.
+        if db == replica_alias():
+            return False
+        return None
@@ -0,0 +1,146 @@
+"""
+Full-text search over causes and success stories.
+
+On SQLite each searchable table has an external-content FTS5 index
+(``cause_search``, ``successstory_search``) whose rowid is the model's
+primary key. Triggers on the source tables keep the indexes in sync for
+every write path, including ``bulk_create`` and raw SQL. Results are ranked
+with BM25 (titles weigh more than descriptions), every search term matches
+as a prefix, and matches come back with highlighted snippets.
+
+Other backends fall back to unranked ``icontains`` filtering.
+
+Django rebuilds a SQLite table (dropping its triggers) when a migration
+alters it; ``manage.py rebuild_search_index`` reinstalls the triggers and
+repopulates the indexes.
+"""
+import html
+import re
+
+from django.db import connections, router
+from django.db.models import Q
+
+from .models import Cause, SuccessStory
+
+
+INDEXES = {
+    "cause": (Cause, "cause_search"),
+    "story": (SuccessStory, "successstory_search"),
+}
+TITLE_WEIGHT, BODY_WEIGHT = 10.0, 1.0
+TOKEN = re.compile(r"\w+", re.UNICODE)
+MARK_START, MARK_END = "\x02", "\x03"
+
+
+def _statements(table, index):
+    columns = "title, description"
+    new_values = "new.id, new.title, new.description"
+    old_values = "'delete', old.id, old.title, old.description"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5("
+        f"{columns}, content='{table}', content_rowid='id', "
+        f"tokenize='porter unicode61', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {index}(rowid, {columns}) VALUES ({new_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {index}({index}, rowid, {columns}) VALUES ({old_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_au AFTER UPDATE OF title, description ON {table} BEGIN "
+        f"INSERT INTO {index}({index}, rowid, {columns}) VALUES ({old_values}); "
+        f"INSERT INTO {index}(rowid, {columns}) VALUES ({new_values}); END",
+    ]
+
+
+def supported(connection):
+    return connection.vendor == "sqlite"
+
+
+def install(connection):
+    """Create the FTS indexes and sync triggers if they are missing."""
+    if not supported(connection):
+        return
+    with connection.cursor() as cursor:
+        for model, index in INDEXES.values():
+            for statement in _statements(model._meta.db_table, index):
+                cursor.execute(statement)
+
+
+def uninstall(connection):
+    if not supported(connection):
+        return
+    with connection.cursor() as cursor:
+        for _, index in INDEXES.values():
+            for suffix in ("ai", "ad", "au"):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {index}_{suffix}")
+            cursor.execute(f"DROP TABLE IF EXISTS {index}")
+
+
+def rebuild(connection):
+    """Reinstall the triggers and repopulate every index from its table."""
+    if not supported(connection):
+        return
+    install(connection)
+    with connection.cursor() as cursor:
+        for _, index in INDEXES.values():
+            cursor.execute(f"INSERT INTO {index}({index}) VALUES ('rebuild')")
+
+
+def match_expression(query):
+    """Turn free text into an FTS5 query where every word must match as a prefix."""
+    return " ".join(f'"{token}"*' for token in TOKEN.findall(query))
+
+
+def _highlight(snippet):
+    return html.escape(snippet or "").replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
+
+
+def search(query, kinds=tuple(INDEXES), limit=20, using=None):
+    """
+    Return up to ``limit`` results, best first, as dicts with ``kind``,
+    ``id``, ``title``, ``snippet`` (HTML with ``<mark>``ed matches) and
+    ``rank`` (lower is better; None on the fallback path).
+    """
+    expression = match_expression(query)
+    kinds = [kind for kind in kinds if kind in INDEXES]
+    if not expression or not kinds:
+        return []
+    using = using or router.db_for_read(Cause)
+    connection = connections[using]
+    if not supported(connection):
+        return _fallback_search(query, kinds, limit, using)
+
+    selects, params = [], []
+    for kind in kinds:
+        _, index = INDEXES[kind]
+        selects.append(
+            f"SELECT %s AS kind, rowid, title, "
+            f"snippet({index}, 1, %s, %s, '…', 16) AS snippet, "
+            f"bm25({index}, {TITLE_WEIGHT}, {BODY_WEIGHT}) AS rank "
+            f"FROM {index} WHERE {index} MATCH %s"
+        )
+        params += [kind, MARK_START, MARK_END, expression]
+    sql = " UNION ALL ".join(selects) + " ORDER BY rank LIMIT %s"
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [limit])
+        rows = cursor.fetchall()
+    return [
+        {"kind": kind, "id": pk, "title": title, "snippet": _highlight(snippet), "rank": rank}
+        for kind, pk, title, snippet, rank in rows
+    ]
+
+
+def _fallback_search(query, kinds, limit, using):
+    results = []
+    tokens = TOKEN.findall(query)
+    for kind in kinds:
+        model, _ = INDEXES[kind]
+        condition = Q()
+        for token in tokens:
+            condition &= Q(title__icontains=token) | Q(description__icontains=token)
+        for pk, title, description in (
+            model.objects.using(using).filter(condition).order_by("-created_at").values_list("id", "title", "description")[:limit]
+        ):
+            results.append({
+                "kind": kind, "id": pk, "title": title,
+                "snippet": html.escape((description or "")[:200]), "rank": None,
+            })
+    return results[:limit]
@@ -0,0 +1,236 @@
+"""
+Synthetic data for benchmarks.
+
+``generate()`` bulk-inserts a realistic dataset: a geo hierarchy, users
+spread over its cities, causes, registered and unregistered donations with
+their payments (some paid in instalments) and success stories, all dated
+over the last ``days`` days. Rows are built and inserted batch by batch, so
+memory stays flat at millions of rows.
+
+Payments are inserted without sending ``payments_created`` (seeded donors
+must not get receipts), so the derived tables are rebuilt at the end.
+"""
+import datetime
+import random
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from . import rankings, rollups, totals
+from .methods import payment_methods
+from .models import (
+    Cause, City, Country, Payment, State, SuccessStory, UnregisteredDonation, User, UserDonation,
+)
+
+
+WORDS = (
+    "water wells school books clinic solar farm seeds health children village library bridge road "
+    "market women youth training nurses vaccines meals shelter flood relief orphans teachers laptops"
+).split()
+FIRST_NAMES = ["Ama", "Kofi", "Esi", "Kwame", "Abena", "Yaw", "Akua", "Kojo", "Efua", "Kwesi"]
+LAST_NAMES = ["Mensah", "Owusu", "Boateng", "Asante", "Osei", "Agyeman", "Appiah", "Darko"]
+PAYMENT_METHODS = ["card", "card", "card", "momo", "momo", "bank"]
+AMOUNTS = [5, 10, 10, 20, 20, 25, 50, 50, 100, 200, 500]
+
+
+@dataclass
+class SeedSizes:
+    countries: int = 5
+    states_per_country: int = 5
+    cities_per_state: int = 10
+    users: int = 10000
+    causes: int = 200
+    donations: int = 100000
+    stories: int = 2000
+    # Share of donations made by registered users, and of donations paid in two instalments.
+    registered_share: float = 0.6
+    instalment_share: float = 0.1
+    days: int = 365
+
+    def scaled(self, factor):
+        counts = ("users", "causes", "donations", "stories")
+        return SeedSizes(**{
+            **asdict(self),
+            **{name: max(1, int(getattr(self, name) * factor)) for name in counts},
+        })
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk inserts keep the created/updated dates they are given."""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Generator:
+    def __init__(self, sizes, seed=0, batch_size=5000, log=None):
+        self.sizes = sizes
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.now = timezone.now()
+        # Keeps repeated runs from colliding on unique usernames and emails.
+        self.run = uuid.UUID(int=self.rng.getrandbits(128)).hex[:8]
+
+    def moment(self):
+        return self.now - datetime.timedelta(seconds=self.rng.randint(0, self.sizes.days * 86400))
+
+    def text(self, words):
+        return " ".join(self.rng.choice(WORDS) for _ in range(words))
+
+    def batches(self, total):
+        for start in range(0, total, self.batch_size):
+            yield range(start, min(start + self.batch_size, total))
+
+    def geo(self):
+        stamps = {"created_at": self.now, "updated_at": self.now}
+        countries = Country.objects.bulk_create(
+            Country(name=f"Country {self.run}-{i}", **stamps) for i in range(self.sizes.countries)
+        )
+        states = State.objects.bulk_create(
+            State(country=country, name=f"State {country.id}-{i}", **stamps)
+            for country in countries for i in range(self.sizes.states_per_country)
+        )
+        return City.objects.bulk_create(
+            City(state=state, name=f"City {state.id}-{i}", **stamps)
+            for state in states for i in range(self.sizes.cities_per_state)
+        )
+
+    def users(self, cities):
+        password = make_password(None)
+        ids = []
+        for batch in self.batches(self.sizes.users):
+            users = []
+            for i in batch:
+                city = self.rng.choice(cities)
+                created = self.moment()
+                users.append(User(
+                    id=uuid.UUID(int=self.rng.getrandbits(128)),
+                    username=f"donor-{self.run}-{i}",
+                    email=f"donor-{self.run}-{i}@example.com",
+                    password=password,
+                    firstname=self.rng.choice(FIRST_NAMES),
+                    lastname=self.rng.choice(LAST_NAMES),
+                    dob=datetime.date(1950, 1, 1) + datetime.timedelta(days=self.rng.randint(0, 20000)),
+                    country_id=city.state.country_id, state_id=city.state_id, city_id=city.id,
+                    date_joined=created, created_at=created, updated_at=created,
+                ))
+            User.objects.bulk_create(users)
+            ids.extend(user.id for user in users)
+        return ids
+
+    def causes(self):
+        ids = []
+        for batch in self.batches(self.sizes.causes):
+            causes = []
+            for _ in batch:
+                created = self.moment()
+                causes.append(Cause(
+                    title=self.text(3).title(), description=self.text(40), created_at=created, updated_at=created,
+                ))
+            ids.extend(cause.id for cause in Cause.objects.bulk_create(causes))
+        return ids
+
+    def payments_for(self, donation_type, donations, methods):
+        payments = []
+        for donation in donations:
+            instalments = 2 if self.rng.random() < self.sizes.instalment_share else 1
+            for n in range(instalments):
+                created = min(donation.created_at + datetime.timedelta(days=30 * n), self.now)
+                payments.append(Payment(
+                    donation_type=donation_type,
+                    donation_id=donation.id,
+                    amount=Decimal(self.rng.choice(AMOUNTS)) / instalments,
+                    method=methods[self.rng.choice(PAYMENT_METHODS)],
+                    payment_date=created.date(),
+                    created_at=created,
+                    updated_at=created,
+                ))
+        return payments
+
+    def donations(self, user_ids, cause_ids, methods):
+        count = 0
+        for batch in self.batches(self.sizes.donations):
+            registered, unregistered = [], []
+            for _ in batch:
+                created = self.moment()
+                cause_id = self.rng.choice(cause_ids)
+                if user_ids and self.rng.random() < self.sizes.registered_share:
+                    registered.append(UserDonation(
+                        user_id=self.rng.choice(user_ids), cause_id=cause_id, created_at=created, updated_at=created,
+                    ))
+                else:
+                    unregistered.append(UnregisteredDonation(
+                        cause_id=cause_id,
+                        firstname=self.rng.choice(FIRST_NAMES),
+                        lastname=self.rng.choice(LAST_NAMES),
+                        # A pool of repeat anonymous donors.
+                        email=f"guest-{self.rng.randint(0, self.sizes.donations // 3)}@example.com",
+                        created_at=created, updated_at=created,
+                    ))
+            payments = (
+                self.payments_for(Payment.USER_DONATION, UserDonation.objects.bulk_create(registered), methods)
+                + self.payments_for(
+                    Payment.UNREGISTERED_DONATION, UnregisteredDonation.objects.bulk_create(unregistered), methods,
+                )
+            )
+            Payment.objects.bulk_create(payments, batch_size=self.batch_size)
+            count += len(payments)
+        return count
+
+    def stories(self, user_ids, cause_ids):
+        for batch in self.batches(self.sizes.stories if user_ids else 0):
+            stories = []
+            for _ in batch:
+                created = self.moment()
+                stories.append(SuccessStory(
+                    user_id=self.rng.choice(user_ids), cause_id=self.rng.choice(cause_ids),
+                    title=self.text(4).capitalize(), description=self.text(60),
+                    created_at=created, updated_at=created,
+                ))
+            SuccessStory.objects.bulk_create(stories)
+
+    def generate(self):
+        models = (Country, State, City, User, Cause, UserDonation, UnregisteredDonation, Payment, SuccessStory)
+        with explicit_timestamps(*models):
+            with transaction.atomic():
+                cities = self.geo()
+                self.log(f"{len(cities)} cities")
+            with transaction.atomic():
+                user_ids = self.users(cities)
+                self.log(f"{len(user_ids)} users")
+            with transaction.atomic():
+                cause_ids = self.causes()
+                self.log(f"{len(cause_ids)} causes")
+            with transaction.atomic():
+                methods = payment_methods.methods_for(PAYMENT_METHODS)
+                payments = self.donations(user_ids, cause_ids, methods)
+                self.log(f"{self.sizes.donations} donations, {payments} payments")
+            with transaction.atomic():
+                self.stories(user_ids, cause_ids)
+                self.log(f"{self.sizes.stories} stories")
+        totals.rebuild()
+        rollups.backfill()
+        rankings.rebuild()
+        self.log("totals, rollups and rankings rebuilt")
+        return payments
+
+
+def generate(sizes=None, seed=0, batch_size=5000, log=None):
+    """Insert a synthetic dataset of ``sizes``; return the number of payments."""
+    return Generator(sizes or SeedSizes(), seed=seed, batch_size=batch_size, log=log).generate()
@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import Signal, receiver
+
+from . import auth, jobs, totals
+from . import tasks  # noqa: F401  (registers the job functions)
+from .geo import geo_cache
+from .methods import payment_methods
+from .models import City, Country, Payment, PaymentMethod, State, User
+
+
+# Sent with ``payments=[...]`` once new Payment rows exist, from inside the
+# inserting transaction. Bulk insert paths that bypass ``save()`` send it
+# themselves.
+payments_created = Signal()
+
+
+@receiver(post_save, sender=Payment)
+def payment_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        payments_created.send(sender=Payment, payments=[instance])
+
+
+@receiver(payments_created)
+def update_cause_totals(sender, payments, **kwargs):
+    totals.record_payments(payments)
+
+
+@receiver(payments_created)
+def enqueue_payment_jobs(sender, payments, **kwargs):
+    jobs.enqueue_many("send_receipt", [{"payment_id": payment.id} for payment in payments])
+    # Only payments that came through the gateway have a reference to report.
+    jobs.enqueue_many(
+        "notify_gateway",
+        [{"payment_id": payment.id} for payment in payments if payment.idempotency_key],
+    )
+    jobs.enqueue("update_rollups")
+
+
+@receiver(post_save, sender=User)
+def enqueue_donation_linking(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # A verified account claims the anonymous donations made earlier with
+    # its email; `manage.py link_anonymous_donations` catches up on the rest.
+    # Linking skips what is already linked, so saves that may have just set
+    # the flag are enough to watch.
+    if (
+        not raw
+        and instance.email
+        and instance.email_verified
+        and (update_fields is None or "email_verified" in update_fields)
+        and getattr(settings, "LINK_ANONYMOUS_DONATIONS", True)
+    ):
+        jobs.enqueue("link_anonymous_donations", {"email": instance.email})
+
+
+@receiver(post_save, sender=User)
+def forget_token_users(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Cached token lookups hold is_active and is_staff; logins only touch
+    # last_login and password.
+    if not created and not raw and not (update_fields and set(update_fields) <= {"last_login", "password"}):
+        auth.forget_user(instance)
+
+
+@receiver(post_save, sender=User)
+def revoke_tokens_on_password_change(sender, instance, created, raw=False, **kwargs):
+    # set_password() holds the new password in _password until save() has
+    # run; rehashing on login writes with update() and is not a change.
+    if not created and not raw and instance._password is not None:
+        auth.revoke_user_tokens(instance)
+
+
+@receiver(post_save, sender=Country)
+@receiver(post_save, sender=State)
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=Country)
+@receiver(post_delete, sender=State)
+@receiver(post_delete, sender=City)
+def invalidate_geo_cache(sender, **kwargs):
+    geo_cache.invalidate()
+    # Reload again once committed, in case another thread cached the
+    # pre-commit state in between.
+    transaction.on_commit(geo_cache.invalidate)
+
+
+@receiver(post_save, sender=PaymentMethod)
+@receiver(post_delete, sender=PaymentMethod)
+@receiver(post_migrate)
+def invalidate_payment_methods(sender, **kwargs):
+    # post_migrate also follows a flush, which empties the table.
+    payment_methods.invalidate()
@@ -0,0 +1,98 @@
+"""
+Background work, run by ``manage.py run_workers`` instead of inside the
+request that caused it. ``enqueue_payment_jobs`` in ``signals.py`` queues
+the post-payment tasks in the payment's own transaction.
+"""
+import asyncio
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+from . import donors, rankings, rollups
+from .gateway import get_gateway
+from .jobs import task
+from .models import Payment
+
+
+def receipt_message(payment):
+    donation = payment.get_donation()
+    donor = donation.user if payment.donation_type == Payment.USER_DONATION else donation
+    return EmailMessage(
+        subject=f"Thank you for supporting {donation.cause.title}",
+        body=(
+            f"Dear {donor.firstname},\n\n"
+            f"Thank you for your donation of {payment.amount} to {donation.cause.title} "
+            f"on {payment.payment_date:%d %B %Y}.\n\n"
+            f"Transaction: {payment.transaction_id}\n"
+            f"Payment method: {payment.payment_method}\n\n"
+            "GiveAid"
+        ),
+        from_email=getattr(settings, "RECEIPT_FROM_EMAIL", None),
+        to=[donor.email],
+    )
+
+
+@task(batch_size=getattr(settings, "RECEIPT_EMAIL_BATCH_SIZE", 100))
+def send_receipt(payloads):
+    """
+    Email receipts for a batch of payments over a single mail connection,
+    one message at a time so a refused address only fails its own job.
+    """
+    payments = {
+        payment.id: payment
+        for payment in Payment.objects.filter(id__in=[payload["payment_id"] for payload in payloads])
+        .select_related("method").with_donations("user", "cause")
+    }
+    failures = {}
+    with get_connection() as connection:
+        for index, payload in enumerate(payloads):
+            payment = payments.get(payload["payment_id"])
+            if payment is None or payment.get_donation() is None:
+                continue
+            try:
+                connection.send_messages([receipt_message(payment)])
+            except Exception as exc:
+                failures[index] = exc
+    return failures
+
+
+@task(batch_size=100)
+def notify_gateway(payloads):
+    """Report a batch of recorded payments to the gateway, concurrently."""
+    payments = Payment.objects.in_bulk([payload["payment_id"] for payload in payloads])
+    batch = [
+        (index, payments[payload["payment_id"]])
+        for index, payload in enumerate(payloads)
+        if payload["payment_id"] in payments
+    ]
+
+    async def notify_all():
+        gateway = get_gateway()
+        return await asyncio.gather(*(
+            gateway.notify(payment.idempotency_key, "payment.recorded", {
+                "transaction_id": str(payment.transaction_id),
+                "amount": str(payment.amount),
+            })
+            for _, payment in batch
+        ), return_exceptions=True)
+
+    results = async_to_sync(notify_all)()
+    return {
+        index: result
+        for (index, _), result in zip(batch, results)
+        if isinstance(result, Exception)
+    }
+
+
+@task(batch_size=1000)
+def update_rollups(payloads):
+    # One run folds in every new payment, however many jobs asked for it.
+    rollups.update()
+    rankings.update()
+
+
+@task(batch_size=500)
+def link_anonymous_donations(payloads):
+    """Link the anonymous donations made with a batch of emails to their accounts."""
+    donors.link_anonymous_donations({payload["email"] for payload in payloads})
@@ -1,3 +1,1687 @@
-from django.test import TestCase
+import csv
+import datetime
+import gzip
+import json
+import random
+import tempfile
+import threading
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from smtplib import SMTPRecipientsRefused
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import SyncToAsync, sync_to_async
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.handlers.asgi import ASGIHandler
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Count, Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import path
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import auth, donors, exports, imports, jobs, rankings, rollups, search, seed, totals
+from api.pagination import encode_cursor, paginate
+from api.serializers import CauseSerializer, SuccessStorySerializer
+from api.views import streaming_response
+
+from .admin import EstimatedCountPaginator
+from .backends.sqlite3.base import DatabaseWrapper, write_lock
+from .gateway import StubGateway, get_gateway
+from .geo import GeoCache, geo_cache
+from .ingest import aingest_payment, ingest_payment, payment_writer, recent_payments
+from .methods import payment_methods
+from .middleware import PrimaryPinningMiddleware, QueryBudgetExceeded, query_budget, query_stats
+from .routers import PrimaryReplicaRouter, is_pinned, primary_pinning
+from .signals import payments_created
+from .models import (
+    AuthToken, City, Country, Cause, CauseTotals, DailyDonationRollup, ImportCheckpoint, Job, Payment, PaymentMethod,
+    RankingBucket, RankingEntry, State, SuccessStory, UnregisteredDonation, User, UserDonation,
+)
+
+
+def make_user(city, username, **kwargs):
+    return User.objects.create(
+        username=username,
+        firstname=username.title(),
+        lastname="Donor",
+        email=kwargs.pop("email", f"{username}@example.com"),
+        dob=datetime.date(1990, 1, 1),
+        country=city.state.country,
+        state=city.state,
+        city=city,
+        **kwargs,
+    )
+
+
+def query_plan(sql, params=()):
+    """The steps of SQLite's plan for ``sql``."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+@contextmanager
+def captured_plans():
+    """
+    Collect ``(sql, plan)`` for the SELECTs run inside the block, planned
+    with their parameters bound as they were executed: SQLite plans some
+    statements differently once the values are inlined.
+    """
+    executed, plans = [], []
+
+    def record(execute, sql, params, many, context):
+        executed.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(record):
+        yield plans
+    plans.extend((sql, query_plan(sql, params)) for sql, params in executed if sql.startswith("SELECT"))
+
+
+class GiveaidFixturesMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.country = Country.objects.create(name="Ghana")
+        cls.state = State.objects.create(country=cls.country, name="Greater Accra")
+        cls.city = City.objects.create(state=cls.state, name="Accra")
+        cls.user = make_user(cls.city, "kofi")
+        cls.cause = Cause.objects.create(title="Clean water", description="Wells for villages")
+
+    def make_payments(self, count, amount="10.00", cause=None, user=None, email=None):
+        cause = cause or self.cause
+        payments = []
+        for i in range(count):
+            if i % 2 == 0:
+                donation = UserDonation.objects.create(user=user or self.user, cause=cause)
+                donation_type = Payment.USER_DONATION
+            else:
+                donation = UnregisteredDonation.objects.create(
+                    cause=cause, firstname="Ama", lastname="Mensah",
+                    email=email or f"ama{i}@example.com",
+                )
+                donation_type = Payment.UNREGISTERED_DONATION
+            payments.append(Payment.objects.create(
+                donation_type=donation_type,
+                donation_id=donation.id,
+                amount=Decimal(amount),
+                payment_method="card",
+            ))
+        return payments
+
+
+class PaymentDonationResolutionTests(GiveaidFixturesMixin, TestCase):
+    def list_payments(self):
+        with CaptureQueriesContext(connection) as ctx:
+            payments = list(Payment.objects.with_donations("cause", "user").order_by("id"))
+            for payment in payments:
+                donation = payment.get_donation()
+                str(donation)
+                donation.cause.title
+        return payments, len(ctx.captured_queries)
+
+    def test_get_donation_resolves_each_type(self):
+        user_payment, unregistered_payment = self.make_payments(2)
+        self.assertIsInstance(user_payment.get_donation(), UserDonation)
+        self.assertIsInstance(unregistered_payment.get_donation(), UnregisteredDonation)
+
+    def test_with_donations_matches_get_donation(self):
+        self.make_payments(5)
+        batched = {p.id: p.get_donation() for p in Payment.objects.with_donations()}
+        for payment in Payment.objects.all():
+            self.assertEqual(batched[payment.id], payment.get_donation())
+
+    def test_query_count_is_constant_as_payments_grow(self):
+        self.make_payments(4)
+        payments, small = self.list_payments()
+        self.assertEqual(len(payments), 4)
+        self.assertEqual(small, 3)
+
+        self.make_payments(40)
+        payments, large = self.list_payments()
+        self.assertEqual(len(payments), 44)
+        self.assertEqual(large, small)
+
+    def test_missing_donation_resolves_to_none(self):
+        payment = self.make_payments(1)[0]
+        UserDonation.objects.filter(id=payment.donation_id).delete()
+        payment = Payment.objects.with_donations().get(id=payment.id)
+        with self.assertNumQueries(0):
+            self.assertIsNone(payment.get_donation())
+        self.assertIsNone(Payment.objects.get(id=payment.id).get_donation())
+
+    def test_refresh_from_db_drops_the_cached_donation(self):
+        first, second = self.make_payments(2)
+        payment = Payment.objects.get(id=first.id)
+        self.assertIsInstance(payment.get_donation(), UserDonation)
+        Payment.objects.filter(id=first.id).update(
+            donation_type=Payment.UNREGISTERED_DONATION, donation_id=second.donation_id,
+        )
+        payment.refresh_from_db()
+        self.assertEqual(payment.get_donation(), second.get_donation())
+
+
+class PaymentStorageTests(GiveaidFixturesMixin, TestCase):
+    def setUp(self):
+        self.addCleanup(payment_methods.invalidate)
+
+    def stored(self, payment):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT amount, donation_type, method_id FROM payment WHERE id = %s", [payment.id])
+            return cursor.fetchone()
+
+    def test_columns_store_integers_behind_the_decimal_and_code_api(self):
+        payment = self.make_payments(1, amount="12.34")[0]
+        amount, donation_type, method_id = self.stored(payment)
+        self.assertEqual((amount, donation_type), (1234, 1))
+        self.assertEqual(PaymentMethod.objects.get(id=method_id).code, "card")
+
+        payment = Payment.objects.get(id=payment.id)
+        self.assertEqual(payment.amount, Decimal("12.34"))
+        self.assertIsInstance(payment.amount, Decimal)
+        self.assertEqual(payment.donation_type, Payment.USER_DONATION)
+        self.assertEqual(payment.payment_method, "card")
+        self.assertEqual(payment.currency, Payment.DEFAULT_CURRENCY)
+
+    def test_filters_and_aggregates_use_python_values(self):
+        self.make_payments(3, amount="10.05")
+        self.assertEqual(Payment.objects.aggregate(total=Sum("amount"))["total"], Decimal("30.15"))
+        self.assertEqual(Payment.objects.filter(amount=Decimal("10.05")).count(), 3)
+        self.assertEqual(Payment.objects.filter(amount__gt="10.04").count(), 3)
+        self.assertEqual(Payment.objects.filter(donation_type=Payment.UNREGISTERED_DONATION).count(), 1)
+        self.assertFalse(Payment.objects.filter(donation_type="corporate").exists())
+        self.assertEqual(list(Payment.objects.values_list("method__code", flat=True).distinct()), ["card"])
+
+    def test_amounts_are_rounded_to_minor_units(self):
+        payment = self.make_payments(1, amount="7.125")[0]
+        self.assertEqual(self.stored(payment)[0], 712)
+
+    def test_methods_are_cached_once_committed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment(payment_method="momo")
+        with self.assertNumQueries(0):
+            payment = Payment(payment_method="momo")
+            self.assertEqual(payment.payment_method, "momo")
+            self.assertEqual(Payment(method_id=payment.method_id).payment_method, "momo")
+
+        with self.assertNumQueries(2):
+            methods = payment_methods.methods_for(["momo", "bank", "card"])
+        self.assertEqual({code: method.code for code, method in methods.items()}, {c: c for c in ("momo", "bank", "card")})
+        self.assertEqual(PaymentMethod.objects.count(), 3)
+
+    def test_uncommitted_methods_are_not_cached(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Payment(payment_method="ussd")
+            raise RuntimeError("rolled back")
+        self.assertFalse(PaymentMethod.objects.filter(code="ussd").exists())
+        self.assertIsNotNone(Payment(payment_method="ussd").method_id)
+        self.assertTrue(PaymentMethod.objects.filter(code="ussd").exists())
+
+    def test_unknown_methods_are_only_created_on_request(self):
+        with self.assertRaisesMessage(ValueError, "Unknown payment methods: cheque"):
+            Payment(payment_method="cheque")
+        with self.assertRaises(ValueError):
+            payment_methods.methods_for(["card", "x" * 200])
+        self.assertFalse(PaymentMethod.objects.exists())
+        self.assertEqual(payment_methods.method_for("cheque", create=True).code, "cheque")
+        self.assertEqual(payment_methods.methods_for(["cheque"], create=True)["cheque"].code, "cheque")
+
+
+class CauseTotalsTests(GiveaidFixturesMixin, TestCase):
+    def test_payments_update_totals_incrementally(self):
+        self.make_payments(4, amount="12.50", email="repeat@example.com")
+        cause_totals = CauseTotals.objects.get(cause=self.cause)
+        self.assertEqual(cause_totals.total_amount, Decimal("50.00"))
+        self.assertEqual(cause_totals.payment_count, 4)
+        self.assertEqual(cause_totals.donor_count, 1)
+        self.assertEqual(cause_totals.anonymous_donor_count, 1)
+        self.assertEqual(cause_totals.last_donation_at, Payment.objects.latest("id").created_at)
+        self.assertEqual(totals.verify(), {})
+
+    def test_new_donors_are_counted_once_per_cause(self):
+        other_user = make_user(self.city, "esi")
+        self.make_payments(2, user=other_user, email="first@example.com")
+        self.make_payments(2, email="second@example.com")
+        other_cause = Cause.objects.create(title="School books", description="Books")
+        self.make_payments(1, cause=other_cause)
+
+        cause_totals = CauseTotals.objects.get(cause=self.cause)
+        self.assertEqual(cause_totals.donor_count, 2)
+        self.assertEqual(cause_totals.anonymous_donor_count, 2)
+        self.assertEqual(CauseTotals.objects.get(cause=other_cause).donor_count, 1)
+        self.assertEqual(totals.verify(), {})
+
+    def test_rebuild_command_repairs_drift(self):
+        self.make_payments(3)
+        CauseTotals.objects.update(total_amount=0, payment_count=99)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_cause_totals", "--check", stdout=StringIO(), stderr=StringIO())
+
+        call_command("rebuild_cause_totals", stdout=StringIO())
+        cause_totals = CauseTotals.objects.get(cause=self.cause)
+        self.assertEqual(cause_totals.payment_count, 3)
+        self.assertEqual(cause_totals.total_amount, Decimal("30.00"))
+
+    def test_cause_listing_reads_totals_in_one_query(self):
+        self.make_payments(2)
+        Cause.objects.create(title="No donations yet", description="...")
+        with self.assertNumQueries(1):
+            listing = {
+                cause.title: getattr(cause, "totals", None)
+                for cause in Cause.objects.select_related("totals")
+            }
+        self.assertEqual(listing["Clean water"].payment_count, 2)
+        self.assertIsNone(listing["No donations yet"])
+
+    def test_prior_donor_check_seeks_the_donation_index(self):
+        method = payment_methods.method_for("card")
+        Payment.objects.bulk_create(
+            Payment(donation_type=donation_type, donation_id=i, amount=Decimal("1.00"), method=method)
+            for i in range(1, 10001)
+            for donation_type in Payment.DONATION_MODELS
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            self.make_payments(2)
+        donation_tables = ('FROM "userdonation"', 'FROM "unregistereddonation"')
+        checks = [
+            q["sql"] for q in ctx.captured_queries
+            if 'FROM "payment"' in q["sql"] and any(table in q["sql"] for table in donation_tables)
+        ]
+        self.assertEqual(len(checks), 2)
+        for sql in checks:
+            plan = query_plan(sql)
+            self.assertFalse([step for step in plan if step.startswith("SCAN")], plan)
+            self.assertTrue(any("payment_donation_idx (donation_type=? AND donation_id=?)" in step for step in plan), plan)
+
+
+class ImportDonationsTests(GiveaidFixturesMixin, TestCase):
+    def write_file(self, name, rows):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / name
+        path.write_text("\n".join(json.dumps(row) for row in rows))
+        return str(path)
+
+    def rows(self, count):
+        rows = []
+        for i in range(count):
+            email = self.user.email if i % 3 == 0 else f"donor{i}@example.com"
+            rows.append({"cause": "Clean water", "email": email, "firstname": "Ama", "amount": "2.50"})
+        return rows
+
+    def test_import_creates_donations_payments_and_totals(self):
+        rows = self.rows(9) + [
+            {"cause": "Unknown cause", "email": "x@example.com", "amount": "1"},
+            {"cause": "Clean water", "email": "y@example.com", "amount": "-1"},
+        ]
+        path = self.write_file("donations.jsonl", rows)
+        call_command("import_donations", path, "--chunk-size", "4", stdout=StringIO())
+
+        self.assertEqual(UserDonation.objects.count(), 3)
+        self.assertEqual(UnregisteredDonation.objects.count(), 6)
+        self.assertEqual(Payment.objects.count(), 9)
+        self.assertEqual(CauseTotals.objects.get(cause=self.cause).total_amount, Decimal("22.50"))
+        self.assertEqual(totals.verify(), {})
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+    def test_imports_only_send_receipts_on_request(self):
+        path = self.write_file("donations.jsonl", self.rows(4))
+        for naive in (False, True):
+            with self.subTest(naive=naive):
+                Job.objects.all().delete()
+                call_command("import_donations", path, "--no-checkpoint", *(["--naive"] if naive else []), stdout=StringIO())
+                self.assertEqual(set(Job.objects.values_list("task", flat=True)), {"update_rollups"})
+        self.assertEqual(totals.verify(), {})
+
+        Job.objects.all().delete()
+        call_command("import_donations", path, "--no-checkpoint", "--notify", stdout=StringIO())
+        self.assertEqual(Job.objects.filter(task="send_receipt").count(), 4)
+
+    def test_import_resumes_from_checkpoint(self):
+        path = self.write_file("partner.jsonl", self.rows(10))
+        ImportCheckpoint.objects.create(name=imports.checkpoint_name(path), position=6)
+        call_command("import_donations", path, "--chunk-size", "3", stdout=StringIO())
+        self.assertEqual(Payment.objects.count(), 4)
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+    def test_interrupted_import_records_its_position(self):
+        path = self.write_file("partner.jsonl", self.rows(10))
+        chunks = []
+
+        def interrupt(stats, position):
+            chunks.append(position)
+            if len(chunks) == 2:
+                raise KeyboardInterrupt
+        importer = imports.DonationImporter(checkpoint=imports.checkpoint_name(path), chunk_size=3)
+        with self.assertRaises(KeyboardInterrupt):
+            importer.run(imports.read_rows(path), on_chunk=interrupt)
+        self.assertEqual(ImportCheckpoint.objects.get().position, 6)
+
+    def test_files_with_the_same_name_do_not_share_a_checkpoint(self):
+        first = self.write_file("donations.jsonl", self.rows(4))
+        second = self.write_file("donations.jsonl", self.rows(5))
+        self.assertNotEqual(imports.checkpoint_name(first), imports.checkpoint_name(second))
+        ImportCheckpoint.objects.create(name=imports.checkpoint_name(first), position=4)
+        call_command("import_donations", second, stdout=StringIO())
+        self.assertEqual(Payment.objects.count(), 5)
+
+    def test_dry_run_writes_nothing(self):
+        path = self.write_file("donations.jsonl", self.rows(5))
+        out = StringIO()
+        call_command("import_donations", path, "--dry-run", stdout=out)
+        self.assertIn("Validated 5 of 5 rows", out.getvalue())
+        self.assertFalse(Payment.objects.exists())
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+
+class GeoCacheTests(GiveaidFixturesMixin, TestCase):
+    def setUp(self):
+        geo_cache.invalidate()
+        cache.clear()
+
+    def test_lookups_are_served_from_memory(self):
+        other_state = State.objects.create(country=self.country, name="Ashanti")
+        kumasi = City.objects.create(state=other_state, name="Kumasi")
+        geo_cache.snapshot()
+        with self.assertNumQueries(0):
+            self.assertEqual(geo_cache.city_name(kumasi.id), "Kumasi")
+            self.assertEqual(sorted(geo_cache.states_of(self.country.id)), sorted([self.state.id, other_state.id]))
+            self.assertEqual(geo_cache.cities_of(other_state.id), [kumasi.id])
+            self.assertTrue(geo_cache.contains(self.country.id, other_state.id, kumasi.id))
+            self.assertFalse(geo_cache.contains(self.country.id, self.state.id, kumasi.id))
+            self.assertEqual(self.user.location, {"country": "Ghana", "state": "Greater Accra", "city": "Accra"})
+
+    def test_saves_and_deletes_invalidate(self):
+        self.assertEqual(geo_cache.city_name(self.city.id), "Accra")
+        self.city.name = "Accra Central"
+        self.city.save()
+        self.assertEqual(geo_cache.city_name(self.city.id), "Accra Central")
+        tema = City.objects.create(state=self.state, name="Tema")
+        self.assertIn(tema.id, geo_cache.cities_of(self.state.id))
+        tema.delete()
+        self.assertNotIn(tema.id, geo_cache.cities_of(self.state.id))
+
+    @override_settings(GEO_CACHE_SHARED=True)
+    def test_shared_version_reloads_other_processes(self):
+        other_process = GeoCache()
+        self.assertEqual(other_process.city_name(self.city.id), "Accra")
+        City.objects.filter(id=self.city.id).update(name="Renamed")
+        geo_cache.invalidate()
+        self.assertEqual(other_process.city_name(self.city.id), "Renamed")
+
+    def test_user_validation_uses_the_cache(self):
+        geo_cache.snapshot()
+        user = User(
+            username="ama", firstname="Ama", lastname="Mensah", email="ama@example.com",
+            password="x", dob=datetime.date(1995, 5, 5),
+            country=self.country, state=self.state, city=self.city,
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            user.full_clean()
+        geo_tables = ('"country"', '"state"', '"city"')
+        self.assertFalse([q for q in ctx.captured_queries if any(t in q["sql"] for t in geo_tables)])
+
+        other_country = Country.objects.create(name="Togo")
+        user.country = other_country
+        with self.assertRaises(ValidationError) as raised:
+            user.full_clean()
+        self.assertIn("state", raised.exception.message_dict)
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN is SQLite specific")
+class QueryPlanTests(TestCase):
+    """
+    Each hot query must be answered by index seeks. Any SCAN fails, including
+    a walk of a whole index, and ``index`` names the seek that must appear,
+    with the columns it is bounded on.
+    """
+
+    def assertSeeks(self, plans, index=None):
+        self.assertTrue(plans, "no query was run")
+        for sql, plan in plans:
+            scans = [step for step in plan if step.startswith("SCAN")]
+            self.assertEqual(scans, [], f"scan in plan {plan} for {sql}")
+        if index is not None:
+            steps = [step for _, plan in plans for step in plan]
+            self.assertTrue(any(index in step for step in steps), f"{index} not used in plans {steps}")
+
+    def assertUsesIndex(self, queryset, index=None):
+        with captured_plans() as plans:
+            list(queryset)
+        self.assertSeeks(plans, index)
+
+    def test_payment_by_donation(self):
+        self.assertUsesIndex(
+            Payment.objects.filter(donation_type=Payment.USER_DONATION, donation_id=1),
+            "payment_donation_idx (donation_type=? AND donation_id=?)",
+        )
+        self.assertUsesIndex(
+            Payment.objects.filter(donation_type=Payment.UNREGISTERED_DONATION, donation_id__in=[1, 2, 3]),
+            "payment_donation_idx (donation_type=? AND donation_id=?)",
+        )
+
+    def test_payment_by_date(self):
+        today = datetime.date.today()
+        self.assertUsesIndex(
+            Payment.objects.filter(payment_date__gte=today - datetime.timedelta(days=7), payment_date__lt=today),
+            "payment_date_idx (payment_date>? AND payment_date<?)",
+        )
+
+    def test_user_donations_by_cause(self):
+        self.assertUsesIndex(
+            UserDonation.objects.filter(cause_id=1).order_by("-created_at"),
+            "userdonation_cause_created_idx (cause_id=?)",
+        )
+
+    def test_unregistered_donations_by_email(self):
+        self.assertUsesIndex(
+            UnregisteredDonation.objects.filter(email="ama@example.com"),
+            "unregdonation_email_idx (email=?)",
+        )
+
+    def test_success_stories_by_cause(self):
+        self.assertUsesIndex(
+            SuccessStory.objects.filter(cause_id=1).order_by("-created_at"),
+            "story_cause_created_idx (cause_id=?)",
+        )
+
+    def test_keyset_pages(self):
+        cursor = encode_cursor(datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc), 10)
+        for serializer in (CauseSerializer(), SuccessStorySerializer()):
+            with captured_plans() as plans:
+                paginate(serializer.get_queryset(), cursor=cursor)
+            self.assertSeeks(plans, "(created_at<?)")
+
+    def test_cause_totals_prior_donors(self):
+        with captured_plans() as plans:
+            totals._prior_donors(UserDonation, "user_id", [1, 2], {1}, Payment.USER_DONATION, [1])
+            totals._prior_donors(UnregisteredDonation, "email", [1], {"ama@example.com"}, Payment.UNREGISTERED_DONATION, [1])
+        self.assertSeeks(plans, "payment_donation_idx (donation_type=? AND donation_id=?)")
+
+
+class PaymentGatewayTests(SimpleTestCase):
+    @override_settings(DEBUG=False, TESTING=False)
+    def test_stub_is_refused_outside_debug_and_tests(self):
+        with self.assertRaises(ImproperlyConfigured):
+            get_gateway()
+
+    @override_settings(DEBUG=True, TESTING=False)
+    def test_stub_is_allowed_with_debug(self):
+        self.assertIsInstance(get_gateway(), StubGateway)
+
+    def test_unsigned_stub_rejects_every_webhook(self):
+        gateway = StubGateway()
+        self.assertFalse(gateway.verify_webhook(b"{}", {"X-Stub-Signature": ""}))
+        signed = StubGateway(webhook_secret="secret")
+        self.assertTrue(signed.verify_webhook(b"{}", {"X-Stub-Signature": signed.sign_webhook(b"{}")}))
+        self.assertFalse(signed.verify_webhook(b"{ }", {"X-Stub-Signature": signed.sign_webhook(b"{}")}))
+
+
+class IdempotentIngestionTests(GiveaidFixturesMixin, TestCase):
+    def setUp(self):
+        recent_payments.clear()
+        # Executed on-commit callbacks cache methods the test rollback removes.
+        self.addCleanup(payment_methods.invalidate)
+        self.donation = UserDonation.objects.create(user=self.user, cause=self.cause)
+
+    def ingest(self, key, amount="9.99"):
+        return ingest_payment(
+            key, donation_type=Payment.USER_DONATION, donation_id=self.donation.id,
+            amount=Decimal(amount), payment_method="card",
+        )
+
+    def test_replays_return_the_original_payment(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first, created = self.ingest("ref-1")
+        self.assertTrue(created)
+        recent_payments.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            replay, created = self.ingest("ref-1", amount="1.00")
+        statements = [q["sql"] for q in ctx.captured_queries if "SAVEPOINT" not in q["sql"]]
+        self.assertEqual(len(statements), 1)
+        self.assertFalse(created)
+        self.assertEqual(replay.pk, first.pk)
+        self.assertEqual(replay.amount, Decimal("9.99"))
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertEqual(CauseTotals.objects.get(cause=self.cause).payment_count, 1)
+
+    def test_hot_replays_skip_the_database(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first, _ = self.ingest("ref-2")
+        with self.assertNumQueries(0):
+            replay, created = self.ingest("ref-2")
+        self.assertFalse(created)
+        self.assertEqual(replay.pk, first.pk)
+
+
+@skipUnless(connection.vendor == "sqlite", "exercises SQLite WAL locking")
+class ConcurrentIngestionTests(GiveaidFixturesMixin, TransactionTestCase):
+    """Many threads replaying the same keys must store each payment exactly once."""
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        self.setUpTestData()
+        recent_payments.clear()
+        self.donation = UserDonation.objects.create(user=self.user, cause=self.cause)
+
+    def ingest(self, attempt):
+        try:
+            payment, created = ingest_payment(
+                f"ref-{attempt % 25}", donation_type=Payment.USER_DONATION, donation_id=self.donation.id,
+                amount=Decimal("1.00"), payment_method="card",
+            )
+            return payment.pk, created
+        finally:
+            connections.close_all()
+
+    def test_no_duplicates_under_contention(self):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(self.ingest, range(400)))
+
+        self.assertEqual(sum(created for _, created in results), 25)
+        self.assertEqual(len({pk for pk, _ in results}), 25)
+        self.assertEqual(Payment.objects.count(), 25)
+        self.assertEqual(CauseTotals.objects.get(cause=self.cause).payment_count, 25)
+
+
+@skipUnless(connection.vendor == "sqlite", "exercises SQLite WAL locking")
+class CoalescedIngestionTests(GiveaidFixturesMixin, TransactionTestCase):
+    def setUp(self):
+        self.setUpTestData()
+        recent_payments.clear()
+        self.donation = UserDonation.objects.create(user=self.user, cause=self.cause)
+        self.batches = []
+        payments_created.connect(self.record_batch)
+        self.addCleanup(payments_created.disconnect, self.record_batch)
+        self.addCleanup(payment_writer.stop)
+
+    def record_batch(self, sender, payments, **kwargs):
+        self.batches.append(len(payments))
+
+    def ingest(self, attempt):
+        try:
+            payment, created = ingest_payment(
+                f"burst-{attempt % 50}", donation_type=Payment.USER_DONATION, donation_id=self.donation.id,
+                amount=Decimal("2.00"), payment_method="card",
+            )
+            return payment.pk, created
+        finally:
+            connections.close_all()
+
+    @override_settings(PAYMENT_WRITE_COALESCING=True, PAYMENT_WRITE_MAX_DELAY=0.01)
+    def test_bursts_are_written_in_batches_exactly_once(self):
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(self.ingest, range(400)))
+
+        self.assertEqual(sum(created for _, created in results), 50)
+        self.assertEqual(len({pk for pk, _ in results}), 50)
+        self.assertEqual(Payment.objects.count(), 50)
+        self.assertEqual(CauseTotals.objects.get(cause=self.cause).total_amount, Decimal("100.00"))
+        self.assertEqual(sum(self.batches), 50)
+        self.assertLess(len(self.batches), 50)
+
+    @override_settings(PAYMENT_WRITE_COALESCING=True)
+    def test_calls_inside_a_transaction_write_directly(self):
+        with transaction.atomic():
+            payment, created = ingest_payment(
+                "inline", donation_type=Payment.USER_DONATION, donation_id=self.donation.id,
+                amount=Decimal("2.00"), payment_method="card",
+            )
+            self.assertTrue(created)
+            self.assertTrue(Payment.objects.filter(pk=payment.pk).exists())
+        self.assertIsNone(payment_writer._thread)
+
+    @override_settings(PAYMENT_WRITE_COALESCING=True)
+    async def test_async_ingestion_resolves_the_method_off_the_event_loop(self):
+        payment_methods.invalidate()
+        payment, created = await aingest_payment(
+            "async", donation_type=Payment.USER_DONATION, donation_id=self.donation.id,
+            amount=Decimal("2.00"), payment_method="momo",
+        )
+        self.assertTrue(created)
+        self.assertEqual(payment.payment_method, "momo")
+        self.assertIsNotNone(payment_writer._thread)
+
+
+class SQLiteBackendOptionsTests(SimpleTestCase):
+    def make_connection(self, **options):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        wrapper = DatabaseWrapper({
+            **connection.settings_dict, "NAME": str(Path(tmp.name) / "probe.sqlite3"), "OPTIONS": options,
+        }, alias="probe")
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_init_command_runs_on_every_new_connection(self):
+        wrapper = self.make_connection(
+            timeout=5, init_command="PRAGMA journal_mode = WAL; PRAGMA synchronous = NORMAL;PRAGMA cache_size = -2048",
+        )
+        self.assertEqual(self.pragma(wrapper, "journal_mode"), "wal")
+        self.assertEqual(self.pragma(wrapper, "synchronous"), 1)
+        wrapper.close()
+        self.assertEqual(self.pragma(wrapper, "cache_size"), -2048)
+
+    def test_transaction_mode_sets_the_begin_statement(self):
+        wrapper = self.make_connection(transaction_mode="immediate")
+        with CaptureQueriesContext(wrapper) as ctx:
+            wrapper._start_transaction_under_autocommit()
+        self.assertEqual(ctx.captured_queries[-1]["sql"], "BEGIN IMMEDIATE")
+        self.assertTrue(wrapper.connection.in_transaction)
+        # Threads of this process queue on a lock held until the transaction ends.
+        lock = write_lock(wrapper.settings_dict["NAME"])
+        self.assertTrue(lock.locked())
+        wrapper.rollback()
+        self.assertFalse(lock.locked())
+
+        with self.assertRaises(ImproperlyConfigured):
+            self.make_connection(transaction_mode="eventually").transaction_mode
+
+
+class RollupTests(GiveaidFixturesMixin, TestCase):
+    METHODS = ["card", "momo", "bank"]
+    DIMENSION_SETS = [(), ("cause",), ("country", "state", "city"), ("payment_method",), rollups.DIMENSIONS]
+
+    def build_geo(self, rng, seed):
+        users = [self.user]
+        for i in range(4):
+            country = Country.objects.create(name=f"Country {seed}-{i}")
+            state = State.objects.create(country=country, name=f"State {seed}-{i}")
+            city = City.objects.create(state=state, name=f"City {seed}-{i}")
+            users.append(make_user(city, f"donor{seed}x{i}"))
+        causes = [self.cause] + [
+            Cause.objects.create(title=f"Cause {seed}-{i}", description="...") for i in range(3)
+        ]
+        return users, causes
+
+    def add_payments(self, rng, count, users, causes):
+        start = datetime.date(2024, 1, 1)
+        for _ in range(count):
+            cause = rng.choice(causes)
+            if rng.random() < 0.6:
+                donation = UserDonation.objects.create(user=rng.choice(users), cause=cause)
+                donation_type = Payment.USER_DONATION
+            else:
+                donation = UnregisteredDonation.objects.create(
+                    cause=cause, firstname="Ama", lastname="Mensah", email=f"{rng.random()}@example.com",
+                )
+                donation_type = Payment.UNREGISTERED_DONATION
+            payment = Payment.objects.create(
+                donation_type=donation_type, donation_id=donation.id,
+                amount=Decimal(rng.randint(1, 100000)) / 100, payment_method=rng.choice(self.METHODS),
+            )
+            Payment.objects.filter(pk=payment.pk).update(
+                payment_date=start + datetime.timedelta(days=rng.randint(0, 120)),
+            )
+
+    def raw_series(self, period, dimensions):
+        buckets = {}
+        for payment in Payment.objects.with_donations("user"):
+            donation = payment.get_donation()
+            user = getattr(donation, "user", None)
+            day = payment.payment_date
+            if period == "week":
+                day -= datetime.timedelta(days=day.weekday())
+            elif period == "month":
+                day = day.replace(day=1)
+            values = {
+                "cause_id": donation.cause_id,
+                "country_id": user and user.country_id,
+                "state_id": user and user.state_id,
+                "city_id": user and user.city_id,
+                "payment_method": payment.payment_method,
+            }
+            columns = [f"{name}_id" if name != "payment_method" else name for name in dimensions]
+            key = (day, *(values[column] for column in columns))
+            bucket = buckets.setdefault(key, {"period": day, **{c: values[c] for c in columns},
+                                              "amount": Decimal("0"), "payment_count": 0})
+            bucket["amount"] += payment.amount
+            bucket["payment_count"] += 1
+        return list(buckets.values())
+
+    def assertSeriesMatchRaw(self):
+        def ordered(rows):
+            # Backends disagree on where NULL dimensions sort.
+            return sorted(rows, key=lambda row: [(row[k] is not None, row[k]) for k in sorted(row)])
+
+        for period in rollups.PERIODS:
+            for dimensions in self.DIMENSION_SETS:
+                with self.subTest(period=period, dimensions=dimensions):
+                    self.assertEqual(
+                        ordered(rollups.series(period, dimensions)),
+                        ordered(self.raw_series(period, dimensions)),
+                    )
+
+    def test_incremental_rollups_match_raw_aggregates(self):
+        for seed in range(3):
+            rng = random.Random(seed)
+            users, causes = self.build_geo(rng, seed)
+            for _ in range(3):
+                self.add_payments(rng, rng.randint(5, 40), users, causes)
+                rollups.update(batch_size=rng.randint(1, 17))
+            self.assertSeriesMatchRaw()
+
+    def test_update_only_reads_new_payments(self):
+        self.make_payments(5)
+        self.assertEqual(rollups.update(), 5)
+        self.assertEqual(rollups.update(), 0)
+        self.make_payments(2)
+        self.assertEqual(rollups.update(batch_size=1), 2)
+
+    def test_payments_committed_after_the_mark_are_not_skipped(self):
+        # created_at is set before the write lock is taken, so a payment can
+        # commit after one stamped later than it has been rolled up.
+        first = self.make_payments(1, amount="6.00")[0]
+        Payment.objects.filter(pk=first.pk).update(created_at=timezone.now() + datetime.timedelta(minutes=1))
+        rollups.update()
+        rankings.update()
+        self.make_payments(1, amount="4.00")
+        self.assertEqual(rollups.update(), 1)
+        self.assertEqual(rankings.update(), 1)
+        self.assertEqual(rollups.series("month", ())[0]["amount"], Decimal("10.00"))
+
+    def test_backfill_command_rebuilds_from_scratch(self):
+        self.make_payments(6, amount="3.00")
+        rollups.update()
+        DailyDonationRollup.objects.update(amount=0)
+        call_command("rollup", "--backfill", stdout=StringIO())
+        self.assertEqual(rollups.series("month", ())[0]["amount"], Decimal("18.00"))
+        self.assertSeriesMatchRaw()
+
+    def test_backfill_matches_raw_aggregates_and_resumes_incrementally(self):
+        rng = random.Random(11)
+        users, causes = self.build_geo(rng, 11)
+        self.add_payments(rng, 60, users, causes)
+        self.assertEqual(rollups.backfill(), 60)
+        self.assertSeriesMatchRaw()
+        self.add_payments(rng, 7, users, causes)
+        self.assertEqual(rollups.update(), 7)
+        self.assertSeriesMatchRaw()
+
+
+def n_plus_one_view(request):
+    # UserDonation.__str__ follows user and cause: two extra queries per row.
+    return HttpResponse("\n".join(str(donation) for donation in UserDonation.objects.all()))
+
+
+@query_budget(1)
+def budgeted_view(request):
+    return n_plus_one_view(request)
+
+
+async def async_view(request):
+    return HttpResponse(str(len([donation async for donation in UserDonation.objects.all()])))
+
+
+def streaming_view(request):
+    # The queries run while the body is read, after the view has returned.
+    return streaming_response(request, (f"{donation}\n" for donation in UserDonation.objects.all()))
+
+
+urlpatterns = [
+    path("n-plus-one/", n_plus_one_view, name="n-plus-one"),
+    path("budgeted/", budgeted_view, name="budgeted"),
+    path("async/", async_view, name="async"),
+    path("streaming/", streaming_view, name="streaming"),
+]
+
+
+@override_settings(
+    ROOT_URLCONF="giveaid.tests",
+    QUERY_STATS_HEADERS=True,
+    QUERY_STATS_HISTOGRAM=True,
+    QUERY_BUDGET=None,
+    QUERY_BUDGET_RAISE=True,
+)
+class QueryStatsMiddlewareTests(GiveaidFixturesMixin, TestCase):
+    def setUp(self):
+        query_stats.clear()
+        for _ in range(3):
+            UserDonation.objects.create(user=self.user, cause=self.cause)
+
+    def test_headers_report_queries_and_duplicates(self):
+        with self.assertLogs("giveaid.requests", "INFO") as logs:
+            response = self.client.get("/n-plus-one/")
+        self.assertEqual(response["X-DB-Queries"], "7")
+        duplicates = dict(item.split("x") for item in response["X-DB-Duplicate-Queries"].split(","))
+        self.assertEqual(sorted(duplicates.values()), ["3", "3"])
+        self.assertIn("db;dur=", response["Server-Timing"])
+        self.assertEqual(logs.records[0].queries, 7)
+        self.assertEqual(logs.records[0].url_name, "n-plus-one")
+
+    def test_histogram_summarizes_per_url_name(self):
+        for _ in range(4):
+            self.client.get("/n-plus-one/")
+        summary = query_stats.summary("n-plus-one")
+        self.assertEqual(summary["requests"], 4)
+        self.assertEqual(summary["queries"]["max"], 7)
+
+    def test_budget_raises_when_exceeded(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get("/budgeted/")
+        with self.settings(QUERY_BUDGET=3):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get("/n-plus-one/")
+        with self.settings(QUERY_BUDGET_RAISE=False):
+            self.assertEqual(self.client.get("/budgeted/").status_code, 200)
+
+    def test_api_listings_stay_within_budget(self):
+        with self.settings(ROOT_URLCONF="giveaid_project.urls"):
+            response = self.client.get("/api/causes/")
+        self.assertEqual(response["X-DB-Queries"], "1")
+
+    def test_middleware_chain_stays_async_under_asgi(self):
+        self.assertNotIsInstance(ASGIHandler()._middleware_chain, SyncToAsync)
+
+    async def test_async_requests_are_recorded(self):
+        response = await self.async_client.get("/async/")
+        self.assertEqual(response.content, b"3")
+        self.assertEqual(response["X-DB-Queries"], "1")
+
+    def test_streamed_queries_are_logged_when_the_body_ends(self):
+        with self.assertLogs("giveaid.requests", "INFO") as logs:
+            response = self.client.get("/streaming/")
+            self.assertEqual(logs.output, [])
+            body = b"".join(response.streaming_content)
+        self.assertEqual(body.count(b"\n"), 3)
+        self.assertNotIn("X-DB-Queries", response)
+        self.assertEqual(logs.records[0].queries, 7)
+
+    async def test_async_streamed_queries_are_logged_when_the_body_ends(self):
+        with self.assertLogs("giveaid.requests", "INFO") as logs:
+            response = await self.async_client.get("/streaming/")
+            body = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(body.count(b"\n"), 3)
+        self.assertEqual(logs.records[0].queries, 7)
+
+
+class AdminChangelistTests(GiveaidFixturesMixin, TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="x", firstname="Ad", lastname="Min",
+            dob=datetime.date(1980, 1, 1), country=self.country, state=self.state, city=self.city,
+        )
+        self.client.force_login(self.admin_user)
+
+    def changelist_queries(self, model_name):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f"/admin/giveaid/{model_name}/")
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.make_payments(10)
+        small = {name: self.changelist_queries(name) for name in ("payment", "userdonation", "unregistereddonation")}
+        self.make_payments(90)
+        for name, count in small.items():
+            with self.subTest(model=name):
+                self.assertEqual(self.changelist_queries(name), count)
+        self.assertLessEqual(small["payment"], 12)
+
+    def test_payment_changelist_shows_linked_donation(self):
+        self.make_payments(2)
+        response = self.client.get("/admin/giveaid/payment/")
+        self.assertContains(response, "Donation by kofi to Clean water")
+        self.assertContains(response, "Unregistered donor donation to Clean water")
+
+    def test_changelists_do_not_aggregate_the_whole_table(self):
+        self.make_payments(200)
+        for name in ("payment", "cause", "successstory"):
+            with self.subTest(model=name), captured_plans() as plans:
+                self.assertEqual(self.client.get(f"/admin/giveaid/{name}/").status_code, 200)
+            for sql, plan in plans:
+                # A date_hierarchy's SELECT DISTINCT over every row shows up as a temp b-tree.
+                self.assertFalse([step for step in plan if "TEMP B-TREE" in step], f"{plan} for {sql}")
+
+    def test_payments_filter_by_date(self):
+        self.make_payments(3)
+        Payment.objects.filter(pk=Payment.objects.earliest("id").pk).update(payment_date=datetime.date(2020, 1, 1))
+        today = timezone.localdate()
+        response = self.client.get(
+            "/admin/giveaid/payment/",
+            {"payment_date__gte": today.isoformat(), "payment_date__lt": (today + datetime.timedelta(days=1)).isoformat()},
+        )
+        self.assertEqual(response.context["cl"].result_count, 2)
+
+    def test_large_unfiltered_tables_use_the_estimate(self):
+        for i in range(5):
+            Cause.objects.create(title=f"Cause {i}", description="...")
+        Cause.objects.filter(title__in=["Cause 0", "Cause 1"]).delete()
+
+        paginator = EstimatedCountPaginator(Cause.objects.order_by("id"), 10)
+        self.assertEqual(paginator.count, 4)
+        paginator = EstimatedCountPaginator(Cause.objects.order_by("id"), 10)
+        paginator.exact_count_threshold = 0
+        if connection.vendor == "sqlite":
+            self.assertEqual(paginator.count, 6)
+        filtered = EstimatedCountPaginator(Cause.objects.filter(title__startswith="Cause").order_by("id"), 10)
+        filtered.exact_count_threshold = 0
+        self.assertEqual(filtered.count, 3)
+
+
+@skipUnless(connection.vendor == "sqlite", "The FTS5 index is SQLite only.")
+class SearchIndexTests(GiveaidFixturesMixin, TestCase):
+    def ids(self, query, **kwargs):
+        return [(row["kind"], row["id"]) for row in search.search(query, **kwargs)]
+
+    def test_title_matches_rank_above_description_matches(self):
+        wells = Cause.objects.create(title="Village wells", description="Drilling boreholes")
+        story = SuccessStory.objects.create(
+            user=self.user, cause=self.cause, title="A new school", description="Children now drink from the wells",
+        )
+        results = self.ids("wells")
+        self.assertEqual(results[0], ("cause", wells.id))
+        self.assertEqual(set(results[1:]), {("cause", self.cause.id), ("story", story.id)})
+        self.assertEqual(self.ids("wells", kinds=("story",)), [("story", story.id)])
+
+    def test_terms_match_as_prefixes_and_all_must_match(self):
+        self.assertEqual(self.ids("vill"), [("cause", self.cause.id)])
+        self.assertEqual(self.ids("clean vill"), [("cause", self.cause.id)])
+        self.assertEqual(self.ids("clean desert"), [])
+        self.assertEqual(self.ids('"*) OR ('), [])
+
+    def test_triggers_follow_every_write_path(self):
+        Cause.objects.bulk_create([Cause(title="Solar lamps", description="Light for study")])
+        self.assertEqual(len(self.ids("solar")), 1)
+        Cause.objects.filter(title="Solar lamps").update(title="Wind lamps")
+        self.assertEqual(self.ids("solar"), [])
+        self.assertEqual(len(self.ids("wind")), 1)
+        Cause.objects.filter(title="Wind lamps").delete()
+        self.assertEqual(self.ids("wind"), [])
+
+    def test_snippets_highlight_matches_and_escape_html(self):
+        Cause.objects.create(title="Books", description="<b>Reading</b> books for the library")
+        [result] = search.search("library")
+        self.assertIn("<mark>library</mark>", result["snippet"])
+        self.assertIn("&lt;b&gt;Reading&lt;/b&gt;", result["snippet"])
+
+    def test_rebuild_restores_dropped_triggers(self):
+        search.uninstall(connection)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE name LIKE 'cause_search%'")
+            self.assertEqual(cursor.fetchall(), [])
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(self.ids("clean"), [("cause", self.cause.id)])
+        Cause.objects.create(title="Clean air", description="Filters")
+        self.assertEqual(len(self.ids("clean")), 2)
+
+    def test_fallback_matches_every_term(self):
+        results = search._fallback_search("water vill", ["cause", "story"], 10, "default")
+        self.assertEqual([(row["kind"], row["id"]) for row in results], [("cause", self.cause.id)])
+
+
+@override_settings(DATABASE_REPLICA="replica")
+class ReplicaRouterTests(SimpleTestCase):
+    router = PrimaryReplicaRouter()
+
+    def test_catalogue_reads_go_to_the_replica(self):
+        with primary_pinning():
+            for model in (Cause, SuccessStory, Country, City, CauseTotals, DailyDonationRollup):
+                with self.subTest(model=model.__name__):
+                    self.assertEqual(self.router.db_for_read(model), "replica")
+            for model in (Payment, User, UserDonation, ImportCheckpoint):
+                with self.subTest(model=model.__name__):
+                    self.assertEqual(self.router.db_for_read(model), "default")
+
+    def test_writes_pin_later_reads_to_the_primary(self):
+        with primary_pinning():
+            with primary_pinning():
+                self.assertEqual(self.router.db_for_write(Cause), "default")
+                self.assertTrue(is_pinned())
+                self.assertEqual(self.router.db_for_read(Cause), "default")
+            self.assertFalse(is_pinned())
+
+    @override_settings(DATABASE_REPLICA=None)
+    def test_no_replica_leaves_routing_to_django(self):
+        self.assertIsNone(self.router.db_for_read(Cause))
+        self.assertIsNone(self.router.allow_migrate("default", "giveaid"))
+
+    def test_replica_is_never_migrated(self):
+        self.assertIs(self.router.allow_migrate("replica", "giveaid"), False)
+
+    def test_middleware_scopes_the_pin_to_each_request(self):
+        seen = []
+
+        def view(request):
+            seen.append(self.router.db_for_read(Cause))
+            self.router.db_for_write(Payment)
+            seen.append(self.router.db_for_read(Cause))
+            return HttpResponse()
+
+        middleware = PrimaryPinningMiddleware(view)
+        factory = RequestFactory()
+        with primary_pinning():
+            middleware(factory.get("/"))
+            middleware(factory.get("/"))
+            middleware(factory.post("/"))
+            self.assertFalse(is_pinned())
+        self.assertEqual(seen, ["replica", "default", "replica", "default", "default", "default"])
+
+    async def test_async_middleware_scopes_the_pin_to_each_request(self):
+        seen = []
+
+        async def view(request):
+            seen.append(self.router.db_for_read(Cause))
+            await sync_to_async(self.router.db_for_write)(Payment)
+            seen.append(self.router.db_for_read(Cause))
+            return HttpResponse()
+
+        middleware = PrimaryPinningMiddleware(view)
+        factory = RequestFactory()
+        with primary_pinning():
+            await middleware(factory.get("/"))
+            await middleware(factory.post("/"))
+            self.assertFalse(is_pinned())
+        self.assertEqual(seen, ["replica", "default", "default", "default"])
+
+
+@override_settings(DATABASE_REPLICA="replica")
+class ReplicaDatabaseTests(TransactionTestCase):
+    """
+    Routing against a second SQLite file. TestCase's open transaction on the
+    primary would keep every read there.
+    """
+
+    databases = {"default", "replica"}
+
+    def tearDown(self):
+        # The flush skips the replica: the router keeps Django off it.
+        Cause.objects.using("replica").all().delete()
+
+    def titles(self):
+        return sorted(Cause.objects.values_list("title", flat=True))
+
+    def test_databases_are_separate_files(self):
+        names = {connections[alias].settings_dict["NAME"] for alias in self.databases}
+        self.assertEqual(len(names), 2)
+
+    def test_catalogue_reads_go_to_the_replica(self):
+        Cause.objects.using("replica").create(title="Only on the replica", description="...")
+        with primary_pinning():
+            self.assertEqual(self.titles(), ["Only on the replica"])
+            self.assertFalse(is_pinned())
+
+    def test_reads_after_a_write_go_to_the_primary(self):
+        Cause.objects.using("replica").create(title="Lagging", description="...")
+        with primary_pinning():
+            Cause.objects.create(title="Just written", description="...")
+            self.assertEqual(self.titles(), ["Just written"])
+        with primary_pinning():
+            self.assertEqual(self.titles(), ["Lagging"])
+
+    def test_requests_start_unpinned(self):
+        Cause.objects.using("replica").create(title="Only on the replica", description="...")
+        with primary_pinning():
+            Cause.objects.create(title="Just written", description="...")
+            response = self.client.get("/api/causes/")
+        self.assertEqual([row["title"] for row in response.json()["results"]], ["Only on the replica"])
+
+    def test_job_batches_and_commands_do_not_leave_the_caller_pinned(self):
+        jobs.enqueue("flaky_task", {})
+        with primary_pinning():
+            self.assertEqual(jobs.run_next(), 1)
+            self.assertFalse(is_pinned())
+            call_command("rebuild_cause_totals", stdout=StringIO())
+            self.assertFalse(is_pinned())
+            self.assertEqual(self.titles(), [])
+
+
+flaky_calls = []
+
+
+@jobs.task(max_attempts=3)
+def flaky_task(payload):
+    flaky_calls.append(payload)
+    if len(flaky_calls) <= payload.get("failures", 0):
+        raise RuntimeError("temporarily unavailable")
+
+
+@jobs.task(batch_size=10, max_attempts=3)
+def picky_batch(payloads):
+    # Fails the odd payloads.
+    return {
+        index: ValueError(f"cannot handle {payload['n']}")
+        for index, payload in enumerate(payloads)
+        if payload["n"] % 2
+    }
+
+
+class JobQueueTests(GiveaidFixturesMixin, TestCase):
+    def setUp(self):
+        flaky_calls.clear()
+        # Creating the fixture user queued its donation linking.
+        Job.objects.all().delete()
+
+    def test_payments_enqueue_their_jobs_in_the_same_transaction(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.make_payments(1)
+            self.assertTrue(Job.objects.exists())
+            raise RuntimeError("rolled back")
+        self.assertFalse(Job.objects.exists())
+
+        self.make_payments(3)
+        ingest_payment("ref-1", donation_type=Payment.USER_DONATION, donation_id=UserDonation.objects.first().id,
+                       amount=Decimal("4.00"), payment_method="card")
+        counts = dict(Job.objects.values_list("task").annotate(count=Count("id")))
+        self.assertEqual(counts, {"send_receipt": 4, "notify_gateway": 1, "update_rollups": 4})
+
+    def test_worker_batches_receipts_and_runs_follow_up_work(self):
+        payments = self.make_payments(5, amount="12.00")
+        ingest_payment("ref-2", donation_type=Payment.USER_DONATION, donation_id=UserDonation.objects.first().id,
+                       amount=Decimal("3.00"), payment_method="momo")
+        get_gateway().notifications.clear()
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(jobs.run_next(), 6)
+        self.assertEqual(len(mail.outbox), 6)
+        self.assertLessEqual(len(ctx.captured_queries), 8)
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            sorted(["kofi@example.com"] * 4 + ["ama1@example.com", "ama3@example.com"]),
+        )
+        self.assertIn("12.00 to Clean water", mail.outbox[0].body)
+
+        jobs.work(once=True)
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual([(ref, event) for ref, event, data in get_gateway().notifications], [("ref-2", "payment.recorded")])
+        self.assertEqual(DailyDonationRollup.objects.aggregate(total=Sum("payment_count"))["total"], len(payments) + 1)
+
+    def test_batches_retry_only_their_failed_jobs(self):
+        jobs.enqueue_many("picky_batch", [{"n": n} for n in range(4)])
+        with self.assertLogs("giveaid.jobs", "WARNING") as logs:
+            self.assertEqual(jobs.run_next(), 4)
+        self.assertEqual(len(logs.records), 2)
+        retried = Job.objects.order_by("id")
+        self.assertEqual([job.payload["n"] for job in retried], [1, 3])
+        self.assertEqual({job.status for job in retried}, {Job.PENDING})
+        self.assertIn("cannot handle 3", retried[1].last_error)
+
+    def test_a_refused_receipt_only_retries_its_own_job(self):
+        self.make_payments(4)
+        send = locmem.EmailBackend.send_messages
+
+        def refuse_ama1(backend, messages):
+            if messages[0].to == ["ama1@example.com"]:
+                raise SMTPRecipientsRefused({"ama1@example.com": (550, b"No such user")})
+            return send(backend, messages)
+
+        with patch.object(locmem.EmailBackend, "send_messages", refuse_ama1), self.assertLogs("giveaid.jobs", "WARNING"):
+            jobs.run_next()
+        self.assertEqual(len(mail.outbox), 3)
+        receipts = Job.objects.filter(task="send_receipt")
+        self.assertEqual(receipts.count(), 1)
+        self.assertEqual(receipts.get().status, Job.PENDING)
+        Job.objects.update(run_at=timezone.now())
+        jobs.work(once=True)
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(mail.outbox[-1].to, ["ama1@example.com"])
+
+    def test_failures_back_off_and_then_dead_letter(self):
+        job = jobs.enqueue("flaky_task", {"failures": 5})
+        for attempt in range(1, 4):
+            with self.assertLogs("giveaid.jobs", "WARNING"):
+                self.assertEqual(jobs.run_next(), 1)
+            job.refresh_from_db()
+            self.assertEqual(job.attempts, attempt)
+            self.assertIn("temporarily unavailable", job.last_error)
+            if attempt < 3:
+                self.assertEqual(job.status, Job.PENDING)
+                self.assertGreater(job.run_at, timezone.now())
+                self.assertEqual(jobs.run_next(), 0)
+                Job.objects.filter(id=job.id).update(run_at=timezone.now())
+        self.assertEqual(job.status, Job.DEAD)
+        self.assertEqual(jobs.work(once=True), 0)
+
+        self.assertEqual(jobs.requeue(), 1)
+        flaky_calls.clear()
+        Job.objects.filter(id=job.id).update(payload={"failures": 0})
+        self.assertEqual(jobs.work(once=True), 1)
+        self.assertFalse(Job.objects.exists())
+
+    def test_backoff_doubles_up_to_the_cap(self):
+        with override_settings(JOB_RETRY_BACKOFF=2.0, JOB_RETRY_BACKOFF_MAX=30):
+            for attempts, ceiling in ((1, 2), (2, 4), (3, 8), (10, 30)):
+                delay = jobs.backoff(attempts)
+                self.assertTrue(ceiling / 2 <= delay <= ceiling, (attempts, delay))
+
+    def test_stale_claims_are_released(self):
+        job = jobs.enqueue("flaky_task")
+        Job.objects.filter(id=job.id).update(
+            status=Job.RUNNING, locked_by="gone", locked_at=timezone.now() - datetime.timedelta(hours=1),
+        )
+        self.assertEqual(jobs.release_stale(), 1)
+        self.assertEqual(jobs.work(once=True), 1)
+
+    def test_unknown_tasks_are_dead_lettered(self):
+        Job.objects.create(task="no_such_task")
+        self.assertEqual(jobs.work(once=True), 0)
+        self.assertEqual(Job.objects.get().status, Job.DEAD)
+        with self.assertRaises(ValueError):
+            jobs.enqueue("no_such_task")
+
+
+class DonorLinkingTests(GiveaidFixturesMixin, TestCase):
+    def anonymous_donation(self, email):
+        return UnregisteredDonation.objects.create(cause=self.cause, firstname="Esi", lastname="Owusu", email=email)
+
+    def test_verifying_an_email_links_earlier_anonymous_donations(self):
+        earlier = [self.anonymous_donation("esi@example.com") for _ in range(3)]
+        other = self.anonymous_donation("someone@example.com")
+        Job.objects.all().delete()
+
+        esi = make_user(self.city, "esi")
+        self.assertFalse(Job.objects.exists())
+        esi.email_verified = True
+        esi.save(update_fields=["email_verified"])
+        self.assertEqual(list(Job.objects.values_list("task", "payload")), [
+            ("link_anonymous_donations", {"email": "esi@example.com"}),
+        ])
+        jobs.work(once=True)
+        self.assertEqual(list(esi.unregistered_donations.order_by("id")), earlier)
+        other.refresh_from_db()
+        self.assertIsNone(other.user)
+
+    def test_unverified_accounts_get_nothing(self):
+        donation = self.anonymous_donation("esi@example.com")
+        esi = make_user(self.city, "esi")
+        self.assertEqual(donors.link_anonymous_donations(), 0)
+        self.assertEqual(donors.link_anonymous_donations({"esi@example.com"}), 0)
+        jobs.work(once=True)
+        donation.refresh_from_db()
+        self.assertIsNone(donation.user)
+        self.assertFalse(esi.unregistered_donations.exists())
+
+    @override_settings(LINK_ANONYMOUS_DONATIONS=False)
+    def test_command_links_what_the_jobs_did_not(self):
+        Job.objects.all().delete()
+        esi = make_user(self.city, "esi", email_verified=True)
+        User.objects.filter(id=self.user.id).update(email_verified=True)
+        make_user(self.city, "yaw")
+        self.anonymous_donation("yaw@example.com")
+        self.assertFalse(Job.objects.exists())
+        donations = [self.anonymous_donation("esi@example.com"), self.anonymous_donation("kofi@example.com")]
+        out = StringIO()
+        call_command("link_anonymous_donations", stdout=out)
+        self.assertIn("Linked 2", out.getvalue())
+        self.assertEqual(
+            [donation.user for donation in UnregisteredDonation.objects.filter(id__in=[d.id for d in donations]).order_by("id")],
+            [esi, self.user],
+        )
+
+
+class JobWorkerPoolTests(GiveaidFixturesMixin, TransactionTestCase):
+    def setUp(self):
+        self.setUpTestData()
+
+    def test_process_pool_drains_the_queue(self):
+        self.make_payments(40)
+        out = StringIO()
+        call_command("run_workers", processes=2, once=True, stdout=out)
+        self.assertFalse(Job.objects.exists())
+        self.assertIn("Processed", out.getvalue())
+        self.assertEqual(DailyDonationRollup.objects.aggregate(total=Sum("payment_count"))["total"], 40)
+
+
+class RankingTests(GiveaidFixturesMixin, TestCase):
+    def setUp(self):
+        self.rng = random.Random(11)
+        self.causes = [self.cause] + [Cause.objects.create(title=f"Cause {i}", description="...") for i in range(4)]
+        self.donors = [self.user] + [make_user(self.city, f"donor{i}") for i in range(3)]
+
+    def pay(self, count, start, end):
+        """``count`` payments of random causes and donors, dated between ``start`` and ``end``."""
+        for _ in range(count):
+            payments = self.make_payments(
+                self.rng.choice([1, 2]), amount=self.rng.choice(["5.00", "12.50", "40.00"]),
+                cause=self.rng.choice(self.causes), user=self.rng.choice(self.donors),
+            )
+            moment = start + (end - start) * self.rng.random()
+            Payment.objects.filter(id__in=[payment.id for payment in payments]).update(created_at=moment)
+
+    def brute_force(self, board, now):
+        start = board.window_start(now)
+        totals = {}
+        for payment in Payment.objects.with_donations().filter(created_at__gte=start):
+            donation = payment.get_donation()
+            if board.dimension == "cause":
+                member = str(donation.cause_id)
+            elif payment.donation_type == Payment.USER_DONATION:
+                member = str(donation.user_id)
+            else:
+                continue
+            amount, count = totals.get(member, (Decimal("0.00"), 0))
+            totals[member] = (amount + payment.amount, count + 1)
+        return totals
+
+    def assertMatchesBruteForce(self, now):
+        for board in rankings.BOARDS.values():
+            expected = self.brute_force(board, now)
+            stored = {
+                entry.member: (entry.amount, entry.payment_count)
+                for entry in RankingEntry.objects.filter(board=board.name)
+            }
+            self.assertEqual(stored, expected, board.name)
+            top = rankings.top(board.name, limit=3)
+            ordered = sorted(expected.items(), key=lambda item: (-board.score(*item[1]), item[0]))[:3]
+            self.assertEqual([row["id"] for row in top], [member for member, _ in ordered], board.name)
+
+    def test_incremental_updates_and_expiry_match_brute_force(self):
+        t0 = timezone.now() - datetime.timedelta(days=20)
+        self.pay(40, t0 - datetime.timedelta(days=40), t0)
+        rankings.update(now=t0)
+        self.assertMatchesBruteForce(t0)
+
+        # Enough time passes for the 24-hour and 7-day windows to slide.
+        t1 = t0 + datetime.timedelta(days=3, hours=5, minutes=17)
+        self.pay(25, t0, t1)
+        rankings.update(now=t1)
+        self.assertMatchesBruteForce(t1)
+
+        t2 = t1 + datetime.timedelta(days=8)
+        rankings.update(now=t2)
+        self.assertMatchesBruteForce(t2)
+        self.assertFalse(RankingBucket.objects.filter(board="top-causes", hour__lt=t2 - datetime.timedelta(days=7)).exists())
+
+    def test_rebuild_matches_incremental_state(self):
+        now = timezone.now()
+        self.pay(30, now - datetime.timedelta(days=35), now)
+        rankings.update(now=now)
+        incremental = sorted(RankingEntry.objects.values_list("board", "member", "amount", "payment_count", "score"))
+        buckets = sorted(RankingBucket.objects.values_list("board", "hour", "member", "amount", "payment_count"))
+
+        rankings.rebuild(now=now)
+        self.assertEqual(sorted(RankingEntry.objects.values_list("board", "member", "amount", "payment_count", "score")), incremental)
+        self.assertEqual(sorted(RankingBucket.objects.values_list("board", "hour", "member", "amount", "payment_count")), buckets)
+        out = StringIO()
+        call_command("update_rankings", "--rebuild", stdout=out)
+        self.assertIn("Rebuilt 3 leaderboards", out.getvalue())
+
+    def test_top_reads_only_the_requested_entries(self):
+        self.pay(20, timezone.now() - datetime.timedelta(hours=10), timezone.now())
+        rankings.rebuild()
+        with CaptureQueriesContext(connection) as ctx:
+            rows = rankings.top("top-causes", limit=2)
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertIn("LIMIT 2", ctx.captured_queries[0]["sql"])
+        self.assertEqual([row["rank"] for row in rows], [1, 2])
+        titles = dict(Cause.objects.values_list("id", "title"))
+        self.assertEqual([row["name"] for row in rows], [titles[int(row["id"])] for row in rows])
+        with self.assertRaises(ValueError):
+            rankings.top("most-generous")
+
+
+class ExportPaymentsTests(GiveaidFixturesMixin, TestCase):
+    def export(self, *args):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / args[0]
+        stderr = StringIO()
+        call_command("export_payments", "--output", str(path), *args[1:], stderr=stderr)
+        self.assertIn("Exported", stderr.getvalue())
+        return path
+
+    def test_rows_resolve_donation_donor_and_cause(self):
+        user_payment, anonymous_payment = self.make_payments(2, amount="7.50")
+        with self.assertNumQueries(3):
+            rows = list(exports.export_rows(chunk_size=10))
+        self.assertEqual([row["payment_id"] for row in rows], [user_payment.id, anonymous_payment.id])
+        self.assertEqual(rows[0]["donor_id"], self.user.id)
+        self.assertEqual(rows[0]["donor_email"], self.user.email)
+        self.assertEqual(rows[1]["donor_id"], None)
+        self.assertEqual(rows[1]["donor_email"], "ama1@example.com")
+        self.assertEqual({row["cause_title"] for row in rows}, {"Clean water"})
+        self.assertEqual({row["amount"] for row in rows}, {Decimal("7.50")})
+
+    def test_csv_and_gzipped_jsonl_round_trip(self):
+        payments = self.make_payments(5)
+        with self.export("payments.csv").open(newline="") as handle:
+            rows = list(csv.DictReader(handle))
+        self.assertEqual([int(row["payment_id"]) for row in rows], [p.id for p in payments])
+        self.assertEqual(list(rows[0]), list(exports.COLUMNS))
+
+        with gzip.open(self.export("payments.jsonl.gz"), "rt") as handle:
+            rows = [json.loads(line) for line in handle]
+        self.assertEqual([row["transaction_id"] for row in rows], [str(p.transaction_id) for p in payments])
+        self.assertEqual(rows[0]["amount"], "10.00")
+
+    def test_csv_cells_are_not_formulas(self):
+        self.cause.title = "=HYPERLINK(\"http://example.com\")"
+        self.cause.save()
+        payment = self.make_payments(2, email="@sum@example.com")[1]
+        UnregisteredDonation.objects.filter(id=payment.donation_id).update(firstname="+1", lastname="-2")
+        Payment.objects.filter(id=payment.id).update(amount=Decimal("-5.00"))
+        with self.export("payments.csv").open(newline="") as handle:
+            row = list(csv.DictReader(handle))[1]
+        self.assertEqual(row["cause_title"], "'=HYPERLINK(\"http://example.com\")")
+        self.assertEqual((row["donor_firstname"], row["donor_lastname"]), ("'+1", "'-2"))
+        self.assertEqual(row["donor_email"], "'@sum@example.com")
+        # Numbers are written as numbers.
+        self.assertEqual(row["amount"], "-5.00")
+        with self.export("payments.jsonl").open() as handle:
+            row = [json.loads(line) for line in handle][1]
+        self.assertEqual(row["donor_firstname"], "+1")
+
+    def test_filters_by_date_and_cause(self):
+        school = Cause.objects.create(title="School books", description="...")
+        water = self.make_payments(3)
+        books = self.make_payments(3, cause=school)
+        Payment.objects.filter(id=water[0].id).update(payment_date=datetime.date(2020, 1, 1))
+
+        def exported(**filters):
+            return [row["payment_id"] for row in exports.export_rows(exports.payments_for_export(**filters))]
+
+        self.assertEqual(exported(cause=school.id), [p.id for p in books])
+        self.assertEqual(exported(end=datetime.date(2020, 1, 31)), [water[0].id])
+        self.assertEqual(exported(start=datetime.date(2020, 2, 1), cause=self.cause.id), [p.id for p in water[1:]])
+        with self.assertRaises(CommandError):
+            self.export("payments.csv", "--cause", "999")
+
+    def test_memory_stays_flat_as_rows_grow(self):
+        def seed(count):
+            donations = UserDonation.objects.bulk_create(
+                UserDonation(user=self.user, cause=self.cause) for _ in range(count)
+            )
+            Payment.objects.bulk_create(
+                Payment(donation_type=Payment.USER_DONATION, donation_id=d.id, amount=Decimal("1.00"), payment_method="card")
+                for d in donations
+            )
+
+        def peak(compress):
+            tracemalloc.start()
+            try:
+                size = sum(len(chunk) for chunk in exports.stream(exports.export_rows(chunk_size=100), "csv", compress))
+                return size, tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        seed(500)
+        small_size, small_peak = peak(compress=False)
+        small_gzip_peak = peak(compress=True)[1]
+        seed(1500)
+        large_size, large_peak = peak(compress=False)
+        large_gzip_peak = peak(compress=True)[1]
+        # Four times the rows (and output), about the same peak.
+        self.assertGreater(large_size, 3.5 * small_size)
+        self.assertLess(large_peak, 1.5 * small_peak)
+        self.assertLess(large_gzip_peak, 1.5 * small_gzip_peak)
+
+
+class UsernameMigrationTests(TransactionTestCase):
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([("giveaid", target)])
+        return executor.loader.project_state(("giveaid", target)).apps
+
+    def test_usernames_with_an_at_sign_are_renamed(self):
+        self.addCleanup(lambda: self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes("giveaid")[0][1]))
+        apps = self.migrate("0016_rollup_state_id_mark")
+        Country, State, City, User = (apps.get_model("giveaid", name) for name in ("Country", "State", "City", "User"))
+        country = Country.objects.create(name="Ghana")
+        state = State.objects.create(country=country, name="Greater Accra")
+        city = City.objects.create(state=state, name="Accra")
+        for username in ("ama@example.com", "ama_at_example.com", "kofi"):
+            User.objects.create(
+                username=username, firstname="A", lastname="B", email=f"{username.replace('@', '.')}@example.org",
+                dob=datetime.date(1990, 1, 1), country=country, state=state, city=city,
+            )
+        renamed = User.objects.get(username="ama@example.com")
+
+        User = self.migrate("0017_username_no_at").get_model("giveaid", "User")
+        self.assertEqual(
+            sorted(User.objects.values_list("username", flat=True)),
+            sorted(["ama_at_example.com", f"ama_at_example.com_{renamed.id}", "kofi"]),
+        )
+
+
+@override_settings(PASSWORD_HASHER_ITERATIONS=1000)
+class TokenAuthenticationTests(GiveaidFixturesMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        auth.token_cache().clear()
+        self.user.set_password("correct horse")
+        self.user.save()
+
+    def test_unknown_tokens_are_cached_apart_from_the_default_cache(self):
+        cache.set("api:response", "kept")
+        self.assertFalse(auth.user_for_token("made-up").is_authenticated)
+        self.assertIsNot(auth.token_cache(), cache)
+        self.assertEqual(auth.token_cache().get(auth.CACHE_KEY.format(digest=auth.digest("made-up"))), [])
+        self.assertEqual(list(cache._cache), [cache.make_key("api:response")])
+
+    def test_authenticate_by_username_or_email(self):
+        self.assertEqual(auth.authenticate("kofi", "correct horse"), self.user)
+        self.assertEqual(auth.authenticate("kofi@example.com", "correct horse"), self.user)
+        self.assertIsNone(auth.authenticate("kofi", "wrong"))
+        self.assertIsNone(auth.authenticate("nobody", "correct horse"))
+        user = auth.authenticate("kofi", "correct horse")
+        self.assertIn("dob", user.get_deferred_fields())
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(auth.authenticate("kofi", "correct horse"))
+
+    def test_identifiers_with_an_at_sign_are_emails(self):
+        other = make_user(self.city, "ama", email="kofi.b@example.com")
+        other.set_password("correct horse")
+        other.save()
+        self.assertEqual(auth.authenticate("kofi.b@example.com", "correct horse"), other)
+        with self.assertRaisesMessage(ValidationError, "Usernames cannot contain"):
+            User(username="kofi@example.com").validate_constraints()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            make_user(self.city, "kofi@example.com", email="kofi2@example.com")
+
+    def test_password_change_revokes_tokens(self):
+        token, _ = auth.issue_token(self.user)
+        with override_settings(PASSWORD_HASHER_ITERATIONS=1500):
+            # Rehashing on login is not a change.
+            auth.authenticate("kofi", "correct horse")
+        self.assertTrue(auth.user_for_token(token).is_authenticated)
+        self.user.set_password("battery staple")
+        self.user.save()
+        self.assertFalse(AuthToken.objects.exists())
+        self.assertFalse(auth.user_for_token(token).is_authenticated)
+
+    def test_changed_work_factor_rehashes_on_login(self):
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$1000$"))
+        with override_settings(PASSWORD_HASHER_ITERATIONS=1500):
+            self.assertEqual(auth.authenticate("kofi", "correct horse"), self.user)
+            self.user.refresh_from_db()
+            self.assertTrue(self.user.password.startswith("pbkdf2_sha256$1500$"))
+            # Up to date now, so the next login does not write.
+            with self.assertNumQueries(1):
+                auth.authenticate("kofi", "correct horse")
+
+    async def test_async_authenticate_hashes_on_the_pool(self):
+        threads = []
+        verify_password = auth.verify_password
+
+        def verify(password, encoded):
+            threads.append(threading.current_thread().name)
+            return verify_password(password, encoded)
+
+        with patch("giveaid.auth.verify_password", verify):
+            user = await auth.aauthenticate("kofi", "correct horse")
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertTrue(threads[0].startswith("password-hashing"))
+        self.assertIsNone(await auth.aauthenticate("kofi", "wrong"))
+
+    def test_token_lookup_is_cached_and_loads_few_columns(self):
+        token, _ = auth.issue_token(self.user)
+        auth.token_cache().clear()
+        with self.assertNumQueries(1):
+            user = auth.user_for_token(token)
+            self.assertEqual(user, self.user)
+            self.assertTrue(user.is_authenticated)
+        with self.assertNumQueries(0):
+            self.assertEqual(auth.user_for_token(token).username, "kofi")
+        self.assertIn("dob", user.get_deferred_fields())
+        self.assertEqual(user.dob, self.user.dob)
+
+        with self.assertNumQueries(1):
+            self.assertFalse(auth.user_for_token("not-a-token").is_authenticated)
+        with self.assertNumQueries(0):
+            self.assertFalse(auth.user_for_token("not-a-token").is_authenticated)
+
+    def test_revoked_expired_and_deactivated_tokens_stop_working(self):
+        token, _ = auth.issue_token(self.user)
+        self.assertTrue(auth.user_for_token(token).is_authenticated)
+        self.user.is_active = False
+        self.user.save()
+        self.assertFalse(auth.user_for_token(token).is_authenticated)
+
+        self.user.is_active = True
+        self.user.save()
+        self.assertTrue(auth.user_for_token(token).is_authenticated)
+        auth.revoke_token(token)
+        self.assertFalse(auth.user_for_token(token).is_authenticated)
+
+        token, _ = auth.issue_token(self.user)
+        AuthToken.objects.update(expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        auth.token_cache().clear()
+        self.assertFalse(auth.user_for_token(token).is_authenticated)
+        # Issuing a token clears out the expired ones.
+        auth.issue_token(self.user)
+        self.assertEqual(AuthToken.objects.count(), 1)
+
+
+class SeedBenchmarkTests(TestCase):
+    def test_seeded_data_is_consistent(self):
+        out = StringIO()
+        call_command(
+            "seed_benchmark", "--users=40", "--causes=5", "--donations=300", "--stories=20", "--countries=2",
+            "--instalment-share=0.5", stdout=out,
+        )
+        self.assertEqual(User.objects.count(), 40)
+        self.assertEqual(UserDonation.objects.count() + UnregisteredDonation.objects.count(), 300)
+        self.assertGreater(Payment.objects.count(), 300)
+        self.assertEqual(SuccessStory.objects.count(), 20)
+        self.assertEqual(totals.verify(), {})
+        self.assertEqual(
+            DailyDonationRollup.objects.aggregate(total=Sum("payment_count"))["total"], Payment.objects.count(),
+        )
+        # Dates are spread over the past year, not stamped with the insert time.
+        self.assertGreater(Payment.objects.dates("payment_date", "month").count(), 6)
+        self.assertFalse(Job.objects.exists())
+        self.assertIn("Seeded", out.getvalue())
+
+    def test_scaling_keeps_the_shape(self):
+        sizes = seed.SeedSizes().scaled(0.01)
+        self.assertEqual((sizes.users, sizes.causes, sizes.donations, sizes.stories), (100, 2, 1000, 20))
+        self.assertEqual(sizes.cities_per_state, seed.SeedSizes.cities_per_state)
@@ -0,0 +1,168 @@
+"""
+Denormalized per-cause donation totals.
+
+``CauseTotals`` rows are maintained incrementally by ``record_payments()``,
+which runs inside the transaction that inserts the payments (see
+``giveaid.signals``). ``compute_totals()`` derives the same numbers from
+scratch and backs the ``rebuild_cause_totals`` management command.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Exists, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import CauseTotals, Payment, UserDonation, UnregisteredDonation, attach_donations
+
+
+TOTAL_FIELDS = ('total_amount', 'payment_count', 'donor_count', 'anonymous_donor_count', 'last_donation_at')
+
+
+def _empty_totals():
+    return {
+        'total_amount': Decimal('0.00'),
+        'payment_count': 0,
+        'donor_count': 0,
+        'anonymous_donor_count': 0,
+        'last_donation_at': None,
+    }
+
+
+def _prior_donors(model, donor_field, cause_ids, donors, donation_type, exclude_payment_ids):
+    """(cause_id, donor) pairs that already paid before the given payments."""
+    if not donors:
+        return set()
+    # Correlated, so each donation is checked through payment_donation_idx
+    # instead of listing every payment of the type.
+    paid = Payment.objects.filter(
+        donation_type=donation_type, donation_id=OuterRef('id'),
+    ).exclude(id__in=exclude_payment_ids)
+    return set(
+        model.objects.filter(
+            Exists(paid),
+            cause_id__in=cause_ids,
+            **{f'{donor_field}__in': donors},
+        ).values_list('cause_id', donor_field)
+    )
+
+
+def record_payments(payments):
+    """
+    Fold newly inserted ``payments`` into their causes' totals.
+
+    Costs a constant number of queries per batch plus one UPDATE per cause
+    touched, so bulk importers should call it once per chunk.
+    """
+    payments = [payment for payment in payments if payment.pk is not None]
+    if not payments:
+        return
+    attach_donations([p for p in payments if not hasattr(p, '_donation_cache')])
+
+    deltas = {}
+    registered, anonymous = {}, {}
+    for payment in payments:
+        donation = payment.get_donation()
+        if donation is None:
+            continue
+        delta = deltas.setdefault(donation.cause_id, _empty_totals())
+        delta['total_amount'] += Decimal(payment.amount)
+        delta['payment_count'] += 1
+        if delta['last_donation_at'] is None or payment.created_at > delta['last_donation_at']:
+            delta['last_donation_at'] = payment.created_at
+        if payment.donation_type == Payment.USER_DONATION:
+            registered.setdefault(donation.cause_id, set()).add(donation.user_id)
+        else:
+            anonymous.setdefault(donation.cause_id, set()).add(donation.email)
+    if not deltas:
+        return
+
+    payment_ids = [payment.pk for payment in payments]
+    prior_registered = _prior_donors(
+        UserDonation, 'user_id', list(registered),
+        {donor for donors in registered.values() for donor in donors},
+        Payment.USER_DONATION, payment_ids,
+    )
+    prior_anonymous = _prior_donors(
+        UnregisteredDonation, 'email', list(anonymous),
+        {donor for donors in anonymous.values() for donor in donors},
+        Payment.UNREGISTERED_DONATION, payment_ids,
+    )
+    for cause_id, donors in registered.items():
+        deltas[cause_id]['donor_count'] = len({d for d in donors if (cause_id, d) not in prior_registered})
+    for cause_id, donors in anonymous.items():
+        deltas[cause_id]['anonymous_donor_count'] = len({d for d in donors if (cause_id, d) not in prior_anonymous})
+
+    with transaction.atomic():
+        CauseTotals.objects.bulk_create(
+            [CauseTotals(cause_id=cause_id) for cause_id in deltas], ignore_conflicts=True,
+        )
+        for cause_id, delta in deltas.items():
+            CauseTotals.objects.filter(cause_id=cause_id).update(
+                total_amount=F('total_amount') + delta['total_amount'],
+                payment_count=F('payment_count') + delta['payment_count'],
+                donor_count=F('donor_count') + delta['donor_count'],
+                anonymous_donor_count=F('anonymous_donor_count') + delta['anonymous_donor_count'],
+                last_donation_at=Greatest(
+                    Coalesce('last_donation_at', Value(delta['last_donation_at'])),
+                    Value(delta['last_donation_at']),
+                ),
+            )
+
+
+def compute_totals():
+    """Aggregate every cause's totals directly from the payments table."""
+    totals = {}
+    for donation_type, donor_field in ((Payment.USER_DONATION, 'user_id'), (Payment.UNREGISTERED_DONATION, 'email')):
+        donations = Payment.DONATION_MODELS[donation_type].objects.filter(pk=OuterRef('donation_id'))
+        rows = (
+            Payment.objects.filter(donation_type=donation_type)
+            .annotate(
+                donation_cause=Subquery(donations.values('cause_id')),
+                donor=Subquery(donations.values(donor_field)),
+            )
+            .filter(donation_cause__isnull=False)
+            .values('donation_cause')
+            .annotate(
+                amount=Sum('amount'),
+                payments=Count('id'),
+                donors=Count('donor', distinct=True),
+                last=Max('created_at'),
+            )
+            .order_by()
+        )
+        donor_key = 'donor_count' if donation_type == Payment.USER_DONATION else 'anonymous_donor_count'
+        for row in rows:
+            entry = totals.setdefault(row['donation_cause'], _empty_totals())
+            entry['total_amount'] += row['amount']
+            entry['payment_count'] += row['payments']
+            entry[donor_key] += row['donors']
+            if entry['last_donation_at'] is None or row['last'] > entry['last_donation_at']:
+                entry['last_donation_at'] = row['last']
+    return totals
+
+
+@transaction.atomic
+def rebuild():
+    """Replace the whole ``CauseTotals`` table with freshly computed rows."""
+    totals = compute_totals()
+    CauseTotals.objects.all().delete()
+    CauseTotals.objects.bulk_create(
+        [CauseTotals(cause_id=cause_id, **values) for cause_id, values in totals.items()],
+        batch_size=500,
+    )
+    return len(totals)
+
+
+def verify():
+    """Return ``{cause_id: (stored, expected)}`` for every cause whose totals drifted."""
+    expected = compute_totals()
+    stored = {row.pop('cause_id'): row for row in CauseTotals.objects.values('cause_id', *TOTAL_FIELDS)}
+    mismatches = {}
+    for cause_id in expected.keys() | stored.keys():
+        have = stored.get(cause_id, _empty_totals())
+        want = expected.get(cause_id, _empty_totals())
+        if have['payment_count'] == want['payment_count'] == 0:
+            continue
+        if any(have[field] != want[field] for field in TOTAL_FIELDS):
+            mismatches[cause_id] = (have, want)
+    return mismatches
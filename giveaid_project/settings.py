@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -25,6 +27,9 @@ SECRET_KEY = 'django-insecure-5khe6ag^l39)s_*^_%e=ihb4so@3=7e9ve4g%i^p6ypu(gj(mj
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+# True under `manage.py test`, where the test runner turns DEBUG off.
+TESTING = sys.argv[1:2] == ['test']
+
 ALLOWED_HOSTS = []
 
 AUTH_USER_MODEL = "giveaid.User"
@@ -43,11 +48,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'giveaid.middleware.QueryStatsMiddleware',
+    'giveaid.middleware.PrimaryPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'giveaid.middleware.TokenAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -78,11 +86,60 @@ WSGI_APPLICATION = 'giveaid_project.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # Django's SQLite backend plus the init_command and transaction_mode
+        # options of Django 5.1 (see giveaid/backends/sqlite3/base.py).
+        'ENGINE': 'giveaid.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections open between requests; check them before reuse.
+        'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Seconds a writer waits for the lock before "database is locked".
+            'timeout': 20,
+        },
+        'TEST': {
+            # A file rather than shared-cache memory, so concurrency tests see
+            # real SQLite locking.
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
+# Production profile for deployments served from SQLite (DATABASE_PROFILE=production):
+# WAL so readers and the writer stop blocking each other, NORMAL sync (durable
+# at checkpoints, never corrupt), a busy timeout matching 'timeout', a 256 MiB
+# memory map and a 64 MiB page cache per connection. Immediate transactions
+# queue for the write lock at BEGIN instead of failing on their first write.
+
+if os.environ.get('DATABASE_PROFILE') == 'production':
+    DATABASES['default']['OPTIONS'].update({
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': (
+            'PRAGMA journal_mode = WAL;'
+            'PRAGMA synchronous = NORMAL;'
+            'PRAGMA busy_timeout = 20000;'
+            'PRAGMA mmap_size = 268435456;'
+            'PRAGMA cache_size = -65536;'
+        ),
+    })
+
+# Read replica. Set DATABASE_REPLICA_NAME (locally, a second SQLite file kept
+# as a copy of db.sqlite3) to send read-only queries for the models listed in
+# giveaid.routers.REPLICA_MODELS there. Tests always get the alias, as a
+# second test database file, but only route reads to it where they override
+# DATABASE_REPLICA.
+
+if os.environ.get('DATABASE_REPLICA_NAME') or TESTING:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get('DATABASE_REPLICA_NAME', BASE_DIR / 'db.replica.sqlite3'),
+        'TEST': {'NAME': BASE_DIR / 'test_db_replica.sqlite3'},
+    }
+
+DATABASE_REPLICA = 'replica' if 'replica' in DATABASES and not TESTING else None
+
+DATABASE_ROUTERS = ['giveaid.routers.PrimaryReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -103,6 +160,39 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# giveaid.hashers.PBKDF2PasswordHasher uses PASSWORD_HASHER_ITERATIONS, or
+# Django's default when unset. Stored hashes made with another count are
+# rewritten at their user's next login. API logins hash on a pool of
+# PASSWORD_HASHING_THREADS threads (default: one per core).
+
+PASSWORD_HASHERS = [
+    'giveaid.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+PASSWORD_HASHER_ITERATIONS = int(os.environ['PASSWORD_HASHER_ITERATIONS']) if os.environ.get('PASSWORD_HASHER_ITERATIONS') else None
+
+PASSWORD_HASHING_THREADS = None
+
+
+# API tokens
+# See giveaid/auth.py. Tokens last AUTH_TOKEN_TTL seconds; the user each one
+# authenticates is cached in AUTH_TOKEN_CACHE_ALIAS for
+# AUTH_TOKEN_CACHE_TIMEOUT seconds. Unknown tokens are cached too, so they
+# get a cache of their own: random bearer tokens must not evict API
+# responses and geo lookups from the default one.
+
+AUTH_TOKEN_TTL = 30 * 24 * 3600
+
+AUTH_TOKEN_CACHE_ALIAS = 'auth_tokens'
+
+AUTH_TOKEN_CACHE_TIMEOUT = 60
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.0/topics/i18n/
 
@@ -120,6 +210,93 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Request instrumentation
+# See giveaid/middleware.py. QUERY_BUDGET is the default maximum number of
+# queries per request; views can set their own with @query_budget(n).
+
+QUERY_BUDGET = None
+
+QUERY_BUDGET_RAISE = DEBUG
+
+QUERY_STATS_HEADERS = DEBUG
+
+QUERY_STATS_HISTOGRAM = False
+
+QUERY_STATS_HISTOGRAM_SIZE = 1000
+
+
+# Geo hierarchy cache
+# Share the Country/State/City snapshot between processes through the cache
+# framework; otherwise each process keeps its own copy.
+
+GEO_CACHE_SHARED = False
+
+GEO_CACHE_ALIAS = 'default'
+
+
+# API response cache
+# The public read endpoints cache whole responses in API_CACHE_ALIAS under
+# versioned keys that writes invalidate; see api/cache.py. Point the alias at
+# a shared backend (Redis, Memcached) when running several processes.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'auth_tokens': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'auth-tokens',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+API_CACHE_ALIAS = 'default'
+
+API_CACHE_TIMEOUT = 300
+
+
+# Payment gateway
+# giveaid.gateway.PaystackGateway takes 'secret_key' and connection pool
+# limits as OPTIONS. The stub never leaves the process and accepts forged
+# references, so it is only allowed with DEBUG or in tests.
+
+if DEBUG or TESTING:
+    PAYMENT_GATEWAY = {
+        'BACKEND': 'giveaid.gateway.StubGateway',
+        'OPTIONS': {
+            'latency': float(os.environ.get('PAYMENT_GATEWAY_STUB_LATENCY', '0')),
+            'webhook_secret': os.environ.get('PAYMENT_GATEWAY_STUB_WEBHOOK_SECRET', 'stub-webhook-secret'),
+        },
+    }
+else:
+    PAYMENT_GATEWAY = {
+        'BACKEND': 'giveaid.gateway.PaystackGateway',
+        'OPTIONS': {
+            'secret_key': os.environ.get('PAYSTACK_SECRET_KEY', ''),
+        },
+    }
+
+
+# Background jobs
+# See giveaid/jobs.py; run the workers with `manage.py run_workers`.
+
+JOB_MAX_ATTEMPTS = 5
+
+JOB_RETRY_BACKOFF = 2.0
+
+JOB_RETRY_BACKOFF_MAX = 3600
+
+JOB_LOCK_TIMEOUT = 600
+
+RECEIPT_EMAIL_BATCH_SIZE = 100
+
+RECEIPT_FROM_EMAIL = os.environ.get('RECEIPT_FROM_EMAIL', 'receipts@giveaid.org')
+
+# Queue a job linking anonymous donations to the account registered with their email.
+LINK_ANONYMOUS_DONATIONS = True
+
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 